@@ -0,0 +1,62 @@
+"""Times call-heavy programs: recursion, leaf calls in a loop and closures.
+
+Each time is followed by the baseline revision's (see common.Baseline).
+
+Usage: python -m benchmarks.bench_calls [--baseline REV]
+"""
+import sys
+
+from benchmarks.common import Baseline, best_of, run_lox
+
+PROGRAMS = {
+    "fib": """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+{ print fib(20); }
+""",
+    "leaf-calls": """
+fun add(a, b) { var sum = a + b; return sum; }
+{
+  var total = 0;
+  for (var i = 0; i < 30000; i = i + 1) { total = add(total, i); }
+  print total;
+}
+""",
+    "nested-blocks": """
+fun work(n) {
+  var total = 0;
+  for (var i = 0; i < n; i = i + 1) {
+    var doubled = i * 2;
+    { var tripled = i * 3; total = total + doubled + tripled; }
+  }
+  return total;
+}
+{ print work(30000); }
+""",
+    "closures": """
+fun makeAdder(by) {
+  fun add(x) { return x + by; }
+  return add;
+}
+{
+  var add = makeAdder(2);
+  var total = 0;
+  for (var i = 0; i < 30000; i = i + 1) { total = add(total); }
+  print total;
+}
+""",
+}
+
+
+def main():
+    baseline = Baseline(sys.argv)
+    for name, source in PROGRAMS.items():
+        seconds, output = best_of(lambda: run_lox(source), repeat=3)
+        print(f"{name:>13}: {seconds * 1000:8.1f} ms  -> {output.strip().splitlines()[-1]}"
+              + baseline.compare(source, seconds, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compares the execution engines on the same programs.
+
+Every engine must print exactly what the tree-walking interpreter prints,
+runtime errors included; then each is timed.
+
+Usage: python -m benchmarks.bench_engines
+"""
+import re
+
+from benchmarks.common import best_of, run_engine
+from benchmarks.bench_calls import PROGRAMS as CALL_PROGRAMS
+
+PROGRAMS = dict(CALL_PROGRAMS)
+PROGRAMS.update({
+    "loop": """
+var total = 0;
+for (var i = 0; i < 50000; i = i + 1) {
+  if (i / 2 > 10 and total != 12.5) total = total + i * 2 - 1;
+  else total = total - 1;
+}
+{ print total; }
+""",
+    "strings": """
+var s = "";
+for (var i = 0; i < 5000; i = i + 1) { if (i < 50) s = s + "ab"; else s = s + ""; }
+{ print s == "ab"; print !s; print s + "!"; }
+""",
+    "runtime-error": """
+fun bad(x) { return x + "a"; }
+{ print 1; print bad(2); }
+""",
+})
+
+
+def capture(source, engine):
+    # Function objects print with their class and address
+    return re.sub(r"<(\S+ object|function \S+) at 0x[0-9a-f]+>", "<object>", run_engine(source, engine))
+
+
+def main():
+    from main import engines
+
+    for name, source in PROGRAMS.items():
+        expected = capture(source, engines["tree"])
+        timings = []
+        for engine_name, engine in engines.items():
+            actual = capture(source, engine)
+            if actual != expected:
+                raise SystemExit(f"{name}: {engine_name} output differs\n--- tree\n{expected}--- {engine_name}\n{actual}")
+            seconds, _ = best_of(lambda: run_engine(source, engine), repeat=3)
+            timings.append(f"{engine_name} {seconds * 1000:7.1f} ms")
+        print(f"{name:>13}: " + ", ".join(timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Times scripts whose hot loops read and write top-level variables.
+
+Each time is followed by the baseline revision's (see common.Baseline).
+
+Usage: python -m benchmarks.bench_globals [--baseline REV]
+"""
+import sys
+
+from benchmarks.common import Baseline, best_of, run_lox
+
+PROGRAMS = {
+    "counters": """
+var i = 0;
+var total = 0;
+var step = 3;
+while (i < 30000) {
+  total = total + step;
+  i = i + 1;
+}
+{ print total; }
+""",
+    "from-functions": """
+var hits = 0;
+var limit = 30000;
+fun bump(by) { hits = hits + by; }
+fun run() {
+  var i = 0;
+  while (i < limit) { bump(1); i = i + 1; }
+}
+run();
+{ print hits; }
+""",
+    "deep-scope": """
+var total = 0;
+fun work() {
+  for (var i = 0; i < 30000; i = i + 1) {
+    { { { total = total + i; } } }
+  }
+}
+work();
+{ print total; }
+""",
+}
+
+
+def main():
+    baseline = Baseline(sys.argv)
+    for name, source in PROGRAMS.items():
+        seconds, output = best_of(lambda: run_lox(source), repeat=3)
+        print(f"{name:>14}: {seconds * 1000:8.1f} ms  -> {output.strip().splitlines()[-1]}"
+              + baseline.compare(source, seconds, output))
+
+
+if __name__ == "__main__":
+    main()
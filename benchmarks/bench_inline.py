@@ -0,0 +1,64 @@
+"""Times helper-heavy programs with and without inlining.
+
+Both runs constant-fold; only the inliner differs.
+
+Usage: python -m benchmarks.bench_inline
+"""
+from benchmarks.common import best_of, run_engine
+
+PROGRAMS = {
+    "arithmetic-helpers": """
+fun add(a, b) { return a + b; }
+fun square(x) { return x * x; }
+fun lerp(a, b, t) { return a + (b - a) * t; }
+var total = 0;
+var i = 0;
+while (i < 20000) {
+  total = add(total, square(i) - lerp(i, total, 0.5));
+  i = add(i, 1);
+}
+{ print total; }
+""",
+    "predicates": """
+fun between(x, low, high) { return x >= low and x < high; }
+fun isSmall(x) { return x < 100; }
+fun half(x) { return x / 2; }
+var count = 0;
+var i = 0;
+while (i < 20000) {
+  var n = i;
+  if (between(n, 5000, 15000) or isSmall(n)) count = count + half(n);
+  i = i + 1;
+}
+{ print count; }
+""",
+    "helpers-in-functions": """
+fun sq(x) { return x * x; }
+fun norm2(x, y) { return sq(x) + sq(y); }
+fun step(n, acc) {
+  var d = norm2(n, n + 1);
+  return acc + d;
+}
+var acc = 0;
+var i = 0;
+while (i < 15000) { acc = step(i, acc); i = i + 1; }
+{ print acc; }
+""",
+}
+
+
+def main():
+    from libs.interpreter import Interpreter
+    from libs.vm import VirtualMachine
+
+    for engine in (Interpreter, VirtualMachine):
+        for name, source in PROGRAMS.items():
+            plain, output = best_of(lambda: run_engine(source, engine, inline=False), repeat=3)
+            inlined, inlined_output = best_of(lambda: run_engine(source, engine), repeat=3)
+            assert output == inlined_output, (output, inlined_output)
+            print(f"{engine.__name__:>15} {name:>20}: {plain * 1000:7.1f} ms -> {inlined * 1000:7.1f} ms"
+                  f"  ({plain / inlined:.2f}x)  -> {output.split()[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Times long loops and measures the memory they hold while running.
+
+The "counted" programs have the shape of a desugared for loop and take
+the interpreter's counted-loop path. A top-level while loop's results are
+dropped; a loop inside a block prints them, one entry per iteration, once
+it ends, and that text is most of the peak for those programs. Output goes
+to a sink that only counts it, so the peak is what the interpreter holds.
+
+Usage: python -m benchmarks.bench_loops [iterations]
+"""
+import contextlib
+import gc
+import sys
+import tracemalloc
+
+from benchmarks.common import best_of
+
+PROGRAMS = {
+    "top-level-while": """
+var total = 0;
+var i = 0;
+while (i < {n}) {{ total = total + i; i = i + 1; }}
+{{ print total; }}
+""",
+    "block-while": """
+{{
+  var total = 0;
+  var i = 0;
+  while (i < {n}) {{ i = i + 1; total = total + i; }}
+  print total;
+}}
+""",
+    "counted-while": """
+{{
+  var total = 0;
+  var i = 0;
+  while (i < {n}) {{ total = total + i; i = i + 1; }}
+  print total;
+}}
+""",
+    "counted-for": """
+{{
+  var total = 0;
+  for (var i = 0; i < {n}; i = i + 1) {{ total = total + i; }}
+  print total;
+}}
+""",
+    "counted-down": """
+{{
+  var total = 0;
+  for (var i = {n}; i > 0; i = i - 1) {{ total = total + i; }}
+  print total;
+}}
+""",
+}
+
+
+class Sink:
+    """Counts what is written to it instead of keeping it."""
+
+    def __init__(self):
+        self.size = 0
+        self.last = ""
+
+    def write(self, text):
+        self.size += len(text)
+        if text.strip():
+            self.last = text
+
+    def flush(self):
+        pass
+
+
+def run(source):
+    from libs import tokenizer, parser, interpreter, resolver
+
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    statements = parser.Parser(tokens).parse()
+    lox_interpreter = interpreter.Interpreter()
+    resolver.Resolver(lox_interpreter).resolve(statements)
+    sink = Sink()
+    with contextlib.redirect_stdout(sink):
+        for statement in statements:
+            lox_interpreter.run(statement)
+    return sink
+
+
+def peak_memory(source):
+    gc.collect()
+    tracemalloc.start()
+    run(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for name, program in PROGRAMS.items():
+        source = program.format(n=iterations)
+        seconds, sink = best_of(lambda: run(source), repeat=3)
+        peak = peak_memory(source)
+        print(f"{name:>15}: {seconds * 1000:8.1f} ms  {iterations / seconds / 1e6:5.2f} M iter/s  "
+              f"peak {peak / 1e6:6.2f} MB  printed {sink.size / 1e6:5.2f} MB  -> {sink.last.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Times pure functions with and without memoization.
+
+"all-misses" never repeats an argument, so it shows what the cache costs
+when it cannot help, evictions included.
+
+Usage: python -m benchmarks.bench_memo
+"""
+from benchmarks.common import best_of, run_engine
+
+PROGRAMS = {
+    "fib": """
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+{ print fib(22); }
+""",
+    "binomial": """
+fun choose(n, k) {
+  if (k == 0 or k == n) return 1;
+  return choose(n - 1, k - 1) + choose(n - 1, k);
+}
+{ print choose(18, 9); }
+""",
+    "repeated-calls": """
+fun square(x) { return x * x; }
+fun sum(n) { if (n == 0) return 0; return square(n) + sum(n - 1); }
+var total = 0;
+var i = 0;
+while (i < 200) { total = total + sum(50); i = i + 1; }
+{ print total; }
+""",
+    "all-misses": """
+fun square(x) { return x * x; }
+var total = 0;
+var i = 0;
+while (i < 30000) { total = total + square(i); i = i + 1; }
+{ print total; }
+""",
+}
+
+
+def memoized():
+    from libs.interpreter import Interpreter
+    from libs.memo import MemoCache
+
+    lox_interpreter = Interpreter()
+    lox_interpreter.memo = MemoCache()
+    return lox_interpreter
+
+
+def main():
+    from libs.interpreter import Interpreter
+
+    for name, source in PROGRAMS.items():
+        plain, output = best_of(lambda: run_engine(source, Interpreter), repeat=3)
+        memo, memo_output = best_of(lambda: run_engine(source, memoized), repeat=3)
+        assert output == memo_output, (output, memo_output)
+        print(f"{name:>18}: {plain * 1000:8.1f} ms, memoized {memo * 1000:8.1f} ms"
+              f"  ({plain / memo:.1f}x)  -> {output.strip()}")
+
+
+if __name__ == "__main__":
+    main()
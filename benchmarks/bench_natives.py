@@ -0,0 +1,91 @@
+"""Times string and math work done by natives against the same work
+written in plain Lox.
+
+Plain Lox cannot look inside a string or turn a number into one, so each
+program computes something both versions can: the lengths of strings it
+builds, the digit counts of numbers and square roots. The plain versions
+recurse rather than loop, as a loop inside a function prints its results.
+
+Usage: python -m benchmarks.bench_natives [iterations]
+"""
+import sys
+
+from benchmarks.common import best_of, run_engine
+
+PROGRAMS = {
+    "padding": (
+        """
+fun stars(row, width) {{
+  if (width == 0) return row;
+  return stars(row + "*", width - 1);
+}}
+var total = 0;
+var i = 0;
+while (i < {n}) {{ stars("", 20); total = total + 20; i = i + 1; }}
+{{ print total; }}
+""",
+        """
+var total = 0;
+var i = 0;
+while (i < {n}) {{ total = total + len(repeat("*", 20)); i = i + 1; }}
+{{ print total; }}
+""",
+    ),
+    "digits": (
+        """
+fun digits(x) {{
+  if (x < 10) return 1;
+  return 1 + digits(x / 10);
+}}
+var total = 0;
+var i = 0;
+while (i < {n}) {{ total = total + digits(i * 37); i = i + 1; }}
+{{ print total; }}
+""",
+        """
+var total = 0;
+var i = 0;
+while (i < {n}) {{ total = total + len(formatNumber(i * 37, 0)); i = i + 1; }}
+{{ print total; }}
+""",
+    ),
+    "square-roots": (
+        """
+fun newton(x, guess, steps) {{
+  if (steps == 0) return guess;
+  return newton(x, (guess + x / guess) / 2, steps - 1);
+}}
+var total = 0;
+var i = 1;
+while (i <= {n}) {{ total = total + newton(i * i, i * i, 30); i = i + 1; }}
+{{ print total; }}
+""",
+        """
+var total = 0;
+var i = 1;
+while (i <= {n}) {{ total = total + sqrt(i * i); i = i + 1; }}
+{{ print total; }}
+""",
+    ),
+}
+
+
+def main():
+    from libs.interpreter import Interpreter
+    from libs.vm import VirtualMachine
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for engine in (Interpreter, VirtualMachine):
+        print(f"{engine.__name__}:")
+        for name, (plain, native) in PROGRAMS.items():
+            plain = plain.format(n=iterations)
+            native = native.format(n=iterations)
+            lox_seconds, output = best_of(lambda: run_engine(plain, engine), repeat=3)
+            native_seconds, native_output = best_of(lambda: run_engine(native, engine), repeat=3)
+            assert output == native_output, (output, native_output)
+            print(f"{name:>14}: Lox {lox_seconds * 1000:8.1f} ms, natives {native_seconds * 1000:8.1f} ms"
+                  f"  ({lox_seconds / native_seconds:5.1f}x)  -> {output.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Checks that the optimizer leaves program output unchanged, and times it.
+
+Each program is run with and without constant folding and dead-branch
+elimination; the outputs (including runtime error messages) must match.
+
+Usage: python -m benchmarks.bench_optimizer
+"""
+import re
+
+from benchmarks.common import best_of, run_lox
+
+PROGRAMS = {
+    "arithmetic": """
+{
+  print 1 + 2 * 3;
+  print (1 + 2) * 3 - 4 / 8;
+  print -(2 * 3);
+  print "con" + "cat" + "enation";
+  print 10 / 4 > 2;
+  print 1 == 1.0;
+  print "a" != "b";
+  print nil == nil;
+}
+""",
+    "logic": """
+var x = "set";
+{
+  print !true;
+  print !nil;
+  print !!0;
+  print true and x;
+  print false and x;
+  print nil or x;
+  print "left" or x;
+  print 1 < 2 and 3 >= 3;
+}
+""",
+    "branches": """
+var x = 1;
+{
+  if (false) print "never"; else print "else";
+  if (true) print "then";
+  if (nil) print "nil is false";
+  if (1 > 2) { print "no"; }
+  if (0) print "0 is true";
+  while (false) print "never";
+  while (1 > 2) { x = x + 1; }
+  for (var i = 0; false; i = i + 1) print i;
+  print x;
+}
+if (false) { print "top"; }
+while (false) print "top";
+""",
+    "functions": """
+fun pick(a) {
+  if (true) return a * (2 + 3);
+  return "unreachable";
+}
+fun none() {
+  while (false) {}
+  1 + 2;
+}
+{
+  print pick(4);
+  print none();
+}
+""",
+    "errors": """
+{
+  print 1 / 0 == 1;
+}
+""",
+    "type errors": """
+{
+  print "a" + 1;
+}
+""",
+    "loop": """
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  if (2 * 3 > 5 and !false) total = total + (4 * 2 - 7);
+  if (false) total = total - 1;
+  while (1 > 2) total = 0;
+}
+{ print total; }
+""",
+}
+
+
+def capture(source, optimize):
+    try:
+        output = run_lox(source, optimize)
+    except Exception as error:
+        output = f"error: {error}"
+    # Function objects print with their addresses
+    return re.sub(r"0x[0-9a-f]+", "0x", output)
+
+
+def main():
+    for name, source in PROGRAMS.items():
+        expected = capture(source, optimize=False)
+        actual = capture(source, optimize=True)
+        if actual != expected:
+            raise SystemExit(f"{name}: output differs\n--- plain\n{expected}--- optimized\n{actual}")
+
+        plain, _ = best_of(lambda: capture(source, optimize=False), repeat=3)
+        optimized, _ = best_of(lambda: capture(source, optimize=True), repeat=3)
+        print(f"{name:>12}: identical output, {plain * 1000:7.1f} ms -> {optimized * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Times print-heavy programs writing through print, as the engines used
+to, through an unbuffered Output and through a buffered one, and the
+cached number formatter against repr.
+
+Output goes to os.devnull through a real file object, as it would to a
+pipe.
+
+Usage: python -m benchmarks.bench_output [rows]
+"""
+import os
+import sys
+import timeit
+
+from benchmarks.common import best_of
+
+PROGRAMS = {
+    "counter": """
+var i = 0;
+while (i < {n}) {{ {{ print i; }} i = i + 1; }}
+""",
+    "report": """
+var i = 0;
+while (i < {n}) {{ {{ print "row"; print i; print i * 2.5; print i < 100; }} i = i + 1; }}
+""",
+    "repeated-values": """
+var i = 0;
+while (i < {n}) {{ {{ print 1; print 0.5; print 100; print nil; }} i = i + 1; }}
+""",
+}
+
+
+class PrintOutput:
+    """Writes each line with print."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def line(self, text):
+        print(text, file=self.stream)
+
+    def flush(self):
+        pass
+
+
+def run(source, output):
+    from libs import tokenizer, parser, interpreter, resolver
+
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    statements = parser.Parser(tokens).parse()
+    lox_interpreter = interpreter.Interpreter()
+    resolver.Resolver(lox_interpreter).resolve(statements)
+    lox_interpreter.output = output
+    for statement in statements:
+        lox_interpreter.run(statement)
+    lox_interpreter.output.flush()
+
+
+def main():
+    from libs.output import DEFAULT_BUFFER_SIZE, Output
+    from libs.values import number_text, number_texts
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with open(os.devnull, "w") as stream:
+        for name, program in PROGRAMS.items():
+            source = program.format(n=rows)
+            printed, _ = best_of(lambda: run(source, PrintOutput(stream)), repeat=3)
+            unbuffered, _ = best_of(lambda: run(source, Output(0, stream)), repeat=3)
+            buffered, _ = best_of(lambda: run(source, Output(DEFAULT_BUFFER_SIZE, stream)), repeat=3)
+            print(f"{name:>16}: print {printed * 1000:8.1f} ms, unbuffered {unbuffered * 1000:8.1f} ms, "
+                  f"buffered {buffered * 1000:8.1f} ms  ({printed / buffered:.2f}x)")
+
+    numbers = [float(i % 1000) * 2.5 for i in range(rows)]
+    uncached = timeit.timeit(lambda: [repr(number) for number in numbers], number=5)
+    number_texts.clear()
+    cached = timeit.timeit(lambda: [number_text(number) for number in numbers], number=5)
+    print(f"{'format numbers':>16}: repr {uncached * 1000:8.1f} ms, number_text {cached * 1000:8.1f} ms"
+          f"  ({uncached / cached:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Compares parse speed of the recursive-descent and Pratt parsers.
+
+Usage: python -m benchmarks.bench_parser [file.lox]
+"""
+import sys
+
+from benchmarks.common import load_source, best_of
+from libs.parser import Parser
+from libs.pratt_parser import PrattParser
+from libs.tokenizer import RegexScanner
+
+
+def main():
+    source = load_source(sys.argv)
+    tokens, _ = RegexScanner(source).scan_tokens()
+    print(f"{len(tokens)} tokens")
+    for parser_class in (Parser, PrattParser):
+        seconds, statements = best_of(lambda: parser_class(tokens).parse(), repeat=3)
+        print(f"{parser_class.__name__:>12}: {seconds * 1000:8.1f} ms  "
+              f"{len(tokens) / seconds:12,.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    main()
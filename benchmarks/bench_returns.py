@@ -0,0 +1,75 @@
+"""Times programs dominated by function returns and tail calls.
+
+"deep-tail" recurses far deeper than Python's stack allows, so it only
+completes when tail calls run in constant stack.
+
+Each time is followed by the baseline revision's (see common.Baseline).
+
+Usage: python -m benchmarks.bench_returns [--baseline REV]
+"""
+import sys
+
+from benchmarks.common import Baseline, best_of, run_lox
+
+PROGRAMS = {
+    "returns": """
+fun sign(x) {
+  if (x < 0) return -1;
+  if (x == 0) return 0;
+  return 1;
+}
+{
+  var total = 0;
+  for (var i = -15000; i < 15000; i = i + 1) { total = total + sign(i); }
+  print total;
+}
+""",
+    "return-from-loop": """
+fun find(limit) {
+  var i = 0;
+  while (true) {
+    { if (i >= limit) return i; }
+    i = i + 1;
+  }
+}
+{
+  var total = 0;
+  for (var i = 0; i < 3000; i = i + 1) { total = total + find(5); }
+  print total;
+}
+""",
+    "tail-accumulate": """
+fun sum(n, acc) {
+  if (n == 0) return acc;
+  return sum(n - 1, acc + n);
+}
+{
+  var total = 0;
+  for (var i = 0; i < 300; i = i + 1) { total = total + sum(50, 0); }
+  print total;
+}
+""",
+    "deep-tail": """
+fun count(n, acc) {
+  if (n == 0) return acc;
+  return count(n - 1, acc + 1);
+}
+{ print count(20000, 0); }
+""",
+}
+
+
+def main():
+    baseline = Baseline(sys.argv)
+    for name, source in PROGRAMS.items():
+        try:
+            seconds, output = best_of(lambda: run_lox(source), repeat=3)
+        except RecursionError:
+            print(f"{name:>16}: exceeds Python's recursion limit")
+            continue
+        print(f"{name:>16}: {seconds * 1000:8.1f} ms  -> {output.strip().splitlines()[-1]}"
+              + baseline.compare(source, seconds, output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compares the explicit-stack engine with the tree walker.
+
+Shallow programs show what suspending calls costs; "deep" recurses past
+what the tree walker's Python stack allows. The two engines take turns,
+so drift in the machine's speed shows up in both columns alike.
+
+Usage: python -m benchmarks.bench_stack
+"""
+import time
+
+from benchmarks.common import run_engine
+from benchmarks.bench_calls import PROGRAMS as CALL_PROGRAMS
+from benchmarks.bench_values import PROGRAMS as VALUE_PROGRAMS
+
+PROGRAMS = dict(CALL_PROGRAMS)
+PROGRAMS.update(VALUE_PROGRAMS)
+PROGRAMS["deep"] = """
+fun depth(n) { if (n == 0) return 0; return 1 + depth(n - 1); }
+{ print depth(50000); }
+"""
+
+
+def main():
+    from libs.interpreter import Interpreter
+    from libs.stack_interpreter import StackInterpreter
+
+    for name, source in PROGRAMS.items():
+        best = {Interpreter: float("inf"), StackInterpreter: float("inf")}
+        outputs = {}
+        for _ in range(5):
+            for engine in best:
+                start = time.perf_counter()
+                outputs[engine] = run_engine(source, engine).strip().splitlines()[-1]
+                best[engine] = min(best[engine], time.perf_counter() - start)
+        tree, stack = best.values()
+        tree_output, stack_output = outputs.values()
+        if tree_output != stack_output:
+            print(f"{name:>13}: tree {tree_output}, stack {stack_output}  ({stack * 1000:.1f} ms)")
+            continue
+        print(f"{name:>13}: tree {tree * 1000:7.1f} ms, stack {stack * 1000:7.1f} ms ({stack / tree:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
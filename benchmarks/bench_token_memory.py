@@ -0,0 +1,42 @@
+"""Reports the memory held by a token list versus a TokenBuffer, and the
+time to parse each. A TokenBuffer builds its Token objects while parsing
+rather than while scanning, so scan + parse is the fair comparison.
+
+Usage: python -m benchmarks.bench_token_memory [file.lox]
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import load_source
+from libs.parser import Parser
+from libs.tokenizer import RegexScanner
+
+
+def measure(scan):
+    tracemalloc.start()
+    tokens, _ = scan()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    tokens, _ = scan()
+    scanned = time.perf_counter()
+    Parser(tokens).parse()
+    end = time.perf_counter()
+    return len(tokens), size, end - scanned, end - start
+
+
+def main():
+    source = load_source(sys.argv)
+    print(f"source: {len(source) / 1e6:.2f} MB")
+    for name, scan in [
+        ("list[Token]", lambda: RegexScanner(source).scan_tokens()),
+        ("TokenBuffer", lambda: RegexScanner(source).scan_buffer()),
+    ]:
+        count, size, parse_seconds, total_seconds = measure(scan)
+        print(f"{name:>12}: {size / 1e6:8.2f} MB  {size / count:6.1f} B/token  "
+              f"parse {parse_seconds * 1000:8.1f} ms  scan + parse {total_seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
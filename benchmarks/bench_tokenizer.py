@@ -0,0 +1,34 @@
+"""Compares the classic and regex scanners on a large Lox source.
+
+Usage: python -m benchmarks.bench_tokenizer [file.lox]
+"""
+import sys
+
+from benchmarks.common import load_source, best_of
+from libs import tokenizer
+
+
+def token_tuples(tokens):
+    return [(t.type, t.lexeme, t.literal, t.line) for t in tokens]
+
+
+def main():
+    source = load_source(sys.argv)
+
+    results = {}
+    for name, scanner_class in sorted(tokenizer.scanners.items()):
+        seconds, (tokens, errors) = best_of(lambda: scanner_class(source).scan_tokens())
+        results[name] = (token_tuples(tokens), errors)
+        print(f"{name:>8}: {len(tokens):>9} tokens  {seconds * 1000:8.1f} ms  "
+              f"{len(tokens) / seconds:12,.0f} tokens/sec")
+
+    reference = results["classic"]
+    for name, result in results.items():
+        if result != reference:
+            print(f"MISMATCH: {name} differs from classic scanner")
+            sys.exit(1)
+    print("token streams and errors identical")
+
+
+if __name__ == "__main__":
+    main()
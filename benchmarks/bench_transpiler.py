@@ -0,0 +1,33 @@
+"""Times what the marshal cache saves the Python engine on start-up.
+
+Transpiling a module and compiling the result is paid on every run without
+the cache; with it, a run loads the marshalled code object instead.
+
+Usage: python -m benchmarks.bench_transpiler [file.lox]
+"""
+import marshal
+import sys
+
+from benchmarks.common import best_of, load_source
+
+
+def main():
+    from libs import tokenizer, parser, interpreter, resolver, modules, transpiler
+
+    source = load_source(sys.argv, default_chunks=1000)
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    parse = parser.Parser(tokens)
+    statements = parse.parse()
+    front_end = interpreter.Interpreter()
+    resolver.Resolver(front_end).resolve(statements)
+    module = modules.Module("<benchmark>", statements, parse.lines, front_end.globals.slots)
+
+    compiled, code = best_of(lambda: transpiler.transpile(module), repeat=3)
+    data = marshal.dumps(code)
+    loaded, _ = best_of(lambda: marshal.loads(data), repeat=3)
+    print(f"transpile + compile: {compiled * 1000:8.1f} ms")
+    print(f"   marshal.loads   : {loaded * 1000:8.1f} ms  ({len(data) // 1024} KiB)")
+
+
+if __name__ == "__main__":
+    main()
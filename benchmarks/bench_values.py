@@ -0,0 +1,44 @@
+"""Times loops dominated by conditions, comparisons and equality tests.
+
+Usage: python -m benchmarks.bench_values
+"""
+from benchmarks.common import best_of, run_lox
+
+PROGRAMS = {
+    "comparisons": """
+var i = 0;
+var below = 0;
+while (i < 30000) {
+  if (i <= 15000) below = below + 1;
+  i = i + 1;
+}
+{ print below; }
+""",
+    "equality": """
+var matches = 0;
+for (var i = 0; i < 30000; i = i + 1) {
+  if (i == 10 or i != i) matches = matches + 1;
+  if (nil == false) matches = matches - 1;
+}
+{ print matches; }
+""",
+    "flags": """
+var on = true;
+var flips = 0;
+for (var i = 0; i < 30000; i = i + 1) {
+  if (on and !nil) flips = flips + 1;
+  on = !on == false;
+}
+{ print flips; print on; }
+""",
+}
+
+
+def main():
+    for name, source in PROGRAMS.items():
+        seconds, output = best_of(lambda: run_lox(source), repeat=3)
+        print(f"{name:>12}: {seconds * 1000:8.1f} ms  -> {output.strip().splitlines()[-1]}")
+
+
+if __name__ == "__main__":
+    main()
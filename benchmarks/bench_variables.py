@@ -0,0 +1,56 @@
+"""Times variable-heavy loops over locals, globals and closures.
+
+Each time is followed by the baseline revision's (see common.Baseline).
+
+Usage: python -m benchmarks.bench_variables [--baseline REV]
+"""
+import sys
+
+from benchmarks.common import Baseline, best_of, run_lox
+
+PROGRAMS = {
+    "locals": """
+fun work(n) {
+  var x = 0; var y = 1; var z = 2; var i = 0;
+  while (i < n) {
+    x = x + 1; y = y + x; z = y - x + z;
+    i = i + 1;
+  }
+  return x;
+}
+{ print work(30000); }
+""",
+    "globals": """
+var x = 0; var y = 1; var z = 2; var i = 0;
+while (i < 30000) {
+  x = x + 1; y = y + x; z = y - x + z;
+  i = i + 1;
+}
+{ print x; }
+""",
+    "closures": """
+fun makeCounter() {
+  var count = 0;
+  fun step(by) { count = count + by; return count; }
+  return step;
+}
+{
+  var counter = makeCounter();
+  var i = 0;
+  while (i < 20000) { counter(2); i = i + 1; }
+  print counter(0);
+}
+""",
+}
+
+
+def main():
+    baseline = Baseline(sys.argv)
+    for name, source in PROGRAMS.items():
+        seconds, output = best_of(lambda: run_lox(source), repeat=3)
+        print(f"{name:>9}: {seconds * 1000:8.1f} ms  -> {output.strip().splitlines()[-1]}"
+              + baseline.compare(source, seconds, output))
+
+
+if __name__ == "__main__":
+    main()
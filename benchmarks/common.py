@@ -0,0 +1,197 @@
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CHUNK = '''// generated chunk {i}
+fun helper{i}(a, b) {{
+  var total = 0;
+  var label = "chunk {i} says hello";
+  for (var j = 0; j < b; j = j + 1) {{
+    if (j >= a and total != 12.5) {{
+      total = total + j * 2 - (a / 3);
+    }} else {{
+      total = total - 1;
+    }}
+  }}
+  return total;
+}}
+var result{i} = helper{i}({i}, 10);
+'''
+
+
+def generate_program(chunks):
+    """Returns a synthetic Lox program made of ``chunks`` function blocks."""
+    return "".join(CHUNK.format(i=i) for i in range(chunks))
+
+
+def load_source(argv, default_chunks=5000):
+    """Returns the Lox source named on the command line, or a generated one."""
+    if len(argv) > 1:
+        with open(argv[1]) as source_file:
+            return source_file.read()
+    return generate_program(default_chunks)
+
+
+def best_of(func, repeat=5):
+    """Runs ``func`` ``repeat`` times and returns (best seconds, last result)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_lox(source, optimize=False):
+    """Scans, parses, resolves and runs ``source``; returns captured stdout."""
+    import contextlib
+    import io
+    from libs import tokenizer, parser, interpreter, resolver, optimizer
+
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    statements = parser.Parser(tokens).parse()
+    lox_interpreter = interpreter.Interpreter()
+    resolver.Resolver(lox_interpreter).resolve(statements)
+    if optimize:
+        statements = optimizer.Optimizer(lox_interpreter).optimize(statements)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for statement in statements:
+            lox_interpreter.run(statement)
+    return output.getvalue()
+
+
+def run_engine(source, engine, optimize=True, inline=None):
+    """Runs ``source`` as a module on ``engine``, an Interpreter class.
+
+    Returns captured stdout, with a runtime error's message as the last
+    line, as ``main.py run`` would print it. ``inline`` defaults to
+    ``optimize``.
+    """
+    import contextlib
+    import io
+    from libs import tokenizer, parser, interpreter, resolver, inliner, optimizer, modules
+
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    parse = parser.Parser(tokens)
+    statements = parse.parse()
+    front_end = interpreter.Interpreter()
+    module_resolver = resolver.Resolver(front_end)
+    module_resolver.resolve(statements)
+    if optimize if inline is None else inline:
+        statements = inliner.Inliner(module_resolver.purity, parse.lines).inline(statements)
+    if optimize:
+        statements = optimizer.Optimizer(front_end).optimize(statements)
+    module = modules.Module("<benchmark>", statements, parse.lines, front_end.globals.slots)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            engine().execute_module(module)
+        except Exception as error:
+            print(error)
+    return output.getvalue()
+
+
+# Times a program on another revision's interpreter, in a process of its
+# own so the two versions of libs never meet. Every revision has the
+# classic Scanner, Parser, Resolver and Interpreter.run, so this is
+# run_lox as the first revision could run it.
+BASELINE_TIMER = """
+import contextlib, io, sys, time
+sys.path.insert(0, sys.argv[1])
+from libs import tokenizer, parser, interpreter, resolver
+
+source = sys.stdin.read()
+
+def run():
+    tokens, _ = tokenizer.Scanner(source).scan_tokens()
+    statements = parser.Parser(tokens).parse()
+    lox_interpreter = interpreter.Interpreter()
+    resolver.Resolver(lox_interpreter).resolve(statements)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for statement in statements:
+            lox_interpreter.run(statement)
+    return output.getvalue()
+
+best = float("inf")
+for _ in range(int(sys.argv[2])):
+    start = time.perf_counter()
+    try:
+        output = run()
+    except Exception as error:
+        print(f"fails: {type(error).__name__}")
+        sys.exit(0)
+    best = min(best, time.perf_counter() - start)
+print(best)
+print(output.strip().splitlines()[-1] if output.strip() else "")
+"""
+
+
+class Baseline:
+    """Another revision of the interpreter, to time programs against.
+
+    Defaults to the repository's first commit, which keeps variables in
+    dicts, returns by raising an exception and nests a Python call per Lox
+    call: the paths the later optimizations replaced. ``--baseline REV`` on
+    the command line picks another revision.
+    """
+
+    def __init__(self, argv):
+        revision = None
+        if "--baseline" in argv:
+            revision = argv[argv.index("--baseline") + 1]
+        self.directory = None
+        self.error = None
+        try:
+            if revision is None:
+                revision = self.git("rev-list", "--max-parents=0", "HEAD").split()[-1]
+            archive = subprocess.run(["git", "archive", revision, "libs"], cwd=ROOT,
+                                     capture_output=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError) as error:
+            self.error = f"no baseline ({error})"
+            return
+        self.revision = revision[:10]
+        self.directory = tempfile.TemporaryDirectory(prefix="jplox-baseline-")
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(self.directory.name)
+
+    @staticmethod
+    def git(*arguments):
+        return subprocess.run(["git", *arguments], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout
+
+    def time(self, source, repeat=3):
+        """(best seconds, last line printed) for the baseline running
+        ``source``, or the text to print instead when it cannot."""
+        if self.directory is None:
+            return self.error
+        result = subprocess.run([sys.executable, "-c", BASELINE_TIMER, self.directory.name, str(repeat)],
+                                input=source, capture_output=True, text=True)
+        if result.returncode != 0:
+            return f"baseline fails: {result.stderr.strip().splitlines()[-1]}"
+        lines = result.stdout.split("\n")
+        if lines[0].startswith("fails"):
+            return f"baseline {self.revision} {lines[0]}"
+        return float(lines[0]), lines[1]
+
+    def compare(self, source, seconds, output):
+        """What to print after a program's own time and ``output``: the
+        baseline's time and how many times faster this revision is."""
+        baseline = self.time(source)
+        if isinstance(baseline, str):
+            return f"  ({baseline})"
+        baseline_seconds, last_line = baseline
+        text = f"  baseline {self.revision} {baseline_seconds * 1000:8.1f} ms  ({baseline_seconds / seconds:5.2f}x)"
+        if last_line != output.strip().splitlines()[-1]:
+            text += f", but it printed {last_line}"
+        return text
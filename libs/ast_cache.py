@@ -0,0 +1,158 @@
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+
+from . import __version__
+
+
+class CacheDirectoryError(Exception):
+    """The cache directory cannot be created or is not safe to load from."""
+
+
+class AstCache:
+    """On-disk cache of resolved programs, the Lox analogue of ``__pycache__``.
+
+    Each entry holds one pickled, fully resolved module: its statements,
+    with the resolver's depths and slots already on them, the parser's line
+    table and the numbering of its global names. Entries are keyed by the
+    script's content plus a fingerprint of the interpreter itself, so editing
+    either the script or the interpreter makes old entries unreachable; they
+    are deleted when the script is next stored, or evicted oldest-first
+    whenever the cache is opened or stored to and the directory is past
+    ``max_bytes``.
+
+    Loading an entry unpickles it, which can run any code, so the cache
+    only uses a directory that the current user owns and nobody else can
+    write to, and creates it that way.
+    """
+
+    default_directory = os.path.join(os.path.expanduser("~"), ".cache", "jplox")
+    default_max_bytes = 64 * 1024 * 1024
+    suffix = ".ast"
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.environ.get("JPLOX_CACHE_DIR") or self.default_directory
+        self.max_bytes = self.default_max_bytes if max_bytes is None else max_bytes
+        self.open_directory()
+        # The directory may have grown past a limit lowered since it was filled
+        try:
+            self.evict()
+        except OSError:
+            pass
+
+    def open_directory(self):
+        """Creates the directory if needed; raises CacheDirectoryError
+        unless only the current user can write to it."""
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            status = os.stat(self.directory)
+        except OSError as error:
+            raise CacheDirectoryError(f"cannot create {self.directory}: {error.strerror}.")
+        if hasattr(os, "getuid") and status.st_uid != os.getuid():
+            raise CacheDirectoryError(f"{self.directory} belongs to another user.")
+        if status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise CacheDirectoryError(f"{self.directory} is writable by other users.")
+
+    def key(self, path, variant=""):
+        """Returns the entry name for the current contents of ``path``.
+
+        ``variant`` tells apart entries built from the same script with
+        different front-end settings, such as with the optimizer disabled.
+        """
+        digest = hashlib.sha256(interpreter_fingerprint().encode())
+        digest.update(variant.encode())
+        with open(path, "rb") as source_file:
+            for chunk in iter(lambda: source_file.read(1 << 20), b""):
+                digest.update(chunk)
+        return f"{self.path_prefix(path, variant)}{digest.hexdigest()[:32]}{self.suffix}"
+
+    def path_prefix(self, path, variant=""):
+        # Variants of one script are separate entries that never replace each other
+        prefix = hashlib.sha256(os.path.abspath(path).encode() + b"\0" + variant.encode())
+        return prefix.hexdigest()[:16] + "-"
+
+    def load(self, key):
+        """Returns the entry stored under ``key``, or None on a miss."""
+        entry_path = os.path.join(self.directory, key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                entry = pickle.load(entry_file)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Unreadable or incompatible entries are dropped, not fatal
+            self.remove(entry_path)
+            return None
+        return entry
+
+    def store(self, key, entry):
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # Deeply nested programs are simply not cached
+            return
+        try:
+            self.remove_stale(key)
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as entry_file:
+                entry_file.write(data)
+            os.replace(temp_path, os.path.join(self.directory, key))
+            self.evict()
+        except OSError:
+            pass
+
+    def remove_stale(self, key):
+        """Deletes entries for older versions of the same script."""
+        prefix = key[: key.index("-") + 1]
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name != key:
+                self.remove(os.path.join(self.directory, name))
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            entry_path = os.path.join(self.directory, name)
+            try:
+                status = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime_ns, status.st_size, entry_path))
+            total += status.st_size
+
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(entry_path)
+            total -= size
+
+    def remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+_fingerprint = None
+
+def interpreter_fingerprint():
+    """Identifies the interpreter version and the code that built an entry."""
+    global _fingerprint
+    if _fingerprint is None:
+        package = os.path.dirname(os.path.abspath(__file__))
+        parts = [__version__]
+        for root, dirs, files in os.walk(package):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    status = os.stat(os.path.join(root, name))
+                    parts.append(f"{os.path.relpath(os.path.join(root, name), package)}:{status.st_size}:{status.st_mtime_ns}")
+        _fingerprint = "\n".join(parts)
+    return _fingerprint
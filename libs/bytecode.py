@@ -0,0 +1,584 @@
+from array import array
+
+from .tokenizer import TokenType
+from .parser import Expr, Stmt
+from .values import Nil, stringify
+
+# Every instruction is one opcode byte in Chunk.code plus one operand in
+# Chunk.args at the same index; opcodes that take no operand store 0.
+# Jump operands are absolute instruction indices.
+
+CONSTANT = 0            # push constants[arg]
+NIL = 1                 # push None (what a missing value evaluates to)
+POP = 2
+POPN = 3                # pop arg values
+GET_LOCAL = 4           # push stack[base + arg]
+SET_LOCAL = 5           # stack[base + arg] = top, leaving it on the stack
+GET_UPVALUE = 6
+SET_UPVALUE = 7
+GET_GLOBAL = 8          # arg is the global's slot in the module namespace
+SET_GLOBAL = 9
+DEFINE_GLOBAL = 10      # pops the value into the global's slot
+ADD = 11
+SUBTRACT = 12
+MULTIPLY = 13
+DIVIDE = 14
+NEGATE = 15
+NOT = 16
+EQUAL = 17
+NOT_EQUAL = 18
+LESS = 19
+LESS_EQUAL = 20
+GREATER = 21
+GREATER_EQUAL = 22
+JUMP = 23
+JUMP_IF_FALSE = 24      # jumps if the top is falsey, leaving it on the stack
+JUMP_IF_TRUE = 25
+POP_JUMP_IF_FALSE = 26  # pops the condition, then jumps if it was falsey
+CALL = 27               # arg is the argument count
+CLOSURE = 28            # constants[arg] is a Function
+CLOSE_UPVALUE = 29      # hoists the top local into its upvalue, then pops it
+RETURN = 30
+PRINT_RESULT = 31       # pops a statement result and prints it unless None
+NEW_LIST = 32
+LIST_APPEND = 33        # pops a value onto the list in local slot arg
+IMPORT = 34             # constants[arg] is the Stmt.Import
+# Fused forms of common sequences
+STORE_LOCAL = 35        # SET_LOCAL then POP, for assignment statements
+JUMP_UNLESS_LESS = 36   # LESS then POP_JUMP_IF_FALSE, for loop and if conditions
+JUMP_UNLESS_LESS_EQUAL = 37
+JUMP_UNLESS_GREATER = 38
+JUMP_UNLESS_GREATER_EQUAL = 39
+TAIL_CALL = 40          # CALL then RETURN, reusing the caller's frame
+STORE_GLOBAL = 41       # SET_GLOBAL then POP
+ADD_CONSTANT = 42       # CONSTANT then ADD, for `x + 1` and `s + "!"`; arg
+                        # indexes the constants like CONSTANT's
+SUBTRACT_CONSTANT = 43  # CONSTANT then SUBTRACT
+APPEND_NIL = 44         # NIL then LIST_APPEND, for loop bodies that give no result
+MULTIPLY_CONSTANT = 45
+DIVIDE_CONSTANT = 46
+
+OPCODE_NAMES = [
+    "CONSTANT", "NIL", "POP", "POPN", "GET_LOCAL", "SET_LOCAL", "GET_UPVALUE",
+    "SET_UPVALUE", "GET_GLOBAL", "SET_GLOBAL", "DEFINE_GLOBAL", "ADD",
+    "SUBTRACT", "MULTIPLY", "DIVIDE", "NEGATE", "NOT", "EQUAL", "NOT_EQUAL",
+    "LESS", "LESS_EQUAL", "GREATER", "GREATER_EQUAL", "JUMP", "JUMP_IF_FALSE",
+    "JUMP_IF_TRUE", "POP_JUMP_IF_FALSE", "CALL", "CLOSURE", "CLOSE_UPVALUE",
+    "RETURN", "PRINT_RESULT", "NEW_LIST", "LIST_APPEND", "IMPORT",
+    "STORE_LOCAL", "JUMP_UNLESS_LESS", "JUMP_UNLESS_LESS_EQUAL",
+    "JUMP_UNLESS_GREATER", "JUMP_UNLESS_GREATER_EQUAL", "TAIL_CALL",
+    "STORE_GLOBAL", "ADD_CONSTANT", "SUBTRACT_CONSTANT", "APPEND_NIL",
+    "MULTIPLY_CONSTANT", "DIVIDE_CONSTANT",
+]
+
+WITH_OPERAND = {
+    CONSTANT, POPN, GET_LOCAL, SET_LOCAL, GET_UPVALUE, SET_UPVALUE, GET_GLOBAL,
+    SET_GLOBAL, DEFINE_GLOBAL, JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE,
+    POP_JUMP_IF_FALSE, CALL, CLOSURE, LIST_APPEND, IMPORT, STORE_LOCAL,
+    JUMP_UNLESS_LESS, JUMP_UNLESS_LESS_EQUAL, JUMP_UNLESS_GREATER,
+    JUMP_UNLESS_GREATER_EQUAL, TAIL_CALL, STORE_GLOBAL, ADD_CONSTANT,
+    SUBTRACT_CONSTANT, APPEND_NIL, MULTIPLY_CONSTANT, DIVIDE_CONSTANT,
+}
+
+BINARY_OPCODES = {
+    TokenType.PLUS: ADD,
+    TokenType.MINUS: SUBTRACT,
+    TokenType.STAR: MULTIPLY,
+    TokenType.SLASH: DIVIDE,
+    TokenType.EQUAL_EQUAL: EQUAL,
+    TokenType.BANG_EQUAL: NOT_EQUAL,
+    TokenType.LESS: LESS,
+    TokenType.LESS_EQUAL: LESS_EQUAL,
+    TokenType.GREATER: GREATER,
+    TokenType.GREATER_EQUAL: GREATER_EQUAL,
+}
+
+COMPARE_JUMPS = {
+    TokenType.LESS: JUMP_UNLESS_LESS,
+    TokenType.LESS_EQUAL: JUMP_UNLESS_LESS_EQUAL,
+    TokenType.GREATER: JUMP_UNLESS_GREATER,
+    TokenType.GREATER_EQUAL: JUMP_UNLESS_GREATER_EQUAL,
+}
+
+# Operators with a fused form for a literal right operand
+CONSTANT_OPCODES = {
+    TokenType.PLUS: ADD_CONSTANT,
+    TokenType.MINUS: SUBTRACT_CONSTANT,
+    TokenType.STAR: MULTIPLY_CONSTANT,
+    TokenType.SLASH: DIVIDE_CONSTANT,
+}
+
+# Literal types whose constants can be shared within a chunk
+SHARED_CONSTANTS = (str, float, bool, int, Nil, type(None))
+
+
+class Chunk:
+    """The compiled code of one function."""
+
+    def __init__(self):
+        self.code = array("B")
+        self.args = array("i")
+        # Source line of every instruction
+        self.lines = array("i")
+        self.constants = []
+        self.constant_indices = {}
+
+    def write(self, opcode, arg, line):
+        self.code.append(opcode)
+        self.args.append(arg)
+        self.lines.append(line)
+        return len(self.code) - 1
+
+    def add_constant(self, value):
+        if isinstance(value, SHARED_CONSTANTS):
+            # repr keeps apart values Python considers equal, like 0.0 and -0.0
+            key = (value.__class__, repr(value))
+            index = self.constant_indices.get(key)
+            if index is None:
+                index = self.constant_indices[key] = len(self.constants)
+                self.constants.append(value)
+            return index
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+
+class Function:
+    """A compiled Lox function, or a module's top level."""
+
+    def __init__(self, name, arity):
+        self.name = name
+        self.arity = arity
+        self.chunk = Chunk()
+        # (is_local, index) for each variable the function captures: a slot
+        # of the enclosing function's frame, or one of its upvalues
+        self.upvalues = []
+
+
+class Local:
+    __slots__ = ("name", "depth", "captured")
+
+    def __init__(self, name, depth):
+        self.name = name
+        # Scope depth, or None while the variable's initializer runs
+        self.depth = depth
+        self.captured = False
+
+
+class FunctionState:
+    """Compile-time bookkeeping for the function being compiled."""
+
+    def __init__(self, enclosing, function):
+        self.enclosing = enclosing
+        self.function = function
+        # Slot 0 holds the function being called
+        self.locals = [Local("", 0)]
+        self.scope_depth = 0
+
+    def resolve_local(self, name):
+        for index in range(len(self.locals) - 1, -1, -1):
+            if self.locals[index].name == name:
+                return index
+        return None
+
+    def resolve_upvalue(self, name):
+        if self.enclosing is None:
+            return None
+        index = self.enclosing.resolve_local(name)
+        if index is not None:
+            self.enclosing.locals[index].captured = True
+            return self.add_upvalue(True, index)
+        index = self.enclosing.resolve_upvalue(name)
+        if index is not None:
+            return self.add_upvalue(False, index)
+        return None
+
+    def add_upvalue(self, is_local, index):
+        upvalues = self.function.upvalues
+        if (is_local, index) in upvalues:
+            return upvalues.index((is_local, index))
+        upvalues.append((is_local, index))
+        return len(upvalues) - 1
+
+
+class Compiler(Expr.Visitor, Stmt.Visitor):
+    """Compiles one module's resolved statements to bytecode.
+
+    Lox locals live on the VM's value stack and are found by name here, the
+    way clox does it; globals keep the slots the resolver gave them. The
+    resolver has already reported every error, so none are checked again.
+
+    Statements compile either for effect or, where the tree walker would
+    print or collect their result (inside a block, or as an if branch or
+    loop body there), so that they leave exactly one value on the stack.
+    """
+
+    def __init__(self, lines=None):
+        # Parser side table: operator and call node -> source line
+        self.lines = lines or {}
+        self.state = None
+        self.line = 0
+        # Whether the statement being compiled leaves its result on the stack
+        self.keep = False
+
+    def compile(self, statements, name="<script>"):
+        """Returns the Function that runs ``statements`` as a module's top level."""
+        self.state = FunctionState(None, Function(name, 0))
+        for statement in statements:
+            self.statement(statement, False)
+        self.emit(NIL)
+        self.emit(RETURN)
+        return self.state.function
+
+    def emit(self, opcode, arg=0):
+        return self.state.function.chunk.write(opcode, arg, self.line)
+
+    def patch_jump(self, index):
+        chunk = self.state.function.chunk
+        chunk.args[index] = len(chunk.code)
+
+    def patch_jumps(self, indices):
+        for index in indices:
+            self.patch_jump(index)
+
+    def emit_constant(self, value):
+        self.emit(CONSTANT, self.state.function.chunk.add_constant(value))
+
+    def statement(self, stmt, keep):
+        """Compiles ``stmt``; if ``keep``, its result is left on the stack."""
+        self.keep = keep
+        stmt.accept(self)
+
+    def block_statement(self, stmt):
+        # Mirrors Interpreter.execute_block: results other than None are
+        # printed
+        if has_result(stmt):
+            self.statement(stmt, True)
+            self.emit(PRINT_RESULT)
+        else:
+            self.statement(stmt, False)
+
+    def expression(self, expr):
+        expr.accept(self)
+
+    def begin_scope(self):
+        self.state.scope_depth += 1
+
+    def end_scope(self):
+        state = self.state
+        state.scope_depth -= 1
+        locals = state.locals
+        pending = 0
+        while locals and locals[-1].depth is not None and locals[-1].depth > state.scope_depth:
+            if locals.pop().captured:
+                if pending:
+                    self.emit_pops(pending)
+                    pending = 0
+                self.emit(CLOSE_UPVALUE)
+            else:
+                pending += 1
+        if pending:
+            self.emit_pops(pending)
+
+    def emit_pops(self, count):
+        if count == 1:
+            self.emit(POP)
+        else:
+            self.emit(POPN, count)
+
+    def declare_local(self, name):
+        # Declared but not yet defined: reads in its own initializer see nil
+        self.state.locals.append(Local(name, None))
+
+    def define_local(self):
+        self.state.locals[-1].depth = self.state.scope_depth
+
+    def jump_unless(self, condition):
+        """Compiles ``condition`` and the jumps taken when it is falsey;
+        returns the jumps."""
+        while isinstance(condition, Expr.Grouping):
+            condition = condition.expression
+        if isinstance(condition, Expr.Logical) and condition.operator == TokenType.AND:
+            # Only the truth of the and matters, not which operand it gives
+            return self.jump_unless(condition.left) + self.jump_unless(condition.right)
+        if isinstance(condition, Expr.Binary) and condition.operator in COMPARE_JUMPS:
+            self.expression(condition.left)
+            self.expression(condition.right)
+            self.line = self.lines.get(condition, self.line)
+            return [self.emit(COMPARE_JUMPS[condition.operator])]
+        self.expression(condition)
+        return [self.emit(POP_JUMP_IF_FALSE)]
+
+    def visit_expression_stmt(self, stmt):
+        keep = self.keep
+        expr = stmt.expression
+        if isinstance(expr, Expr.Assign) and expr.depth is None:
+            self.expression(expr.value)
+            self.line = expr.name.line
+            self.emit(STORE_GLOBAL, expr.slot)
+        elif (isinstance(expr, Expr.Assign) and expr.depth is not None
+                and self.state.resolve_local(expr.name.lexeme) is not None):
+            self.expression(expr.value)
+            self.line = expr.name.line
+            self.emit(STORE_LOCAL, self.state.resolve_local(expr.name.lexeme))
+        else:
+            self.expression(expr)
+            self.emit(POP)
+        if keep:
+            self.emit(NIL)
+
+    def visit_print_stmt(self, stmt):
+        keep = self.keep
+        self.expression(stmt.expression)
+        if not keep:
+            self.emit(POP)
+
+    def visit_var_stmt(self, stmt):
+        keep = self.keep
+        self.line = stmt.name.line
+        local = self.state.scope_depth > 0
+        if local:
+            self.declare_local(stmt.name.lexeme)
+        if stmt.initializer is None:
+            self.emit(NIL)
+        else:
+            self.expression(stmt.initializer)
+        if local:
+            self.define_local()
+        else:
+            self.line = stmt.name.line
+            self.emit(DEFINE_GLOBAL, stmt.slot)
+        if keep:
+            self.emit(NIL)
+
+    def visit_function_stmt(self, stmt):
+        keep = self.keep
+        self.line = stmt.name.line
+        local = self.state.scope_depth > 0
+        if local:
+            # Defined before the body is compiled so the function can recurse
+            self.declare_local(stmt.name.lexeme)
+            self.define_local()
+
+        function = Function(stmt.name.lexeme, len(stmt.params))
+        enclosing = self.state
+        self.state = FunctionState(enclosing, function)
+        self.begin_scope()
+        for param in stmt.params:
+            self.declare_local(param.lexeme)
+            self.define_local()
+        for statement in stmt.body:
+            self.block_statement(statement)
+        self.emit(NIL)
+        self.emit(RETURN)
+        self.state = enclosing
+
+        self.line = stmt.name.line
+        self.emit(CLOSURE, self.state.function.chunk.add_constant(function))
+        if not local:
+            self.emit(DEFINE_GLOBAL, stmt.slot)
+        if keep:
+            self.emit(NIL)
+
+    def visit_return_stmt(self, stmt):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emit(NIL)
+        elif isinstance(stmt.value, Expr.Call):
+            # A Lox callee replaces this frame; a native one returns here
+            self.call(stmt.value, TAIL_CALL)
+        else:
+            self.expression(stmt.value)
+        self.emit(RETURN)
+
+    def visit_if_stmt(self, stmt):
+        keep = self.keep
+        else_jumps = self.jump_unless(stmt.condition)
+        self.statement(stmt.then_branch, keep)
+        if stmt.else_branch is None and not keep:
+            self.patch_jumps(else_jumps)
+            return
+
+        end_jump = self.emit(JUMP)
+        self.patch_jumps(else_jumps)
+        if stmt.else_branch is not None:
+            self.statement(stmt.else_branch, keep)
+        else:
+            self.emit(NIL)
+        self.patch_jump(end_jump)
+
+    def visit_while_stmt(self, stmt):
+        keep = self.keep
+        state = self.state
+        if keep:
+            # The result list sits on the stack under the loop's locals
+            self.emit(NEW_LIST)
+            results = len(state.locals)
+            state.locals.append(Local("", state.scope_depth))
+
+        start = len(state.function.chunk.code)
+        exit_jumps = self.jump_unless(stmt.condition)
+        if keep and not has_result(stmt.body):
+            self.statement(stmt.body, False)
+            self.emit(APPEND_NIL, results)
+        elif keep:
+            self.statement(stmt.body, True)
+            self.emit(LIST_APPEND, results)
+        else:
+            self.statement(stmt.body, False)
+        self.emit(JUMP, start)
+        self.patch_jumps(exit_jumps)
+
+        if keep:
+            # Left on the stack as the statement's result
+            state.locals.pop()
+
+    def visit_block_stmt(self, stmt):
+        keep = self.keep
+        self.begin_scope()
+        for statement in stmt.declarations:
+            self.block_statement(statement)
+        self.end_scope()
+        if keep:
+            self.emit(NIL)
+
+    def visit_import_stmt(self, stmt):
+        keep = self.keep
+        self.line = stmt.keyword.line
+        self.emit(IMPORT, self.state.function.chunk.add_constant(stmt))
+        if keep:
+            self.emit(NIL)
+
+    def visit_literal_expr(self, expr):
+        self.emit_constant(expr.value)
+
+    def visit_grouping_expr(self, expr):
+        self.expression(expr.expression)
+
+    def visit_variable_expr(self, expr):
+        self.line = expr.name.line
+        if expr.depth is None:
+            self.emit(GET_GLOBAL, expr.slot)
+            return
+
+        state = self.state
+        index = state.resolve_local(expr.name.lexeme)
+        if index is not None:
+            if state.locals[index].depth is None:
+                # Read in its own initializer
+                self.emit(NIL)
+            else:
+                self.emit(GET_LOCAL, index)
+        else:
+            self.emit(GET_UPVALUE, state.resolve_upvalue(expr.name.lexeme))
+
+    def visit_assign_expr(self, expr):
+        self.expression(expr.value)
+        self.line = expr.name.line
+        if expr.depth is None:
+            self.emit(SET_GLOBAL, expr.slot)
+            return
+
+        state = self.state
+        index = state.resolve_local(expr.name.lexeme)
+        if index is not None:
+            self.emit(SET_LOCAL, index)
+        else:
+            self.emit(SET_UPVALUE, state.resolve_upvalue(expr.name.lexeme))
+
+    def visit_logical_expr(self, expr):
+        self.expression(expr.left)
+        self.line = self.lines.get(expr, self.line)
+        if expr.operator == TokenType.OR:
+            end_jump = self.emit(JUMP_IF_TRUE)
+        else:
+            end_jump = self.emit(JUMP_IF_FALSE)
+        self.emit(POP)
+        self.expression(expr.right)
+        self.patch_jump(end_jump)
+
+    def visit_unary_expr(self, expr):
+        self.expression(expr.right)
+        self.line = self.lines.get(expr, self.line)
+        if expr.operator == TokenType.BANG:
+            self.emit(NOT)
+        elif expr.operator == TokenType.MINUS:
+            self.emit(NEGATE)
+        else:
+            self.emit(POP)
+            self.emit(NIL)
+
+    def visit_binary_expr(self, expr):
+        self.expression(expr.left)
+        if isinstance(expr.right, Expr.Literal) and expr.operator in CONSTANT_OPCODES:
+            self.line = self.lines.get(expr, self.line)
+            self.emit(CONSTANT_OPCODES[expr.operator], self.state.function.chunk.add_constant(expr.right.value))
+            return
+        self.expression(expr.right)
+        self.line = self.lines.get(expr, self.line)
+        opcode = BINARY_OPCODES.get(expr.operator)
+        if opcode is None:
+            self.emit(POPN, 2)
+            self.emit(NIL)
+        else:
+            self.emit(opcode)
+
+    def visit_call_expr(self, expr):
+        self.call(expr, CALL)
+
+    def call(self, expr, opcode):
+        self.expression(expr.callee)
+        for argument in expr.arguments:
+            self.expression(argument)
+        self.line = self.lines.get(expr, self.line)
+        self.emit(opcode, len(expr.arguments))
+
+
+def has_result(stmt):
+    """Whether the tree walker can give ``stmt`` a result other than None,
+    which a block prints."""
+    if isinstance(stmt, (Stmt.Print, Stmt.While)):
+        return True
+    if isinstance(stmt, Stmt.If):
+        return (has_result(stmt.then_branch)
+                or (stmt.else_branch is not None and has_result(stmt.else_branch)))
+    return False
+
+
+def disassemble(function, out=None):
+    """Prints ``function``'s bytecode, then that of every function it defines."""
+    chunk = function.chunk
+    print(f"== {function.name} ==", file=out)
+    previous_line = None
+    for index, opcode in enumerate(chunk.code):
+        arg = chunk.args[index]
+        line = chunk.lines[index]
+        line_column = "   |" if line == previous_line else f"{line:4d}"
+        previous_line = line
+        name = OPCODE_NAMES[opcode]
+        if opcode not in WITH_OPERAND:
+            print(f"{index:04d} {line_column} {name}", file=out)
+            continue
+
+        if opcode in (CONSTANT, CLOSURE, IMPORT, ADD_CONSTANT, SUBTRACT_CONSTANT,
+                      MULTIPLY_CONSTANT, DIVIDE_CONSTANT):
+            detail = describe_constant(chunk.constants[arg])
+        else:
+            detail = ""
+        print(f"{index:04d} {line_column} {name:<18}{arg:5d} {detail}".rstrip(), file=out)
+
+    for constant in chunk.constants:
+        if isinstance(constant, Function):
+            print(file=out)
+            disassemble(constant, out)
+
+
+def describe_constant(value):
+    if isinstance(value, Function):
+        captures = " ".join(f"{'local' if is_local else 'upvalue'} {index}"
+                            for is_local, index in value.upvalues)
+        return f"<fn {value.name}> {captures}".rstrip()
+    if isinstance(value, Stmt.Import):
+        return f'"{value.path.literal}"'
+    if isinstance(value, str):
+        return repr(value)
+    return stringify(value)
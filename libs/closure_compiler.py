@@ -0,0 +1,429 @@
+from .tokenizer import TokenType
+from .parser import Expr, Stmt
+from .enviornment import Environment, MISSING
+from .interpreter import Interpreter, RuntimeError
+from .fun_impl.jplox_callable import LoxCallable
+from .fun_impl.jplox_function import LoxFunction
+from .fun_impl.fun_return import Return
+from .values import NUMBER_CLASSES, LoopResults, lox_string, is_falsey, bang, is_equal, stringify
+
+# Every compiled node is a Python closure taking the current frame (a local
+# Environment, or the module's GlobalEnvironment at top level). Expressions
+# return their value; statements return what the tree walker's visit method
+# returns, since blocks print every statement result that is not None,
+# and a Return once a return statement has run.
+
+def run_statements(statements, environment, output):
+    for statement in statements:
+        result = statement(environment)
+        if result is not None:
+            if result.__class__ is Return:
+                return result
+            output.line(stringify(result))
+    return None
+
+class CompiledFunction(LoxFunction):
+    """A Lox function whose body has been compiled to closures."""
+
+    def __init__(self, declaration, closure, body):
+        super().__init__(declaration, closure)
+        self.body = body
+
+    def call(self, interpreter, arguments):
+        function = self
+        while True:
+            result = function.run_body(arguments, interpreter.output)
+            if result is None:
+                return None
+            if result.callee is None:
+                return result.value
+            # A tail call: run it here instead of one Python frame deeper
+            function = result.callee
+            arguments = result.arguments
+
+    def run_body(self, arguments, output):
+        declaration = self.declaration
+        if declaration.leaf:
+            frames = self.frames
+            if frames:
+                environment = frames.pop()
+            else:
+                environment = Environment(declaration.size, self.closure)
+            environment.values[:len(arguments)] = arguments
+            try:
+                return run_statements(self.body, environment, output)
+            finally:
+                frames.append(environment)
+
+        environment = Environment(declaration.size, self.closure)
+        environment.values[:len(arguments)] = arguments
+        return run_statements(self.body, environment, output)
+
+class ClosureCompiler(Expr.Visitor, Stmt.Visitor):
+    """Turns one module's resolved statements into closures.
+
+    Dispatch on node type and operator happens once, here, instead of on
+    every evaluation. Global slots are bound to the module's namespace at
+    compile time.
+    """
+
+    def __init__(self, interpreter, globals):
+        self.interpreter = interpreter
+        self.globals = globals
+
+    def compile(self, statements):
+        return [statement.accept(self) for statement in statements]
+
+    def compile_expr(self, expr):
+        return expr.accept(self)
+
+    def visit_expression_stmt(self, stmt):
+        expression = self.compile_expr(stmt.expression)
+        def run(environment):
+            expression(environment)
+        return run
+
+    def visit_print_stmt(self, stmt):
+        # Printing happens in the enclosing block, like the tree walker
+        return self.compile_expr(stmt.expression)
+
+    def visit_var_stmt(self, stmt):
+        slot = stmt.slot
+        if stmt.initializer is None:
+            def run(environment):
+                environment.values[slot] = None
+            return run
+
+        initializer = self.compile_expr(stmt.initializer)
+        def run(environment):
+            environment.values[slot] = initializer(environment)
+        return run
+
+    def visit_function_stmt(self, stmt):
+        slot = stmt.slot
+        body = self.compile(stmt.body)
+        def run(environment):
+            environment.values[slot] = CompiledFunction(stmt, environment, body)
+        return run
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is None:
+            def run(environment):
+                return Return(None)
+            return run
+
+        if isinstance(stmt.value, Expr.Call):
+            target = self.compile_call_target(stmt.value)
+            interpreter = self.interpreter
+            def run(environment):
+                function, values = target(environment)
+                if function.__class__ is CompiledFunction:
+                    # A tail call: the function returning runs it
+                    return Return(None, function, values)
+                return Return(function.call(interpreter, values))
+            return run
+
+        value = self.compile_expr(stmt.value)
+        def run(environment):
+            return Return(value(environment))
+        return run
+
+    def visit_if_stmt(self, stmt):
+        condition = self.compile_expr(stmt.condition)
+        then_branch = stmt.then_branch.accept(self)
+        if stmt.else_branch is None:
+            def run(environment):
+                if is_falsey(condition(environment)):
+                    return None
+                return then_branch(environment)
+            return run
+
+        else_branch = stmt.else_branch.accept(self)
+        def run(environment):
+            if is_falsey(condition(environment)):
+                return else_branch(environment)
+            return then_branch(environment)
+        return run
+
+    def visit_while_stmt(self, stmt):
+        condition = self.compile_expr(stmt.condition)
+        body = stmt.body.accept(self)
+        def run(environment):
+            result = LoopResults()
+            while not is_falsey(condition(environment)):
+                value = body(environment)
+                if value.__class__ is Return:
+                    return value
+                result.append(value)
+            return result
+        return run
+
+    def visit_block_stmt(self, stmt):
+        statements = self.compile(stmt.declarations)
+        size = stmt.size
+        output = self.interpreter.output
+        if size is None:
+            def run(environment):
+                return run_statements(statements, environment, output)
+        else:
+            def run(environment):
+                return run_statements(statements, Environment(size, environment), output)
+        return run
+
+    def visit_import_stmt(self, stmt):
+        interpreter = self.interpreter
+        def run(environment):
+            interpreter.import_module(stmt, environment)
+        return run
+
+    def visit_literal_expr(self, expr):
+        value = expr.value
+        return lambda environment: value
+
+    def visit_grouping_expr(self, expr):
+        return self.compile_expr(expr.expression)
+
+    def visit_variable_expr(self, expr):
+        slot = expr.slot
+        depth = expr.depth
+        if depth is None:
+            globals = self.globals
+            values = globals.values
+            name = expr.name
+            def run(environment):
+                value = values[slot]
+                if value is MISSING:
+                    return globals.get(name, slot)
+                return value
+        elif depth == 0:
+            def run(environment):
+                return environment.values[slot]
+        elif depth == 1:
+            def run(environment):
+                return environment.enclosing.values[slot]
+        else:
+            def run(environment):
+                for _ in range(depth):
+                    environment = environment.enclosing
+                return environment.values[slot]
+        return run
+
+    def visit_assign_expr(self, expr):
+        value = self.compile_expr(expr.value)
+        slot = expr.slot
+        depth = expr.depth
+        if depth is None:
+            globals = self.globals
+            values = globals.values
+            name = expr.name
+            def run(environment):
+                result = value(environment)
+                if values[slot] is MISSING:
+                    globals.assign(name, slot, result)
+                values[slot] = result
+                return result
+        elif depth == 0:
+            def run(environment):
+                result = environment.values[slot] = value(environment)
+                return result
+        else:
+            def run(environment):
+                result = value(environment)
+                for _ in range(depth):
+                    environment = environment.enclosing
+                environment.values[slot] = result
+                return result
+        return run
+
+    def visit_logical_expr(self, expr):
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        if expr.operator == TokenType.OR:
+            def run(environment):
+                value = left(environment)
+                if not is_falsey(value):
+                    return value
+                return right(environment)
+        else:
+            def run(environment):
+                value = left(environment)
+                if is_falsey(value):
+                    return value
+                return right(environment)
+        return run
+
+    def visit_unary_expr(self, expr):
+        right = self.compile_expr(expr.right)
+        operator = expr.operator
+        if operator == TokenType.BANG:
+            def run(environment):
+                return bang(right(environment))
+        elif operator == TokenType.MINUS:
+            def run(environment):
+                value = right(environment)
+                if value.__class__ is float:
+                    return -value
+                raise RuntimeError(operator, "Operand must be a number.")
+        else:
+            def run(environment):
+                right(environment)
+                return None
+        return run
+
+    def visit_binary_expr(self, expr):
+        left = self.compile_expr(expr.left)
+        right = self.compile_expr(expr.right)
+        operator = expr.operator
+        compile_operator = BINARY_OPERATORS.get(operator)
+        if compile_operator is None:
+            def run(environment):
+                left(environment)
+                right(environment)
+                return None
+            return run
+        return compile_operator(left, right, operator)
+
+    def visit_call_expr(self, expr):
+        callee = self.compile_expr(expr.callee)
+        arguments = [self.compile_expr(argument) for argument in expr.arguments]
+        interpreter = self.interpreter
+        def run(environment):
+            function = callee(environment)
+            values = [argument(environment) for argument in arguments]
+            if not isinstance(function, LoxCallable):
+                raise RuntimeError(expr, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise RuntimeError(expr, f"Expected {function.arity()} arguments but got {len(values)}.")
+            return function.call(interpreter, values)
+        return run
+
+    def compile_call_target(self, expr):
+        """Like visit_call_expr, but the closure returns (function, arguments)
+        for the caller to call."""
+        callee = self.compile_expr(expr.callee)
+        arguments = [self.compile_expr(argument) for argument in expr.arguments]
+        def run(environment):
+            function = callee(environment)
+            values = [argument(environment) for argument in arguments]
+            if not isinstance(function, LoxCallable):
+                raise RuntimeError(expr, "Can only call functions and classes.")
+            if len(values) != function.arity():
+                raise RuntimeError(expr, f"Expected {function.arity()} arguments but got {len(values)}.")
+            return function, values
+        return run
+
+# Binary operators, each specialized when the node is compiled. Number
+# checks match Interpreter.check_number_operands, which also accepts the
+# int results of !, so arithmetic has a short path for two floats.
+
+def compile_less(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return a < b
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_less_equal(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return a <= b
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_greater(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return a > b
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_greater_equal(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return a >= b
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_minus(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ is float and b.__class__ is float:
+            return a - b
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return float(a - b)
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_slash(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ is float and b.__class__ is float:
+            return a / b
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return float(a) / b
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_star(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ is float and b.__class__ is float:
+            return a * b
+        if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+            return float(a * b)
+        raise RuntimeError(operator, "Operands must be numbers.")
+    return run
+
+def compile_plus(left, right, operator):
+    def run(environment):
+        a = left(environment)
+        b = right(environment)
+        if a.__class__ is float and b.__class__ is float:
+            return a + b
+        if a.__class__ is str and b.__class__ is str:
+            return lox_string(a + b)
+        raise RuntimeError(operator, "Operands must be two numbers or two strings.")
+    return run
+
+def compile_equal_equal(left, right, operator):
+    def run(environment):
+        return is_equal(left(environment), right(environment))
+    return run
+
+def compile_bang_equal(left, right, operator):
+    def run(environment):
+        return not is_equal(left(environment), right(environment))
+    return run
+
+BINARY_OPERATORS = {
+    TokenType.LESS: compile_less,
+    TokenType.LESS_EQUAL: compile_less_equal,
+    TokenType.GREATER: compile_greater,
+    TokenType.GREATER_EQUAL: compile_greater_equal,
+    TokenType.MINUS: compile_minus,
+    TokenType.SLASH: compile_slash,
+    TokenType.STAR: compile_star,
+    TokenType.PLUS: compile_plus,
+    TokenType.EQUAL_EQUAL: compile_equal_equal,
+    TokenType.BANG_EQUAL: compile_bang_equal,
+}
+
+class ClosureInterpreter(Interpreter):
+    """Runs each module by compiling it to closures once, then calling them."""
+
+    def execute_module(self, module):
+        module.globals = self.new_globals(module.global_slots)
+        statements = ClosureCompiler(self, module.globals).compile(module.statements)
+        for statement in statements:
+            statement(module.globals)
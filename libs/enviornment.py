@@ -1,38 +1,76 @@
-class Environment:
-    def __init__(self, enclosing=None):
-        self.values = {}
-        self.enclosing = enclosing
+# Sentinel telling "not defined here" apart from a variable holding None
+MISSING = object()
+
+
+class GlobalEnvironment:
+    """A module's global namespace.
+
+    The resolver numbers every global name the module mentions, so reads and
+    writes index ``values`` directly instead of hashing the name. A slot
+    holds MISSING until its declaration runs: globals may still be defined
+    after the code that uses them, and reading one that never was is still
+    an error.
+    """
 
-    def get(self, name):
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+    def __init__(self, slots=None):
+        # Name -> index into values
+        self.slots = dict(slots) if slots else {}
+        self.values = [MISSING] * len(self.slots)
+        self.enclosing = None
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
+    def slot(self, name):
+        """Returns the index for ``name``, numbering it if it is new."""
+        index = self.slots.get(name)
+        if index is None:
+            index = self.slots[name] = len(self.values)
+            self.values.append(MISSING)
+        return index
+
+    def get(self, name, slot):
+        value = self.values[slot]
+        if value is not MISSING:
+            return value
 
         raise RuntimeError(f"Undefined variable '{name.lexeme}'.\n[line {name.line}]")
     
-    def assign(self, name, value):
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
-
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
+    def assign(self, name, slot, value):
+        if self.values[slot] is not MISSING:
+            self.values[slot] = value
             return
 
         raise RuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
     def define(self, name, value):
-        self.values[name] = value
+        self.values[self.slot(name)] = value
+
+    def items(self):
+        """Yields (name, value) for every global that has been defined."""
+        values = self.values
+        for name, index in self.slots.items():
+            if values[index] is not MISSING:
+                yield name, values[index]
 
-    def get_at(self, distance, name):
-        return self.ancestor(distance).values.get(name)
 
-    def ancestor(self, distance):
+class Environment:
+    """A local scope: one fixed-size frame of values, indexed by the slots
+    the resolver assigned to the scope's variables."""
+
+    __slots__ = ("values", "enclosing")
+
+    def __init__(self, size, enclosing):
+        self.values = [None] * size
+        self.enclosing = enclosing
+
+    def get_at(self, depth, slot):
         environment = self
-        for _ in range(distance):
+        while depth:
             environment = environment.enclosing
-        return environment
-
+            depth -= 1
+        return environment.values[slot]
 
+    def assign_at(self, depth, slot, value):
+        environment = self
+        while depth:
+            environment = environment.enclosing
+            depth -= 1
+        environment.values[slot] = value
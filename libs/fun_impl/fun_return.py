@@ -1,4 +1,15 @@
-class Return(Exception):
-    def __init__(self, value):
-        super().__init__(None, None)  # Disabling stack trace and message
+class Return:
+    """What a return statement evaluates to.
+
+    Statements hand it back up unchanged, so the rest of the function body
+    is skipped, until the function's call picks up ``value``. For a tail
+    call, ``return f(x);``, ``callee`` and ``arguments`` are set instead and
+    the caller runs that call in place of the one that returned.
+    """
+
+    __slots__ = ("value", "callee", "arguments")
+
+    def __init__(self, value, callee=None, arguments=None):
         self.value = value
+        self.callee = callee
+        self.arguments = arguments
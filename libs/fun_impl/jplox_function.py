@@ -1,42 +1,92 @@
 from .jplox_callable import LoxCallable
-from .fun_return import Return
 from libs.enviornment import Environment
 
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration, closure):
+    def __init__(self, declaration, closure, globals=None):
         self.declaration = declaration
         self.closure = closure
+        # Global namespace of the module the function was defined in
+        self.globals = globals
+        # Idle frames of a leaf function, reused by later calls
+        self.frames = []
 
     def arity(self):
         arity = len(self.declaration.params)
         return int(arity) 
 
-    def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
-        
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except Return as return_value:
-            return return_value.value
-        return None
+    def call(self, interpreter, arguments, memoize=True):
+        """Runs the call, and any tail calls it ends in; returns the result.
+
+        With ``memoize`` a pure function's result may come from, and goes
+        into, the interpreter's memo cache.
+        """
+        if memoize and interpreter.memo is not None and self.declaration.pure:
+            return interpreter.memo.call(self, interpreter, arguments)
+        function = self
+        while True:
+            globals = function.globals
+            if globals is not None and globals is not interpreter.globals:
+                # Called from another module: unresolved names are its own globals
+                previous_globals = interpreter.globals
+                interpreter.globals = globals
+                try:
+                    result = function.run_body(interpreter, arguments)
+                finally:
+                    interpreter.globals = previous_globals
+            else:
+                result = function.run_body(interpreter, arguments)
+
+            if result is None:
+                return None
+            if result.callee is None:
+                return result.value
+            # A tail call: run it here instead of one Python frame deeper
+            function = result.callee
+            arguments = result.arguments
+
+    def run_body(self, interpreter, arguments):
+        """Runs the body once; returns the Return it ended with, or None."""
+        declaration = self.declaration
+        if declaration.leaf:
+            frames = self.frames
+            if frames:
+                environment = frames.pop()
+            else:
+                environment = Environment(declaration.size, self.closure)
+            environment.values[:len(arguments)] = arguments
+            try:
+                return interpreter.execute_block(declaration.body, environment)
+            finally:
+                frames.append(environment)
+
+        environment = Environment(declaration.size, self.closure)
+        environment.values[:len(arguments)] = arguments
+        return interpreter.execute_block(declaration.body, environment)
     
     def to_string(self):
         return f"<fn {self.declaration.name.lexeme}>"
 
 class NativeFunction(LoxCallable):
-    def __init__(self, arity_func, call_func, to_string_func):
-        self.arity_func = arity_func
-        self.call_func = call_func
-        self.to_string_func = to_string_func
+    """A function implemented in Python; see libs/natives.py."""
+
+    def __init__(self, name, arity, function, pure=False, interpreter=False):
+        self.name = name
+        self.argument_count = arity
+        # Called with the Lox arguments, preceded by the interpreter if
+        # ``interpreter`` is set
+        self.function = function
+        # The result depends only on the arguments, as for a pure Lox
+        # function
+        self.pure = pure
+        self.interpreter = interpreter
 
     def arity(self):
-        return self.arity_func()
+        return self.argument_count
 
     def call(self, interpreter, arguments):
-        return self.call_func(interpreter, arguments)
+        if self.interpreter:
+            return self.function(interpreter, *arguments)
+        return self.function(*arguments)
 
     def to_string(self):
-        return self.to_string_func()
-
+        return "<native fn>"
@@ -0,0 +1,336 @@
+from .parser import Expr, Stmt
+
+# Most nodes the returned expression of an inlined function may have
+INLINE_BUDGET = 16
+
+
+class Inlinable:
+    """A global function whose body is ``return <expression>;``."""
+
+    __slots__ = ("function", "body", "uses", "events", "calls")
+
+    def __init__(self, function, body):
+        self.function = function
+        self.body = body
+        # Times each parameter is read
+        self.uses = [0] * len(function.params)
+        # The body's evaluation order, as parameter indexes and EFFECT for
+        # anything that may raise, print, assign, call or short-circuit
+        self.events = []
+        self.calls = False
+
+
+# Stands in Inlinable.events for a step that is not a parameter read
+EFFECT = -1
+
+
+class Inliner(Expr.Visitor, Stmt.Visitor):
+    """Replaces calls of small global functions with their body.
+
+    Runs after the resolver, which proved the function's name is declared
+    once and never assigned, and before the optimizer, which then folds
+    what inlining exposed. A function is inlined when
+
+      - it is declared at the top level and its body is a single return
+        of an expression of at most ``budget`` nodes that reads nothing
+        but its parameters and globals, assigns no parameter and does not
+        call the function itself
+      - its name is only ever called, never passed around as a value
+      - the call comes after the declaration at the top level, so the name
+        is bound when it runs, and passes the right number of arguments
+
+    The call then becomes a copy of the expression with each parameter
+    replaced by its argument. Lox evaluates every argument before the
+    body, and the copy evaluates them where the parameters are read, so a
+    call is only inlined when that cannot be told apart: an argument that
+    may have an effect must be read exactly once, in argument order,
+    before the body does anything else. Literals, and local variables when
+    nothing involved can change them, may be read anywhere and any number
+    of times.
+
+    Globals stay globals and arguments keep the resolution they had at the
+    call site, so no scope changes. The copies get the lines of the nodes
+    they copy.
+    """
+
+    def __init__(self, purity, lines, budget=INLINE_BUDGET):
+        self.purity = purity
+        self.lines = lines
+        self.budget = budget
+        # Function name -> Inlinable, for those declared so far
+        self.inlinable = {}
+
+    def inline(self, statements):
+        escaping = set()
+        pending = list(statements)
+        while pending:
+            escaping_reads(pending.pop(), escaping, pending)
+        self.escaping = escaping
+
+        inlined = []
+        for statement in statements:
+            statement = self.inline_stmt(statement)
+            inlined.append(statement)
+            if isinstance(statement, Stmt.Function):
+                candidate = self.inlinable_function(statement)
+                if candidate is not None:
+                    self.inlinable[statement.name.lexeme] = candidate
+        return inlined
+
+    def inlinable_function(self, function):
+        name = function.name.lexeme
+        if (len(function.body) != 1 or not isinstance(function.body[0], Stmt.Return)
+                or function.body[0].value is None):
+            return None
+        if name in self.escaping or not self.purity.constant(name):
+            return None
+        body = function.body[0].value
+        candidate = Inlinable(function, body)
+        if not self.describe(candidate, body, [0]):
+            return None
+        return candidate
+
+    def describe(self, candidate, expr, size):
+        """Fills in ``candidate``'s events for ``expr``; False if the
+        function cannot be inlined after all."""
+        size[0] += 1
+        if size[0] > self.budget:
+            return False
+        if isinstance(expr, Expr.Literal):
+            return True
+        if isinstance(expr, Expr.Variable):
+            if expr.depth is None:
+                candidate.events.append(EFFECT)
+                return True
+            if expr.depth != 0 or expr.slot >= len(candidate.uses):
+                return False
+            candidate.uses[expr.slot] += 1
+            candidate.events.append(expr.slot)
+            return True
+        if isinstance(expr, Expr.Assign):
+            if expr.depth is not None:
+                return False
+            if not self.describe(candidate, expr.value, size):
+                return False
+        elif isinstance(expr, Expr.Binary):
+            if not (self.describe(candidate, expr.left, size)
+                    and self.describe(candidate, expr.right, size)):
+                return False
+        elif isinstance(expr, Expr.Logical):
+            if not self.describe(candidate, expr.left, size):
+                return False
+            # Whether the right operand runs at all
+            candidate.events.append(EFFECT)
+            return self.describe(candidate, expr.right, size)
+        elif isinstance(expr, Expr.Unary):
+            if not self.describe(candidate, expr.right, size):
+                return False
+        elif isinstance(expr, Expr.Grouping):
+            return self.describe(candidate, expr.expression, size)
+        elif isinstance(expr, Expr.Call):
+            callee = expr.callee
+            if (isinstance(callee, Expr.Variable) and callee.depth is None
+                    and callee.name.lexeme == candidate.function.name.lexeme):
+                return False
+            candidate.calls = True
+            for part in [callee] + expr.arguments:
+                if not self.describe(candidate, part, size):
+                    return False
+        else:
+            return False
+        candidate.events.append(EFFECT)
+        return True
+
+    def inline_call(self, expr):
+        callee = expr.callee
+        if not isinstance(callee, Expr.Variable) or callee.depth is not None:
+            return expr
+        candidate = self.inlinable.get(callee.name.lexeme)
+        if candidate is None or len(expr.arguments) != len(candidate.uses):
+            return expr
+        arguments = expr.arguments
+
+        # Arguments that can be evaluated anywhere, any number of times
+        settled = all(isinstance(argument, (Expr.Literal, Expr.Variable)) for argument in arguments)
+        movable = [isinstance(argument, Expr.Literal)
+                   or (isinstance(argument, Expr.Variable) and argument.depth is not None
+                       and settled and not candidate.calls)
+                   for argument in arguments]
+
+        # The others must be read once each, in order, before any effect
+        expected = [index for index, free in enumerate(movable) if not free]
+        for index in expected:
+            if candidate.uses[index] != 1:
+                return expr
+        reads = []
+        for event in candidate.events:
+            if event == EFFECT:
+                break
+            if not movable[event]:
+                reads.append(event)
+        if reads != expected:
+            return expr
+
+        return self.instantiate(candidate.body, arguments, movable)
+
+    def instantiate(self, expr, arguments, movable):
+        """A copy of ``expr`` with parameters replaced by ``arguments``."""
+        if isinstance(expr, Expr.Variable) and expr.depth is not None:
+            argument = arguments[expr.slot]
+            return self.copy(argument) if movable[expr.slot] else argument
+
+        if isinstance(expr, Expr.Literal):
+            copy = Expr.Literal(expr.value)
+        elif isinstance(expr, Expr.Variable):
+            copy = Expr.Variable(expr.name, expr.depth, expr.slot)
+        elif isinstance(expr, Expr.Assign):
+            copy = Expr.Assign(expr.name, self.instantiate(expr.value, arguments, movable), expr.depth, expr.slot)
+        elif isinstance(expr, Expr.Binary):
+            copy = Expr.Binary(self.instantiate(expr.left, arguments, movable), expr.operator,
+                               self.instantiate(expr.right, arguments, movable))
+        elif isinstance(expr, Expr.Logical):
+            copy = Expr.Logical(self.instantiate(expr.left, arguments, movable), expr.operator,
+                                self.instantiate(expr.right, arguments, movable))
+        elif isinstance(expr, Expr.Unary):
+            copy = Expr.Unary(expr.operator, self.instantiate(expr.right, arguments, movable))
+        elif isinstance(expr, Expr.Grouping):
+            copy = Expr.Grouping(self.instantiate(expr.expression, arguments, movable))
+        else:
+            copy = Expr.Call(self.instantiate(expr.callee, arguments, movable),
+                             [self.instantiate(argument, arguments, movable) for argument in expr.arguments])
+        if expr in self.lines:
+            self.lines[copy] = self.lines[expr]
+        return copy
+
+    def copy(self, expr):
+        """A fresh node for a literal or variable argument."""
+        if isinstance(expr, Expr.Literal):
+            copy = Expr.Literal(expr.value)
+        else:
+            copy = Expr.Variable(expr.name, expr.depth, expr.slot)
+        if expr in self.lines:
+            self.lines[copy] = self.lines[expr]
+        return copy
+
+    # The walk over the module. Each method returns the node's replacement.
+
+    def inline_stmt(self, stmt):
+        return stmt.accept(self)
+
+    def inline_expr(self, expr):
+        return expr.accept(self)
+
+    def visit_block_stmt(self, stmt):
+        stmt.declarations = [self.inline_stmt(statement) for statement in stmt.declarations]
+        return stmt
+
+    def visit_function_stmt(self, stmt):
+        stmt.body = [self.inline_stmt(statement) for statement in stmt.body]
+        return stmt
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression = self.inline_expr(stmt.expression)
+        return stmt
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression = self.inline_expr(stmt.expression)
+        return stmt
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = self.inline_expr(stmt.initializer)
+        return stmt
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value = self.inline_expr(stmt.value)
+        return stmt
+
+    def visit_import_stmt(self, stmt):
+        return stmt
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition = self.inline_expr(stmt.condition)
+        stmt.then_branch = self.inline_stmt(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self.inline_stmt(stmt.else_branch)
+        return stmt
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition = self.inline_expr(stmt.condition)
+        stmt.body = self.inline_stmt(stmt.body)
+        return stmt
+
+    def visit_literal_expr(self, expr):
+        return expr
+
+    def visit_variable_expr(self, expr):
+        return expr
+
+    def visit_assign_expr(self, expr):
+        expr.value = self.inline_expr(expr.value)
+        return expr
+
+    def visit_grouping_expr(self, expr):
+        expr.expression = self.inline_expr(expr.expression)
+        return expr
+
+    def visit_unary_expr(self, expr):
+        expr.right = self.inline_expr(expr.right)
+        return expr
+
+    def visit_binary_expr(self, expr):
+        expr.left = self.inline_expr(expr.left)
+        expr.right = self.inline_expr(expr.right)
+        return expr
+
+    def visit_logical_expr(self, expr):
+        expr.left = self.inline_expr(expr.left)
+        expr.right = self.inline_expr(expr.right)
+        return expr
+
+    def visit_call_expr(self, expr):
+        expr.callee = self.inline_expr(expr.callee)
+        expr.arguments = [self.inline_expr(argument) for argument in expr.arguments]
+        return self.inline_call(expr)
+
+
+def escaping_reads(node, escaping, pending):
+    """Adds the global names ``node`` reads other than as a callee to
+    ``escaping`` and queues its children on ``pending``."""
+    if isinstance(node, Expr.Variable):
+        if node.depth is None:
+            escaping.add(node.name.lexeme)
+    elif isinstance(node, Expr.Call):
+        if not (isinstance(node.callee, Expr.Variable) and node.callee.depth is None):
+            pending.append(node.callee)
+        pending.extend(node.arguments)
+    elif isinstance(node, (Expr.Binary, Expr.Logical)):
+        pending.append(node.left)
+        pending.append(node.right)
+    elif isinstance(node, Expr.Unary):
+        pending.append(node.right)
+    elif isinstance(node, Expr.Grouping):
+        pending.append(node.expression)
+    elif isinstance(node, Expr.Assign):
+        pending.append(node.value)
+    elif isinstance(node, (Stmt.Expression, Stmt.Print)):
+        pending.append(node.expression)
+    elif isinstance(node, Stmt.Var):
+        if node.initializer is not None:
+            pending.append(node.initializer)
+    elif isinstance(node, Stmt.Return):
+        if node.value is not None:
+            pending.append(node.value)
+    elif isinstance(node, Stmt.If):
+        pending.append(node.condition)
+        pending.append(node.then_branch)
+        if node.else_branch is not None:
+            pending.append(node.else_branch)
+    elif isinstance(node, Stmt.While):
+        pending.append(node.condition)
+        pending.append(node.body)
+    elif isinstance(node, Stmt.Block):
+        pending.extend(node.declarations)
+    elif isinstance(node, Stmt.Function):
+        pending.extend(node.body)
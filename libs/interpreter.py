@@ -1,28 +1,15 @@
-import sys, time
+import sys
 from .tokenizer import TokenType
 from .parser import Expr, Stmt
-from .enviornment import Environment
+from .enviornment import Environment, GlobalEnvironment, MISSING
 from .fun_impl.jplox_callable import LoxCallable
-from .fun_impl.jplox_function import LoxFunction, NativeFunction
+from .fun_impl.jplox_function import LoxFunction
 from .fun_impl.fun_return import Return
-
-def castBooleanToString(value):
-    if value == True:
-        return "true"
-    elif value == False:
-        return "false"
-    else:
-        return value
-
-def castStringToBoolean(value):
-    if value == "true":
-        return True
-    elif value == "false":
-        return False
-    elif value == "nil":
-        return False
-    else:
-        return value
+from .values import NUMBER_CLASSES, LoopResults, lox_string, is_falsey, bang, is_equal, stringify
+from .specialize import MISS, handler_for
+from .loops import counted_loop
+from . import natives
+from .output import Output
 
 class RuntimeError(Exception):
     def __init__(self, token, message):
@@ -36,16 +23,30 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
     # locals = {}
 
     def __init__(self):
-        self.globals = Environment()
+        self.globals = self.new_globals()
         self.environment = self.globals
-        self.locals = {}
+        # Import statement -> modules.Module, filled in by the module loader
+        self.imports = {}
+        # Binary node evaluations a specialized handler answered, and the
+        # ones where it no longer applied, sending its node back to the
+        # generic path
+        self.specialization_hits = 0
+        self.specialization_misses = 0
+        # memo.MemoCache for calls of pure functions, or None when calls
+        # are never memoized
+        self.memo = None
+        # Where printed values go
+        self.output = Output()
+
+    def new_globals(self, slots=None):
+        """Returns a fresh global namespace holding the native functions.
 
-        # Define a native "clock" function, other native functions can be defined this way
-        self.globals.define("clock", NativeFunction(
-            arity_func=lambda: 0,
-            call_func=lambda interpreter, arguments: time.time(),
-            to_string_func=lambda: "<native fn>"
-        ))
+        ``slots`` is the name numbering the resolver produced for the code
+        that will run in it.
+        """
+        globals = GlobalEnvironment(slots)
+        natives.install(globals)
+        return globals
 
     def visit_literal_expr(self, expr):
         result = expr.value
@@ -53,11 +54,11 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
     
     def visit_logical_expr(self, expr):
         left = self.evaluate(expr.left)
-        if expr.operator.type == TokenType.OR:
-            if self.is_truthy(castStringToBoolean(left)):
+        if expr.operator == TokenType.OR:
+            if not is_falsey(left):
                 return left
         else:
-            if not self.is_truthy(castStringToBoolean(left)):
+            if is_falsey(left):
                 return left
 
         return self.evaluate(expr.right)
@@ -65,32 +66,36 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
     def visit_unary_expr(self, expr):
         right = self.evaluate(expr.right)
 
-        if expr.operator.type == TokenType.BANG:
-            # result = self.bangTruth(right)
-            result = self.is_truthy(right)
-        elif expr.operator.type == TokenType.MINUS:
+        if expr.operator == TokenType.BANG:
+            result = bang(right)
+        elif expr.operator == TokenType.MINUS:
             self.check_number_operand(expr.operator, right)
-            result = -float(right)
+            result = -right
         else:
             result = None
 
         return result
     
     def visit_call_expr(self, expr):
+        function, arguments = self.call_target(expr)
+        return function.call(self, arguments)
+
+    def call_target(self, expr):
+        """Evaluates a call's callee and arguments and checks they fit."""
         callee = self.evaluate(expr.callee)
         arguments = []
         for argument in expr.arguments:
             arguments.append(self.evaluate(argument))
 
         if not isinstance(callee, LoxCallable):
-            raise RuntimeError(expr.paren, "Can only call functions and classes.")
+            raise RuntimeError(expr, "Can only call functions and classes.")
 
         function = callee 
 
         if len(arguments) != function.arity(): #arity: number of expected arguments
-            raise RuntimeError(expr.paren, f"Expected {function.arity()} arguments but got {len(arguments)}.")
+            raise RuntimeError(expr, f"Expected {function.arity()} arguments but got {len(arguments)}.")
 
-        return function.call(self, arguments)
+        return function, arguments
 
     def visit_grouping_expr(self, expr):
         result = self.evaluate(expr.expression)
@@ -100,38 +105,52 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
-        if expr.operator.type == TokenType.GREATER:
+        handler = expr.handler
+        if handler:
+            result = handler(left, right)
+            if result is not MISS:
+                self.specialization_hits += 1
+                return result
+            self.specialization_misses += 1
+            expr.handler = False
+        elif handler is None:
+            expr.handler = handler_for(expr.operator, left, right)
+        return self.binary_operation(expr, left, right)
+
+    def binary_operation(self, expr, left, right):
+        """The generic path for every operator and operand type."""
+        if expr.operator == TokenType.GREATER:
             self.check_number_operands(expr.operator, left, right)
-            result = castBooleanToString(float(left) > float(right))
-        elif expr.operator.type == TokenType.GREATER_EQUAL:
+            result = left > right
+        elif expr.operator == TokenType.GREATER_EQUAL:
             self.check_number_operands(expr.operator, left, right)
-            result = castBooleanToString(float(left) >= float(right))
-        elif expr.operator.type == TokenType.LESS:
+            result = left >= right
+        elif expr.operator == TokenType.LESS:
             self.check_number_operands(expr.operator, left, right)
-            result = castBooleanToString(float(left) < float(right))
-        elif expr.operator.type == TokenType.LESS_EQUAL:
+            result = left < right
+        elif expr.operator == TokenType.LESS_EQUAL:
             self.check_number_operands(expr.operator, left, right)
-            result = castBooleanToString(float(left) <= float(right))
-        elif expr.operator.type == TokenType.MINUS:
+            result = left <= right
+        elif expr.operator == TokenType.MINUS:
             self.check_number_operands(expr.operator, left, right)
-            result = float(left) - float(right)
-        elif expr.operator.type == TokenType.PLUS:
-            if isinstance(left, float) and isinstance(right, float):
-                result = float(left) + float(right)
-            elif isinstance(castStringToBoolean(left), str) and isinstance(castStringToBoolean(right), str):
-                result = str(left) + str(right)
+            result = float(left - right)
+        elif expr.operator == TokenType.PLUS:
+            if left.__class__ is float and right.__class__ is float:
+                result = left + right
+            elif left.__class__ is str and right.__class__ is str:
+                result = lox_string(left + right)
             else:
                 raise RuntimeError(expr.operator, "Operands must be two numbers or two strings.")
-        elif expr.operator.type == TokenType.SLASH:
+        elif expr.operator == TokenType.SLASH:
             self.check_number_operands(expr.operator, left, right)
-            result = float(left) / float(right)
-        elif expr.operator.type == TokenType.STAR:
+            result = float(left) / right
+        elif expr.operator == TokenType.STAR:
             self.check_number_operands(expr.operator, left, right)
-            result = float(left) * float(right)
-        elif expr.operator.type == TokenType.BANG_EQUAL:
-            result = castBooleanToString(not self.isEqual(left, right))
-        elif expr.operator.type == TokenType.EQUAL_EQUAL:
-            result = castBooleanToString(self.isEqual(left, right))
+            result = float(left * right)
+        elif expr.operator == TokenType.BANG_EQUAL:
+            result = not is_equal(left, right)
+        elif expr.operator == TokenType.EQUAL_EQUAL:
+            result = is_equal(left, right)
         else:
             result = None
         
@@ -142,47 +161,149 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         return None
     
     def visit_function_stmt(self, stmt):
-        function = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name.lexeme, function)
+        function = LoxFunction(stmt, self.environment, self.globals)
+        self.environment.values[stmt.slot] = function
         return None 
     
     def visit_if_stmt(self, stmt):
-        #cast_to_boolean, python boolean True or False in lox true or false
-        if self.is_truthy(castStringToBoolean(self.evaluate(stmt.condition))): 
+        if not is_falsey(self.evaluate(stmt.condition)):
             return self.run(stmt.then_branch)
         elif stmt.else_branch is not None:
             return self.run(stmt.else_branch)
         return None
 
+    def visit_import_stmt(self, stmt):
+        self.import_module(stmt, self.environment)
+        return None
+
+    def import_module(self, stmt, globals):
+        """Runs the module ``stmt`` imports unless it already ran, then
+        defines the names it exports in the importer's ``globals``."""
+        module = self.imports[stmt]
+        if module.globals is None:
+            self.execute_module(module)
+        exported = self.exported_names(module)
+        for name, value in module.globals.items():
+            if name in exported:
+                globals.define(name, value)
+
+    def exported_names(self, module):
+        """The names ``module`` declares at its top level and those its own
+        imports export. The natives in its namespace are left out, so they
+        never replace the importer's own declarations."""
+        names = {statement.name.lexeme for statement in module.statements
+                 if statement.__class__ in (Stmt.Var, Stmt.Function)}
+        for statement, _ in module.imports():
+            names |= self.exported_names(self.imports[statement])
+        return names
+
+    def execute_module(self, module):
+        """Runs a module's top level once, in a global namespace of its own."""
+        previous_globals = self.globals
+        previous = self.environment
+        module.globals = self.new_globals(module.global_slots)
+        try:
+            self.globals = self.environment = module.globals
+            for statement in module.statements:
+                self.run(statement)
+        finally:
+            self.globals = previous_globals
+            self.environment = previous
+
     def visit_print_stmt(self, stmt):
         value = self.run(stmt.expression)
         return value
     
     def visit_return_stmt(self, stmt):
+        if isinstance(stmt.value, Expr.Call):
+            function, arguments = self.call_target(stmt.value)
+            if function.__class__ is LoxFunction:
+                # A tail call: the function returning runs it, not this frame
+                return Return(None, function, arguments)
+            return Return(function.call(self, arguments))
+
         value = None
         if stmt.value is not None:
             value = self.evaluate(stmt.value) 
-        
-        # print("return", value)
-        raise Return(value)
+        return Return(value)
 
     def visit_var_stmt(self, stmt):
         value = None
         if stmt.initializer is not None:
             value = self.run(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        # Top-level declarations run in the global namespace, which is
+        # indexed by slot just like a frame
+        self.environment.values[stmt.slot] = value
         return None
     
     def visit_while_stmt(self, stmt):
-        result = []
-        while self.is_truthy(castStringToBoolean(self.evaluate(stmt.condition))):
-            result.append(self.run(stmt.body))
+        loop = stmt.loop
+        if loop is None:
+            loop = stmt.loop = counted_loop(stmt)
+        if loop:
+            return self.run_counted_loop(stmt, loop)
+
+        result = LoopResults()
+        while not is_falsey(self.evaluate(stmt.condition)):
+            value = self.run(stmt.body)
+            if value.__class__ is Return:
+                return value
+            result.append(value)
+        return result
+
+    def run_counted_loop(self, stmt, loop):
+        """visit_while_stmt for a loops.CountedLoop.
+
+        The block around the body and the increment prints the body's
+        result itself, so every iteration's own result is None.
+        """
+        environment = self.environment
+        for _ in range(loop.depth):
+            environment = environment.enclosing
+        values = environment.values
+        slot = loop.slot
+        compare = loop.compare
+        limit = loop.limit
+        body = loop.body
+        step = loop.step
+        iterations = 0
+        while True:
+            counter = values[slot]
+            bound = self.evaluate(limit)
+            if counter.__class__ is float and bound.__class__ is float:
+                if not compare(counter, bound):
+                    break
+            elif is_falsey(self.binary_operation(stmt.condition, counter, bound)):
+                break
+
+            value = self.run(body)
+            if value is not None:
+                if value.__class__ is Return:
+                    return value
+                self.output.line(stringify(value))
+
+            counter = values[slot]
+            if counter.__class__ is float:
+                values[slot] = counter + step
+            else:
+                self.evaluate(loop.increment)
+            iterations += 1
+
+        result = LoopResults()
+        if iterations:
+            result.append(None, iterations)
         return result
 
     def visit_assign_expr(self, expr):
         value = self.evaluate(expr.value)
-        self.environment.assign(expr.name, value)
+        if expr.depth is None:
+            values = self.globals.values
+            if values[expr.slot] is MISSING:
+                self.globals.assign(expr.name, expr.slot, value)
+            values[expr.slot] = value
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
         return value
 
 
@@ -193,22 +314,27 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         return self.look_up_variable(expr.name, expr)
 
     def look_up_variable(self, name, expr):
-        distance = self.locals.get(expr)
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
-        else:
-            return self.globals.get(name)
+        depth = expr.depth
+        if depth is None:
+            value = self.globals.values[expr.slot]
+            if value is MISSING:
+                return self.globals.get(name, expr.slot)
+            return value
+        environment = self.environment
+        while depth:
+            environment = environment.enclosing
+            depth -= 1
+        return environment.values[expr.slot]
 
     def run(self, stmt):
         return stmt.accept(self)
 
-    def resolve(self, expr, depth):
-        self.locals[expr] = depth
-        
     def evaluate(self, expr):
         return expr.accept(self)
     
     def execute_block(self, statements, environment):
+        """Runs ``statements`` in ``environment``; returns the Return a
+        return statement among them evaluated to, if any."""
         previous = self.environment
         # result = []
         try:
@@ -217,28 +343,31 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
             for statement in statements:
                 _result = self.run(statement)
                 if _result is not None:
-                    print(_result)
+                    if _result.__class__ is Return:
+                        return _result
+                    self.output.line(stringify(_result))
                     # result.append(_result)
         finally:
             self.environment = previous
         return None 
 
     def visit_block_stmt(self, stmt):
-        return self.execute_block(stmt.declarations, Environment(self.environment))
+        if stmt.size is None:
+            # The resolver placed the block's locals in the enclosing frame
+            for statement in stmt.declarations:
+                _result = self.run(statement)
+                if _result is not None:
+                    if _result.__class__ is Return:
+                        return _result
+                    self.output.line(stringify(_result))
+            return None
+        return self.execute_block(stmt.declarations, Environment(stmt.size, self.environment))
         
     def isEqual(self, a, b):
-        if a is None and b is None:
-            return True
-        if a is None:
-            return False
-        return a == b
+        return is_equal(a, b)
     
     def is_truthy(self, obj):
-        if obj is None:
-            return False
-        if isinstance(obj, bool):
-            return bool(obj)
-        return True
+        return not is_falsey(obj)
     
     #Made this function to pass test for codecrafters challenge
     # def bangTruth(self, obj):
@@ -251,13 +380,23 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
     #     else:
     #         return "false"
     
+    def statistics(self):
+        """Counters describing the last run, for ``main.py run --stats``."""
+        statistics = {
+            "specialization hits": self.specialization_hits,
+            "specialization misses": self.specialization_misses,
+        }
+        if self.memo is not None:
+            statistics.update(self.memo.statistics())
+        return statistics
+
     def check_number_operand(self, operator, operand):
-        if isinstance(operand, float):
+        if operand.__class__ is float:
             return
         raise RuntimeError(operator, "Operand must be a number.")
     
     def check_number_operands(self, operator, left, right):
-        if isinstance(left, (int, float)) and isinstance(right, (int, float)):
+        if left.__class__ in NUMBER_CLASSES and right.__class__ in NUMBER_CLASSES:
             return
         raise RuntimeError(operator, "Operands must be numbers.")
 
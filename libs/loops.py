@@ -0,0 +1,77 @@
+"""Recognizes counted loops, so the tree walker can run them directly.
+
+``for (var i = 0; i < n; i = i + 1) body`` desugars to
+
+    While(i < n, Block([body, Expression(i = i + 1)]))
+
+and every iteration walks the condition, the block and the increment as
+separate nodes. When a While node has that shape, with a local counter
+stepped by a number literal, the interpreter instead keeps the counter's
+frame at hand, compares and steps it in place while it holds a float, and
+runs only the body through the visitor.
+"""
+import operator
+
+from .tokenizer import TokenType
+from .parser import Expr, Stmt
+
+COMPARISONS = {
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+}
+
+
+class CountedLoop:
+    __slots__ = ("depth", "slot", "compare", "limit", "body", "step", "increment")
+
+    def __init__(self, depth, slot, compare, limit, body, step, increment):
+        # Where the counter lives, relative to the loop's environment
+        self.depth = depth
+        self.slot = slot
+        # Applied to the counter and the value of ``limit`` when both are
+        # floats; anything else takes the condition's generic path
+        self.compare = compare
+        self.limit = limit
+        self.body = body
+        self.step = step
+        # The increment's Assign, evaluated as usual when the counter is
+        # not a float
+        self.increment = increment
+
+
+def is_counter(expr, depth, slot):
+    return expr.__class__ is Expr.Variable and expr.depth == depth and expr.slot == slot
+
+
+def counted_loop(stmt):
+    """The CountedLoop for While node ``stmt``, or False if it is not one."""
+    condition = stmt.condition
+    if condition.__class__ is not Expr.Binary or condition.operator not in COMPARISONS:
+        return False
+    counter = condition.left
+    if counter.__class__ is not Expr.Variable or counter.depth is None:
+        return False
+    depth, slot = counter.depth, counter.slot
+
+    block = stmt.body
+    # A block with a frame of its own would change the counter's depth
+    if block.__class__ is not Stmt.Block or block.size is not None or len(block.declarations) != 2:
+        return False
+    body, increment = block.declarations
+    if increment.__class__ is not Stmt.Expression:
+        return False
+    assign = increment.expression
+    if assign.__class__ is not Expr.Assign or assign.depth != depth or assign.slot != slot:
+        return False
+    step = assign.value
+    if (step.__class__ is not Expr.Binary or step.operator not in (TokenType.PLUS, TokenType.MINUS)
+            or not is_counter(step.left, depth, slot) or step.right.__class__ is not Expr.Literal
+            or step.right.value.__class__ is not float):
+        return False
+
+    amount = step.right.value
+    if step.operator == TokenType.MINUS:
+        amount = -amount
+    return CountedLoop(depth, slot, COMPARISONS[condition.operator], condition.right, body, amount, assign)
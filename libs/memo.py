@@ -0,0 +1,81 @@
+"""The cache behind memoized calls of pure functions (``run --memoize``)."""
+import math
+from collections import OrderedDict
+
+# Default for MemoCache.size, in entries
+DEFAULT_SIZE = 4096
+
+MISSING = object()
+
+
+def memo_key(function, arguments):
+    """The cache key for calling ``function`` with ``arguments``.
+
+    Python equality is looser than Lox's: 1.0, True and the 1 of a !
+    result are all equal, and so are 0.0 and -0.0, which print differently.
+    Each argument goes in with its class, and a zero by its sign.
+    """
+    key = [function]
+    for value in arguments:
+        if value.__class__ is float and value == 0.0:
+            key.append("-0" if math.copysign(1.0, value) < 0 else "0")
+        else:
+            key.append(value.__class__)
+            key.append(value)
+    return tuple(key)
+
+
+class MemoCache:
+    """Results of pure function calls, least recently used dropped first.
+
+    Keys include the function object, not just its declaration: a closure
+    may read variables of the environment it captured.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def call(self, function, interpreter, arguments):
+        key = memo_key(function, arguments)
+        result = self.lookup(key)
+        if result is not MISSING:
+            return result
+        # Runtime errors propagate before anything is stored
+        result = function.call(interpreter, arguments, False)
+        self.store(key, result)
+        return result
+
+    def lookup(self, key):
+        """The result stored under ``key``, or MISSING, counted as a miss."""
+        entries = self.entries
+        result = entries.get(key, MISSING)
+        if result is not MISSING:
+            entries.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        return MISSING
+
+    def store(self, key, result):
+        entries = self.entries
+        entries[key] = result
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def statistics(self):
+        return {
+            "memo hits": self.hits,
+            "memo misses": self.misses,
+            "memo evictions": self.evictions,
+            "memo entries": len(self.entries),
+        }
+
+    def describe(self):
+        """What the memoStats native returns."""
+        return (f"hits {self.hits}, misses {self.misses}, evictions {self.evictions}, "
+                f"entries {len(self.entries)}/{self.size}")
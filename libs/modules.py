@@ -0,0 +1,224 @@
+import contextlib
+import io
+import mmap
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from . import tokenizer, parser, pratt_parser, interpreter, resolver, inliner, optimizer
+from .parser import Stmt, Lox
+
+parsers = {
+    "classic": parser.Parser,
+    "pratt": pratt_parser.PrattParser,
+}
+
+
+def open_source(filename):
+    # The mapping stays valid once the file is closed
+    with open(filename, "rb") as source_file:
+        try:
+            return mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return io.BytesIO(b"")
+
+
+def scan(filename, options):
+    """Tokenizes ``filename`` as selected by the command line ``options``."""
+    if options.stream:
+        scanner = tokenizer.StreamScanner(open_source(filename))
+        return scanner.iter_tokens(), scanner.errors
+
+    file_contents = pathlib.Path(filename).read_text()
+    if options.tokens == "buffer":
+        return tokenizer.RegexScanner(file_contents).scan_buffer()
+    return tokenizer.scanners[options.scanner](file_contents).scan_tokens()
+
+
+class Module:
+    """One source file's resolved statements and what they import."""
+
+    def __init__(self, path, statements, lines, global_slots):
+        self.path = path
+        self.statements = statements
+        self.lines = lines
+        # Resolver-assigned indices of the module's global names
+        self.global_slots = global_slots
+        # The module's global namespace, created when it first runs
+        self.globals = None
+
+    def imports(self):
+        """Yields (import statement, absolute path of the imported file)."""
+        directory = os.path.dirname(self.path)
+        for statement in self.statements:
+            if isinstance(statement, Stmt.Import):
+                yield statement, os.path.normpath(os.path.join(directory, statement.path.literal))
+
+
+def compile_module(path, options):
+    """Scans, parses, resolves and optimizes one file.
+
+    Runs in worker processes, so diagnostics are captured rather than
+    printed. Returns (module, has_error, has_warning, output).
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        tokens, errors = scan(path, options)
+        parse = parsers[options.parser](tokens)
+        statements = parse.parse()
+        if parse.has_errors:
+            return None, True, False, output.getvalue()
+
+        module_interpreter = interpreter.Interpreter()
+        module_resolver = resolver.Resolver(module_interpreter)
+        module_resolver.resolve(statements)
+        if module_resolver.has_error:
+            return None, True, False, output.getvalue()
+
+        if not options.no_opt:
+            if not options.no_inline:
+                statements = inliner.Inliner(module_resolver.purity, parse.lines).inline(statements)
+            statements = optimizer.Optimizer(module_interpreter).optimize(statements)
+
+    module = Module(path, statements, parse.lines, module_interpreter.globals.slots)
+    return module, False, module_resolver.has_warning, output.getvalue()
+
+
+class ModuleLoader:
+    """Compiles a program and, transitively, every module it imports.
+
+    Imports are discovered as each module is parsed. Whenever more than one
+    module is waiting to be compiled they go to a process pool, so
+    independent modules are tokenized, parsed and resolved in parallel.
+    Each module has its own entry in the AST cache, so editing one file
+    only recompiles that file.
+    """
+
+    def __init__(self, options, cache=None, jobs=None):
+        self.options = options
+        self.cache = cache
+        if options.no_opt:
+            self.cache_variant = "no-opt"
+        else:
+            self.cache_variant = "no-inline" if options.no_inline else ""
+        self.jobs = jobs or os.cpu_count() or 1
+        self.modules = {}
+        # Diagnostics per module, keyed in discovery order
+        self.outputs = {}
+        self.has_error = False
+
+    def load(self, filename):
+        """Returns the root Module, or None if any module failed to compile."""
+        root = os.path.abspath(filename)
+        self.outputs[root] = ""
+        pending = [root]
+        running = {}
+        executor = None
+
+        try:
+            while pending or running:
+                while pending:
+                    path = pending.pop()
+                    module = self.load_cached(path)
+                    if module is not None:
+                        pending.extend(self.discover(module))
+                    elif self.jobs == 1 or (not pending and not running):
+                        # Nothing to overlap with, so skip the process pool
+                        pending.extend(self.finish(path, compile_module(path, self.options)))
+                    else:
+                        if executor is None:
+                            executor = ProcessPoolExecutor(self.jobs)
+                        running[executor.submit(compile_module, path, self.options)] = path
+
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        path = running.pop(future)
+                        pending.extend(self.finish(path, future.result()))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if not self.has_error:
+            self.check_cycles(root)
+        # Workers finish in any order, so diagnostics are printed afterwards
+        for path, output in self.outputs.items():
+            if output and path != root:
+                print(f"In module {os.path.relpath(path)}:")
+            print(output, end="")
+        if self.has_error:
+            return None
+        return self.modules[root]
+
+    def load_cached(self, path):
+        if self.cache is None:
+            return None
+        module = self.cache.load(self.cache.key(path, self.cache_variant))
+        if module is None:
+            return None
+        self.modules[path] = module
+        return module
+
+    def finish(self, path, result):
+        """Records a compiled module; returns the imports still to compile."""
+        module, has_error, has_warning, self.outputs[path] = result
+        if has_error:
+            self.has_error = True
+            return []
+
+        self.modules[path] = module
+        if self.cache is not None and not has_warning:
+            self.cache.store(self.cache.key(path, self.cache_variant), module)
+        return self.discover(module)
+
+    def discover(self, module):
+        new_paths = []
+        for statement, path in module.imports():
+            if path in self.outputs:
+                continue
+            if not os.path.isfile(path):
+                self.has_error = True
+                self.report(module, statement, "Can't find module.")
+                continue
+            self.outputs[path] = ""
+            new_paths.append(path)
+        return new_paths
+
+    def report(self, module, statement, message):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            Lox.error(statement.path, message)
+        self.outputs[module.path] += output.getvalue()
+
+    def check_cycles(self, root):
+        # Iterative depth-first search; a module met again while still on
+        # the path from the root closes a cycle.
+        finished = set()
+        on_path = {root}
+        stack = [(root, self.modules[root].imports())]
+        while stack:
+            path, imports = stack[-1]
+            for statement, imported in imports:
+                if imported in on_path:
+                    self.has_error = True
+                    self.report(self.modules[path], statement, "Import cycle.")
+                elif imported not in finished:
+                    on_path.add(imported)
+                    stack.append((imported, self.modules[imported].imports()))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(path)
+                finished.add(path)
+
+    def link(self, interpreter):
+        """Tells ``interpreter`` which module each import statement loads.
+
+        Engines that keep compiled code of their own get the AST cache too.
+        """
+        interpreter.cache = self.cache
+        interpreter.cache_variant = self.cache_variant
+        for module in self.modules.values():
+            for statement, path in module.imports():
+                interpreter.imports[statement] = self.modules[path]
@@ -0,0 +1,329 @@
+"""The native functions every Lox program starts with.
+
+Natives are plain Python functions grouped into libraries and declared
+with a decorator; the arity is the number of parameters the function
+takes:
+
+    strings = Library("strings")
+
+    @strings.native(pure=True)
+    def upper(text):
+        return lox_string(as_string(text, "upper").upper())
+
+``new_globals`` installs every registered library into each global
+namespace, so a library only has to be imported before the interpreter
+creates one. Natives take and return Lox values (see values.py): numbers
+come back as floats and strings through ``lox_string``. A pure native's
+result depends only on its arguments, which lets the functions calling it
+be memoized.
+"""
+import math
+import random
+import re
+import time
+
+from .fun_impl.jplox_function import NativeFunction
+from .values import NIL, NUMBER_CLASSES, lox_string, stringify
+
+# What parseNumber accepts: a Lox number literal, optionally negated
+NUMBER = re.compile(r"-?[0-9]+(\.[0-9]+)?")
+
+# Library name -> Library, in the order they were created
+LIBRARIES = {}
+
+
+class Library:
+    """A named group of native functions."""
+
+    def __init__(self, name):
+        self.name = name
+        # Lox name -> NativeFunction
+        self.natives = {}
+        LIBRARIES[name] = self
+
+    def native(self, name=None, pure=False, interpreter=False):
+        """Declares the decorated function as a native.
+
+        ``name`` is its Lox name, the Python name by default. With
+        ``interpreter`` the function is passed the running interpreter
+        before the Lox arguments, which it does not count towards arity.
+        """
+        def declare(function):
+            arity = function.__code__.co_argcount - (1 if interpreter else 0)
+            lox_name = name or function.__name__
+            self.natives[lox_name] = NativeFunction(lox_name, arity, function, pure, interpreter)
+            return function
+        return declare
+
+    def install(self, globals):
+        for name, function in self.natives.items():
+            globals.define(name, function)
+
+
+def install(globals):
+    """Defines the natives of every library in ``globals``."""
+    for library in LIBRARIES.values():
+        library.install(globals)
+
+
+def error(message):
+    # Imported here because the interpreter imports this module
+    from .interpreter import RuntimeError
+    return RuntimeError(None, message)
+
+
+def as_string(value, name):
+    if value.__class__ is not str:
+        raise error(f"Argument to '{name}' must be a string.")
+    return value
+
+
+def as_number(value, name):
+    if value.__class__ not in NUMBER_CLASSES:
+        raise error(f"Argument to '{name}' must be a number.")
+    return value
+
+
+def as_index(value, name):
+    """``value`` as an int, for a native that takes a position or count."""
+    if value.__class__ not in NUMBER_CLASSES or value % 1 != 0:
+        raise error(f"Argument to '{name}' must be a whole number.")
+    return int(value)
+
+
+core = Library("core")
+
+
+@core.native()
+def clock():
+    return time.time()
+
+
+@core.native(interpreter=True)
+def memoStats(interpreter):
+    return interpreter.memo.describe() if interpreter.memo is not None else "off"
+
+
+strings = Library("strings")
+
+
+@strings.native("len", pure=True)
+def length(text):
+    return float(len(as_string(text, "len")))
+
+
+@strings.native(pure=True)
+def substring(text, start, end):
+    text = as_string(text, "substring")
+    start = as_index(start, "substring")
+    end = as_index(end, "substring")
+    if not 0 <= start <= end <= len(text):
+        raise error("Substring range out of bounds.")
+    return lox_string(text[start:end])
+
+
+@strings.native(pure=True)
+def charAt(text, index):
+    text = as_string(text, "charAt")
+    index = as_index(index, "charAt")
+    if not 0 <= index < len(text):
+        raise error("String index out of bounds.")
+    return text[index]
+
+
+@strings.native(pure=True)
+def indexOf(text, part):
+    return float(as_string(text, "indexOf").find(as_string(part, "indexOf")))
+
+
+@strings.native(pure=True)
+def contains(text, part):
+    return as_string(part, "contains") in as_string(text, "contains")
+
+
+@strings.native(pure=True)
+def startsWith(text, prefix):
+    return as_string(text, "startsWith").startswith(as_string(prefix, "startsWith"))
+
+
+@strings.native(pure=True)
+def endsWith(text, suffix):
+    return as_string(text, "endsWith").endswith(as_string(suffix, "endsWith"))
+
+
+@strings.native(pure=True)
+def upper(text):
+    return lox_string(as_string(text, "upper").upper())
+
+
+@strings.native(pure=True)
+def lower(text):
+    return lox_string(as_string(text, "lower").lower())
+
+
+@strings.native(pure=True)
+def trim(text):
+    return lox_string(as_string(text, "trim").strip())
+
+
+@strings.native(pure=True)
+def replace(text, old, new):
+    text = as_string(text, "replace")
+    old = as_string(old, "replace")
+    if not old:
+        raise error("Cannot replace an empty string.")
+    return lox_string(text.replace(old, as_string(new, "replace")))
+
+
+@strings.native("repeat", pure=True)
+def repeat_string(text, count):
+    count = as_index(count, "repeat")
+    if count < 0:
+        raise error("Repeat count must not be negative.")
+    return lox_string(as_string(text, "repeat") * count)
+
+
+@strings.native("ord", pure=True)
+def char_code(character):
+    character = as_string(character, "ord")
+    if len(character) != 1:
+        raise error("Argument to 'ord' must be a single character.")
+    return float(ord(character))
+
+
+@strings.native("chr", pure=True)
+def character(code):
+    code = as_index(code, "chr")
+    if not 0 <= code <= 0x10FFFF:
+        raise error("Character code out of range.")
+    return chr(code)
+
+
+@strings.native(pure=True)
+def toString(value):
+    return lox_string(stringify(value))
+
+
+@strings.native(pure=True)
+def parseNumber(text):
+    text = as_string(text, "parseNumber")
+    if NUMBER.fullmatch(text) is None:
+        return NIL
+    return float(text)
+
+
+@strings.native(pure=True)
+def formatNumber(number, decimals):
+    number = as_number(number, "formatNumber")
+    decimals = as_index(decimals, "formatNumber")
+    if not 0 <= decimals <= 20:
+        raise error("Decimals must be between 0 and 20.")
+    return f"{number:.{decimals}f}"
+
+
+maths = Library("math")
+
+
+@maths.native(pure=True)
+def sqrt(number):
+    number = as_number(number, "sqrt")
+    if number < 0:
+        raise error("Cannot take the square root of a negative number.")
+    return math.sqrt(number)
+
+
+@maths.native(pure=True)
+def floor(number):
+    number = as_number(number, "floor")
+    return float(math.floor(number)) if math.isfinite(number) else float(number)
+
+
+@maths.native(pure=True)
+def ceil(number):
+    number = as_number(number, "ceil")
+    return float(math.ceil(number)) if math.isfinite(number) else float(number)
+
+
+@maths.native("round", pure=True)
+def round_number(number):
+    """Rounds halves away from zero."""
+    number = as_number(number, "round")
+    if not math.isfinite(number):
+        return float(number)
+    magnitude = abs(number)
+    whole = math.floor(magnitude)
+    # Adding 0.5 before flooring would round up the largest double below 0.5
+    if magnitude - whole >= 0.5:
+        whole += 1
+    return math.copysign(whole, number)
+
+
+@maths.native("abs", pure=True)
+def absolute(number):
+    return float(abs(as_number(number, "abs")))
+
+
+@maths.native("min", pure=True)
+def minimum(a, b):
+    return float(min(as_number(a, "min"), as_number(b, "min")))
+
+
+@maths.native("max", pure=True)
+def maximum(a, b):
+    return float(max(as_number(a, "max"), as_number(b, "max")))
+
+
+@maths.native("pow", pure=True)
+def power(base, exponent):
+    base = as_number(base, "pow")
+    exponent = as_number(exponent, "pow")
+    try:
+        result = float(base) ** exponent
+    except ZeroDivisionError:
+        raise error("Cannot raise zero to a negative power.")
+    except OverflowError:
+        if base < 0 and exponent % 1 != 0:
+            raise error("Cannot raise a negative number to a fractional power.")
+        # A negative base keeps its sign under an odd whole exponent
+        return math.copysign(math.inf, base) if exponent % 2 == 1 else math.inf
+    if result.__class__ is complex:
+        raise error("Cannot raise a negative number to a fractional power.")
+    return result
+
+
+@maths.native(pure=True)
+def exp(number):
+    try:
+        return math.exp(as_number(number, "exp"))
+    except OverflowError:
+        return math.inf
+
+
+@maths.native(pure=True)
+def log(number):
+    number = as_number(number, "log")
+    if number <= 0:
+        raise error("Cannot take the logarithm of a number that is not positive.")
+    return math.log(number)
+
+
+@maths.native(pure=True)
+def sin(number):
+    number = as_number(number, "sin")
+    return math.sin(number) if math.isfinite(number) else math.nan
+
+
+@maths.native(pure=True)
+def cos(number):
+    number = as_number(number, "cos")
+    return math.cos(number) if math.isfinite(number) else math.nan
+
+
+@maths.native(pure=True)
+def atan2(y, x):
+    return math.atan2(as_number(y, "atan2"), as_number(x, "atan2"))
+
+
+@maths.native("random")
+def random_number():
+    return random.random()
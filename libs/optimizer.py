@@ -0,0 +1,159 @@
+from .tokenizer import TokenType
+from .parser import Expr, Stmt
+from .values import is_falsey
+
+class Optimizer(Expr.Visitor, Stmt.Visitor):
+    """Folds constant expressions and prunes branches that can never run.
+
+    Runs after the resolver, so dead code still gets its diagnostics and
+    only nodes that never carry a scope slot are replaced. Folding
+    evaluates the node with the interpreter itself, so folded values are
+    exactly what the program would compute; anything that raises is left
+    alone to fail at runtime as before.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def optimize(self, statements):
+        # Top-level statement results are discarded, so unlike blocks nothing
+        # needs to stay behind for its printed value.
+        return self.optimize_statements(statements, top_level=True)
+
+    def optimize_statements(self, statements, top_level=False):
+        optimized = []
+        for statement in statements:
+            statement = self.optimize_stmt(statement)
+            if statement is None:
+                continue
+            if top_level and isinstance(statement, Stmt.While) and self.is_constant_false(statement.condition):
+                continue
+            optimized.append(statement)
+        return optimized
+
+    def optimize_stmt(self, stmt):
+        """Returns the replacement for ``stmt``, or None if it does nothing."""
+        return stmt.accept(self)
+
+    def optimize_branch(self, stmt):
+        # If and While bodies must hold a statement, so a pruned one becomes
+        # an empty block, which also evaluates to None.
+        stmt = self.optimize_stmt(stmt)
+        if stmt is None:
+            return Stmt.Block([])
+        return stmt
+
+    def optimize_expr(self, expr):
+        return expr.accept(self)
+
+    def visit_block_stmt(self, stmt):
+        stmt.declarations = self.optimize_statements(stmt.declarations)
+        return stmt
+
+    def visit_function_stmt(self, stmt):
+        stmt.body = self.optimize_statements(stmt.body)
+        return stmt
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression = self.optimize_expr(stmt.expression)
+        if isinstance(stmt.expression, Expr.Literal):
+            return None
+        return stmt
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression = self.optimize_expr(stmt.expression)
+        return stmt
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = self.optimize_expr(stmt.initializer)
+        return stmt
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value = self.optimize_expr(stmt.value)
+        return stmt
+
+    def visit_import_stmt(self, stmt):
+        return stmt
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition = self.optimize_expr(stmt.condition)
+        if isinstance(stmt.condition, Expr.Literal):
+            if self.is_truthy(stmt.condition.value):
+                return self.optimize_stmt(stmt.then_branch)
+            if stmt.else_branch is not None:
+                return self.optimize_stmt(stmt.else_branch)
+            return None
+
+        stmt.then_branch = self.optimize_branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self.optimize_branch(stmt.else_branch)
+        return stmt
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition = self.optimize_expr(stmt.condition)
+        if self.is_constant_false(stmt.condition):
+            # A while statement evaluates to the list of its body results,
+            # which blocks print, so the loop stays with nothing to run.
+            stmt.body = Stmt.Block([])
+            return stmt
+        stmt.body = self.optimize_branch(stmt.body)
+        return stmt
+
+    def visit_literal_expr(self, expr):
+        return expr
+
+    def visit_variable_expr(self, expr):
+        return expr
+
+    def visit_assign_expr(self, expr):
+        expr.value = self.optimize_expr(expr.value)
+        return expr
+
+    def visit_grouping_expr(self, expr):
+        # Parentheses only matter to the parser
+        return self.optimize_expr(expr.expression)
+
+    def visit_unary_expr(self, expr):
+        expr.right = self.optimize_expr(expr.right)
+        if isinstance(expr.right, Expr.Literal):
+            return self.fold(expr)
+        return expr
+
+    def visit_binary_expr(self, expr):
+        expr.left = self.optimize_expr(expr.left)
+        expr.right = self.optimize_expr(expr.right)
+        if isinstance(expr.left, Expr.Literal) and isinstance(expr.right, Expr.Literal):
+            return self.fold(expr)
+        return expr
+
+    def visit_logical_expr(self, expr):
+        expr.left = self.optimize_expr(expr.left)
+        expr.right = self.optimize_expr(expr.right)
+        if not isinstance(expr.left, Expr.Literal):
+            return expr
+        # The interpreter returns the left operand when it short-circuits
+        # and whatever the right operand evaluates to otherwise.
+        if self.is_truthy(expr.left.value) == (expr.operator == TokenType.OR):
+            return expr.left
+        return expr.right
+
+    def visit_call_expr(self, expr):
+        expr.callee = self.optimize_expr(expr.callee)
+        expr.arguments = [self.optimize_expr(argument) for argument in expr.arguments]
+        return expr
+
+    def fold(self, expr):
+        try:
+            return Expr.Literal(self.interpreter.evaluate(expr))
+        except Exception:
+            # Type errors, division by zero and the like are reported when
+            # (and if) the expression actually runs.
+            return expr
+
+    def is_truthy(self, value):
+        return not is_falsey(value)
+
+    def is_constant_false(self, expr):
+        return isinstance(expr, Expr.Literal) and not self.is_truthy(expr.value)
@@ -0,0 +1,42 @@
+"""Where the values a program prints go.
+
+Engines hand each printed line to their interpreter's Output instead of
+calling print. An Output without a buffer writes every line through at
+once, as print did. ``main.py run`` gives it one: lines then collect
+until ``buffer_size`` characters are waiting and go out in a single
+write, and main flushes the rest when the program ends or fails.
+"""
+import sys
+
+# Characters main.py run lets collect before writing, by default
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class Output:
+    def __init__(self, buffer_size=0, stream=None):
+        self.buffer_size = buffer_size
+        # None writes to whatever sys.stdout is at the time, so output
+        # follows contextlib.redirect_stdout
+        self.stream = stream
+        self.lines = []
+        # Characters in lines, newlines included
+        self.size = 0
+
+    def line(self, text):
+        if not self.buffer_size:
+            (self.stream or sys.stdout).write(text + "\n")
+            return
+        self.lines.append(text)
+        self.size += len(text) + 1
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        text = "\n".join(self.lines) + "\n"
+        self.lines = []
+        self.size = 0
+        stream = self.stream or sys.stdout
+        stream.write(text)
+        stream.flush()
@@ -1,5 +1,28 @@
+from itertools import islice
 from typing import List, Any, Union
-from .tokenizer import Token, TokenType
+from .tokenizer import Token, TokenType, Scanner, RegexScanner
+from .values import NIL, lox_string, stringify
+
+# AST nodes use __slots__ and hold operators as bare TokenTypes rather than
+# whole Tokens. The source line of each operator and call is kept in the
+# parser's ``lines`` side table instead.
+#
+# A few slots are runtime caches the interpreters fill in, set to None by
+# __init__. has_call says whether a call appears anywhere inside the node;
+# the explicit-stack engine sets it (see stack_interpreter.mark_calls).
+# Nodes that can never hold a call, and Call itself, answer from a class
+# attribute instead.
+RUNTIME_CACHES = ("handler", "loop", "has_call")
+
+class Node:
+    __slots__ = ()
+
+    def __reduce__(self):
+        # Pickle as a constructor call; every node lists its __init__
+        # parameters, in order, as its __slots__, then its runtime caches,
+        # which are not saved.
+        return type(self), tuple(getattr(self, name) for name in self.__slots__
+                                 if name not in RUNTIME_CACHES)
 
 class Expr:
     class Visitor:
@@ -27,65 +50,96 @@ class Expr:
         def visit_call_expr(self, expr):
             pass
 
-    class Binary:
+    class Binary(Node):
+        __slots__ = ("left", "operator", "right", "handler", "has_call")
+
         def __init__(self, left, operator, right):
             self.left = left
             self.operator = operator
             self.right = right
+            # The interpreter's specialized handler for this node: None
+            # until first evaluated, False once it takes the generic path
+            self.handler = None
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_binary_expr(self)
 
-    class Grouping:
+    class Grouping(Node):
+        __slots__ = ("expression", "has_call")
+
         def __init__(self, expression):
             self.expression = expression
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_grouping_expr(self)
 
-    class Literal:
+    class Literal(Node):
+        __slots__ = ("value",)
+        has_call = False
+
         def __init__(self, value):
             self.value = value
 
         def accept(self, visitor):
             return visitor.visit_literal_expr(self)
 
-    class Unary:
+    class Unary(Node):
+        __slots__ = ("operator", "right", "has_call")
+
         def __init__(self, operator, right):
             self.operator = operator
             self.right = right
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_unary_expr(self)
 
-    class Variable:
-        def __init__(self, name):
+    class Variable(Node):
+        __slots__ = ("name", "depth", "slot")
+        has_call = False
+
+        def __init__(self, name, depth=None, slot=None):
             self.name = name
+            # Set by the resolver for locals; globals keep depth None
+            self.depth = depth
+            self.slot = slot
 
         def accept(self, visitor):
             return visitor.visit_variable_expr(self)
 
-    class Assign:
-        def __init__(self, name, value):
+    class Assign(Node):
+        __slots__ = ("name", "value", "depth", "slot", "has_call")
+
+        def __init__(self, name, value, depth=None, slot=None):
             self.name = name  
             self.value = value  
+            self.depth = depth
+            self.slot = slot
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_assign_expr(self)
 
-    class Logical:
+    class Logical(Node):
+        __slots__ = ("left", "operator", "right", "has_call")
+
         def __init__(self, left, operator, right):
             self.left = left         
             self.operator = operator  
             self.right = right       
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_logical_expr(self)
     
-    class Call:
-        def __init__(self, callee, paren, arguments):
+    class Call(Node):
+        __slots__ = ("callee", "arguments")
+        has_call = True
+
+        def __init__(self, callee, arguments):
             self.callee = callee         
-            self.paren = paren           
             self.arguments = arguments 
 
         def accept(self, visitor):
@@ -117,69 +171,123 @@ class Stmt:
         def visit_return_stmt(self, stmt):
             pass
 
-    class Expression:
+        def visit_import_stmt(self, stmt):
+            pass
+
+    class Expression(Node):
+        __slots__ = ("expression", "has_call")
+
         def __init__(self, expression):
             self.expression = expression
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_expression_stmt(self)
 
-    class Print:
+    class Print(Node):
+        __slots__ = ("expression", "has_call")
+
         def __init__(self, expression):
             self.expression = expression
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_print_stmt(self)
 
-    class Var:
-        def __init__(self, name, initializer):
+    class Var(Node):
+        __slots__ = ("name", "initializer", "slot", "has_call")
+
+        def __init__(self, name, initializer, slot=None):
             self.name = name
             self.initializer = initializer
+            self.slot = slot
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_var_stmt(self)
     
-    class If:
+    class If(Node):
+        __slots__ = ("condition", "then_branch", "else_branch", "has_call")
+
         def __init__(self, condition, then_branch, else_branch=None):
             self.condition = condition 
             self.then_branch = then_branch  
             self.else_branch = else_branch 
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_if_stmt(self)
     
-    class While:
+    class While(Node):
+        __slots__ = ("condition", "body", "loop", "has_call")
+
         def __init__(self, condition, body):
             self.condition = condition 
             self.body = body 
+            # The interpreter's loops.CountedLoop for this node: None until
+            # first run, False if it is not a counted loop
+            self.loop = None
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_while_stmt(self)
 
-    class Block:
-        def __init__(self, declarations):
+    class Block(Node):
+        __slots__ = ("declarations", "size", "has_call")
+
+        def __init__(self, declarations, size=None):
             self.declarations = declarations 
+            # Size of the block's frame, or None if its locals (if any)
+            # live in the enclosing frame
+            self.size = size
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_block_stmt(self)
 
-    class Function:
-        def __init__(self, name, params: List, body: List):
+    class Function(Node):
+        __slots__ = ("name", "params", "body", "slot", "size", "leaf", "pure")
+        has_call = False
+
+        def __init__(self, name, params: List, body: List, slot=None, size=0, leaf=False, pure=False):
             self.name = name            
             self.params = params        
             self.body = body            
+            self.slot = slot
+            # Parameters take the first slots of the frame, body locals follow
+            self.size = size
+            # No closure is ever created inside the function, so its frames
+            # cannot outlive a call and are recycled
+            self.leaf = leaf
+            # Calls depend only on the arguments and have no other effect,
+            # so they may be memoized (see purity.py)
+            self.pure = pure
 
         def accept(self, visitor):
             return visitor.visit_function_stmt(self)
 
-    class Return:
+    class Return(Node):
+        __slots__ = ("keyword", "value", "has_call")
+
         def __init__(self, keyword, value):
             self.keyword = keyword  
             self.value = value
+            self.has_call = None
 
         def accept(self, visitor):
             return visitor.visit_return_stmt(self)
 
+    class Import(Node):
+        __slots__ = ("keyword", "path")
+        has_call = False
+
+        def __init__(self, keyword, path):
+            self.keyword = keyword
+            self.path = path
+
+        def accept(self, visitor):
+            return visitor.visit_import_stmt(self)
+
 
 class Lox:
     @staticmethod
@@ -192,11 +300,26 @@ class Lox:
 class ParseError(Exception):
     pass
 
+# Tokens a Parser materializes at a time from a source that is not a list
+TOKEN_WINDOW = 512
+
 class Parser:
     def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
+        # A list is parsed in place. Anything else, a TokenBuffer or a
+        # scanner's lazy stream, is read TOKEN_WINDOW tokens at a time into
+        # a list whose first token sits at index ``base``; the parser only
+        # moves forward and looks one token back, so older ones are dropped.
+        if isinstance(tokens, list):
+            self.source = None
+            self.tokens = tokens
+        else:
+            self.source = iter(tokens)
+            self.tokens = list(islice(self.source, TOKEN_WINDOW))
+        self.base = 0
+        self.end = len(self.tokens)
         self.current = 0
         self.has_errors = False 
+        self.lines = {}
    
     def parse(self):
         statements = []
@@ -229,7 +352,7 @@ class Parser:
         while self.match(TokenType.OR):
             operator = self.previous()
             right = self.and_expr()
-            expr = Expr.Logical(expr, operator, right)
+            expr = self.mark(Expr.Logical(expr, operator.type, right), operator)
 
         return expr
     
@@ -239,7 +362,7 @@ class Parser:
         while self.match(TokenType.AND):
             operator = self.previous()
             right = self.equality()
-            expr = Expr.Logical(expr, operator, right)
+            expr = self.mark(Expr.Logical(expr, operator.type, right), operator)
 
         return expr
 
@@ -249,6 +372,8 @@ class Parser:
                 return self.var_declaration()
             if self.match(TokenType.FUN):
                 return self.function("function")
+            if self.match(TokenType.IMPORT):
+                return self.import_declaration()
             return self.statement()
         except ParseError:
             self.has_errors = True
@@ -297,6 +422,12 @@ class Parser:
         self.consume(TokenType.SEMICOLON, "Expect ';' after return value.")
         return Stmt.Return(keyword, value)
 
+    def import_declaration(self):
+        keyword = self.previous()
+        path = self.consume(TokenType.STRING, "Expect module path after 'import'.")
+        self.consume(TokenType.SEMICOLON, "Expect ';' after module path.")
+        return Stmt.Import(keyword, path)
+
     def var_declaration(self):
         name = self.consume(TokenType.IDENTIFIER, "Expect variable name.")
         initializer = None
@@ -307,6 +438,11 @@ class Parser:
         return Stmt.Var(name, initializer)
 
     def function(self, kind):
+        name, parameters = self.function_header(kind)
+        body = self.block()
+        return Stmt.Function(name, parameters, body)
+
+    def function_header(self, kind):
         # Pass "method" for 'kind' in case of method declarations for specific error messages
         name = self.consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
 
@@ -322,8 +458,7 @@ class Parser:
 
         self.consume(TokenType.RIGHT_PAREN, f"Expect ')' after parameters.")
         self.consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
-        body = self.block()
-        return Stmt.Function(name, parameters, body)
+        return name, parameters
     
     def while_statement(self):
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
@@ -334,7 +469,11 @@ class Parser:
         return Stmt.While(condition, body)
     
     def for_statement(self):
-        #syntactic sugar
+        initializer, condition, increment = self.for_clauses()
+        body = self.statement()
+        return self.desugar_for(initializer, condition, increment, body)
+
+    def for_clauses(self):
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
 
         initializer = None
@@ -356,9 +495,10 @@ class Parser:
             increment = self.expression()
 
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+        return initializer, condition, increment
 
-        body = self.statement()
-
+    def desugar_for(self, initializer, condition, increment, body):
+        #syntactic sugar
         # Add increment to the end of the body
         if increment is not None:
             body = Stmt.Block([body, Stmt.Expression(increment)])
@@ -393,7 +533,7 @@ class Parser:
         while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
             operator = self.previous()
             right = self.comparison()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.mark(Expr.Binary(expr, operator.type, right), operator)
         return expr
 
     def comparison(self):
@@ -401,7 +541,7 @@ class Parser:
         while self.match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
             operator = self.previous()
             right = self.term()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.mark(Expr.Binary(expr, operator.type, right), operator)
         return expr
 
     def term(self):
@@ -409,7 +549,7 @@ class Parser:
         while self.match(TokenType.MINUS, TokenType.PLUS):
             operator = self.previous()
             right = self.factor()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.mark(Expr.Binary(expr, operator.type, right), operator)
         return expr
 
     def factor(self):
@@ -417,14 +557,14 @@ class Parser:
         while self.match(TokenType.SLASH, TokenType.STAR):
             operator = self.previous()
             right = self.unary()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.mark(Expr.Binary(expr, operator.type, right), operator)
         return expr
 
     def unary(self):
         if self.match(TokenType.BANG, TokenType.MINUS):
             operator = self.previous()
             right = self.unary()
-            return Expr.Unary(operator, right)
+            return self.mark(Expr.Unary(operator.type, right), operator)
         # return self.primary()
         return self.call()
 
@@ -449,17 +589,19 @@ class Parser:
                     break
 
         paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
-        return Expr.Call(callee, paren, arguments)
+        return self.mark(Expr.Call(callee, arguments), paren)
 
     def primary(self):
         if self.match(TokenType.FALSE):
-            return Expr.Literal("false")
+            return Expr.Literal(False)
         if self.match(TokenType.TRUE):
-            return Expr.Literal("true")
+            return Expr.Literal(True)
         if self.match(TokenType.NIL):
-            return Expr.Literal("nil")
-        if self.match(TokenType.NUMBER, TokenType.STRING):
+            return Expr.Literal(NIL)
+        if self.match(TokenType.NUMBER):
             return Expr.Literal(self.previous().literal)
+        if self.match(TokenType.STRING):
+            return Expr.Literal(lox_string(self.previous().literal))
         if self.match(TokenType.LEFT_PAREN):
             expr = self.expression()
             self.consume(TokenType.RIGHT_PAREN, "Expect expression")
@@ -491,17 +633,30 @@ class Parser:
     def advance(self):
         if not self.is_at_end():
             self.current += 1
+            if self.current == self.end:
+                self.refill()
         return self.previous()
 
+    def refill(self):
+        """Moves the token window on, keeping the previous token."""
+        self.tokens = [self.tokens[-1], *islice(self.source, TOKEN_WINDOW)]
+        self.base = self.current - 1
+        self.end = self.base + len(self.tokens)
+
     def is_at_end(self):
         return self.peek().type == TokenType.EOF
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.tokens[self.current - self.base]
 
     def previous(self):
-        return self.tokens[self.current - 1]
+        return self.tokens[self.current - 1 - self.base]
     
+    def mark(self, node, token):
+        """Records the line ``token`` sits on as the source line of ``node``."""
+        self.lines[node] = token.line
+        return node
+
     def error(self, token: Token, message):
         Lox.error(token, message)
         return ParseError()
@@ -522,6 +677,11 @@ class Parser:
             self.advance()
 
     
+OPERATOR_LEXEMES = {
+    token_type: lexeme
+    for lexeme, token_type in {**Scanner.keywords, **RegexScanner.operators}.items()
+}
+
 #A Vistor class (Visitor Pattern)
 class AstPrinter(Expr.Visitor, Stmt.Visitor):
     def print(self, expr: Expr) -> str:
@@ -529,7 +689,7 @@ class AstPrinter(Expr.Visitor, Stmt.Visitor):
              return expr.accept(self)
 
     def visit_binary_expr(self, expr: Expr.Binary) -> str:
-        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+        return self.parenthesize(OPERATOR_LEXEMES[expr.operator], expr.left, expr.right)
 
     def visit_grouping_expr(self, expr: Expr.Grouping) -> str:
         return self.parenthesize("group", expr.expression)
@@ -537,10 +697,10 @@ class AstPrinter(Expr.Visitor, Stmt.Visitor):
     def visit_literal_expr(self, expr: Expr.Literal) -> str:
         if expr.value is None:
             return "nil"
-        return str(expr.value)
+        return stringify(expr.value)
 
     def visit_unary_expr(self, expr: Expr.Unary) -> str:
-        return self.parenthesize(expr.operator.lexeme, expr.right)
+        return self.parenthesize(OPERATOR_LEXEMES[expr.operator], expr.right)
     
     def visit_variable_expr(self, expr: Expr.Variable):
         return self.parenthesize(expr.name)
@@ -549,7 +709,7 @@ class AstPrinter(Expr.Visitor, Stmt.Visitor):
         return self.parenthesize(expr.name.lexeme, expr.value)
     
     def visit_logical_expr(self, expr: Expr.Logical):
-        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+        return self.parenthesize(OPERATOR_LEXEMES[expr.operator], expr.left, expr.right)
 
     def visit_expression_stmt(self, stmt: Stmt.Expression):
         return self.print(stmt.expression)
@@ -578,6 +738,9 @@ class AstPrinter(Expr.Visitor, Stmt.Visitor):
     def visit_return_stmt(self, stmt: Stmt.Return):
         return self.parenthesize("return", stmt.value)
 
+    def visit_import_stmt(self, stmt: Stmt.Import):
+        return self.parenthesize(f"import {stmt.path.lexeme}")
+
     def parenthesize(self, name: str, *exprs: Expr) -> str:
         builder = []
 
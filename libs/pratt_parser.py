@@ -0,0 +1,241 @@
+from functools import partial
+from .tokenizer import TokenType
+from .parser import Expr, Stmt, Parser, ParseError
+from .values import NIL, lox_string
+
+class Precedence:
+    NONE = 0
+    ASSIGNMENT = 1
+    OR = 2
+    AND = 3
+    EQUALITY = 4
+    COMPARISON = 5
+    TERM = 6
+    FACTOR = 7
+    UNARY = 8
+
+# Operand handlers, keyed by the token that starts the operand
+ATOMS = {
+    TokenType.FALSE: lambda token: Expr.Literal(False),
+    TokenType.TRUE: lambda token: Expr.Literal(True),
+    TokenType.NIL: lambda token: Expr.Literal(NIL),
+    TokenType.NUMBER: lambda token: Expr.Literal(token.literal),
+    TokenType.STRING: lambda token: Expr.Literal(lox_string(token.literal)),
+    TokenType.IDENTIFIER: Expr.Variable,
+}
+
+PREFIX_OPERATORS = {TokenType.BANG, TokenType.MINUS}
+
+# Infix operators: token type -> (precedence, node class)
+INFIX_OPERATORS = {
+    TokenType.EQUAL: (Precedence.ASSIGNMENT, Expr.Assign),
+    TokenType.OR: (Precedence.OR, Expr.Logical),
+    TokenType.AND: (Precedence.AND, Expr.Logical),
+    TokenType.BANG_EQUAL: (Precedence.EQUALITY, Expr.Binary),
+    TokenType.EQUAL_EQUAL: (Precedence.EQUALITY, Expr.Binary),
+    TokenType.GREATER: (Precedence.COMPARISON, Expr.Binary),
+    TokenType.GREATER_EQUAL: (Precedence.COMPARISON, Expr.Binary),
+    TokenType.LESS: (Precedence.COMPARISON, Expr.Binary),
+    TokenType.LESS_EQUAL: (Precedence.COMPARISON, Expr.Binary),
+    TokenType.MINUS: (Precedence.TERM, Expr.Binary),
+    TokenType.PLUS: (Precedence.TERM, Expr.Binary),
+    TokenType.SLASH: (Precedence.FACTOR, Expr.Binary),
+    TokenType.STAR: (Precedence.FACTOR, Expr.Binary),
+}
+
+# Open parentheses sit on the operator stack with the lowest precedence,
+# so no reduction ever reaches past them.
+GROUP = "group"
+CALL = "call"
+
+# Statements still waiting for a body
+BLOCK = "block"
+IF = "if"
+ELSE = "else"
+WHILE = "while"
+FOR = "for"
+
+class PrattParser(Parser):
+    """Table-driven parser that keeps its own stacks instead of recursing.
+
+    Expressions are parsed by precedence climbing over an explicit operand
+    and operator stack, and statements that wrap other statements (blocks,
+    function bodies, if/else, while, for) are tracked on a stack of pending
+    constructs. Nesting depth is therefore bounded by memory, not by the
+    Python recursion limit. Trees, error messages and error recovery are
+    the same as ``Parser``.
+    """
+
+    def parse(self):
+        statements = []
+        stack = [[BLOCK, statements, None]]
+
+        while True:
+            pending = stack[-1]
+            try:
+                if pending[0] == BLOCK:
+                    if len(stack) == 1:
+                        if self.is_at_end():
+                            return statements
+                    elif self.check(TokenType.RIGHT_BRACE) or self.is_at_end():
+                        stack.pop()
+                        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
+                        self.complete(stack, pending[2](pending[1]))
+                        continue
+                    statement = self.begin_declaration(stack)
+                else:
+                    statement = self.begin_statement(stack)
+
+                if statement is not None:
+                    self.complete(stack, statement)
+            except ParseError:
+                # Like Parser.declaration(): the innermost block's current
+                # declaration is abandoned and recorded as None.
+                while stack[-1][0] != BLOCK:
+                    stack.pop()
+                self.has_errors = True
+                self.synchronize()
+                stack[-1][1].append(None)
+
+    def begin_declaration(self, stack):
+        if self.match(TokenType.VAR):
+            return self.var_declaration()
+        if self.match(TokenType.FUN):
+            name, parameters = self.function_header("function")
+            stack.append([BLOCK, [], partial(Stmt.Function, name, parameters)])
+            return None
+        if self.match(TokenType.IMPORT):
+            return self.import_declaration()
+        return self.begin_statement(stack)
+
+    def begin_statement(self, stack):
+        """Parses a simple statement, or opens a compound one and returns None."""
+        if self.match(TokenType.PRINT):
+            return self.print_statement()
+        if self.match(TokenType.RETURN):
+            return self.return_statement()
+        if self.match(TokenType.LEFT_BRACE):
+            stack.append([BLOCK, [], Stmt.Block])
+            return None
+        if self.match(TokenType.IF):
+            self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
+            condition = self.expression()
+            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
+            stack.append([IF, condition, None])
+            return None
+        if self.match(TokenType.WHILE):
+            self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
+            condition = self.expression()
+            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
+            stack.append([WHILE, condition])
+            return None
+        if self.match(TokenType.FOR):
+            stack.append([FOR, *self.for_clauses()])
+            return None
+        return self.expression_statement()
+
+    def complete(self, stack, statement):
+        """Hands a finished statement to the construct waiting for it."""
+        while True:
+            pending = stack[-1]
+            kind = pending[0]
+            if kind == BLOCK:
+                pending[1].append(statement)
+                return
+            if kind == IF and self.match(TokenType.ELSE):
+                pending[0] = ELSE
+                pending[2] = statement
+                return
+
+            stack.pop()
+            if kind == IF:
+                statement = Stmt.If(pending[1], statement, None)
+            elif kind == ELSE:
+                statement = Stmt.If(pending[1], pending[2], statement)
+            elif kind == WHILE:
+                statement = Stmt.While(pending[1], statement)
+            else:
+                statement = self.desugar_for(pending[1], pending[2], pending[3], statement)
+
+    def expression(self):
+        operands = []
+        operators = []
+
+        while True:
+            # Prefix position: any run of unary operators and '(' then an operand
+            token = self.peek()
+            while token.type in PREFIX_OPERATORS or token.type == TokenType.LEFT_PAREN:
+                self.advance()
+                if token.type == TokenType.LEFT_PAREN:
+                    operators.append((Precedence.NONE, GROUP, None))
+                else:
+                    operators.append((Precedence.UNARY, token, Expr.Unary))
+                token = self.peek()
+
+            atom = ATOMS.get(token.type)
+            if atom is None:
+                raise self.error(token, "I AM FUCKED.")
+            self.advance()
+            operands.append(atom(token))
+
+            # Infix position: a binary operator, a call, or the end of a group
+            while True:
+                token = self.peek()
+                infix = INFIX_OPERATORS.get(token.type)
+                if infix is not None:
+                    precedence, node_class = infix
+                    # Assignment is right-associative, everything else left
+                    if precedence == Precedence.ASSIGNMENT:
+                        self.reduce(operands, operators, precedence)
+                    else:
+                        self.reduce(operands, operators, precedence - 1)
+                    self.advance()
+                    operators.append((precedence, token, node_class))
+                    break
+
+                if token.type == TokenType.LEFT_PAREN:
+                    self.advance()
+                    callee = operands.pop()
+                    if self.check(TokenType.RIGHT_PAREN):
+                        operands.append(self.mark(Expr.Call(callee, []), self.advance()))
+                        continue
+                    operators.append((Precedence.NONE, CALL, (callee, [])))
+                    break
+
+                self.reduce(operands, operators, Precedence.NONE)
+                if not operators:
+                    return operands.pop()
+
+                _, kind, call = operators[-1]
+                if kind == GROUP:
+                    if not self.check(TokenType.RIGHT_PAREN):
+                        raise self.error(self.peek(), "Expect expression")
+                    self.advance()
+                    operators.pop()
+                    operands.append(Expr.Grouping(operands.pop()))
+                    continue
+
+                callee, arguments = call
+                arguments.append(operands.pop())
+                if self.match(TokenType.COMMA):
+                    if len(arguments) >= 255:
+                        self.error(self.peek(), "Can't have more than 255 arguments.")
+                    break
+                paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
+                operators.pop()
+                operands.append(self.mark(Expr.Call(callee, arguments), paren))
+
+    def reduce(self, operands, operators, precedence):
+        """Applies stacked operators that bind tighter than ``precedence``."""
+        while operators and operators[-1][0] > precedence:
+            operator_precedence, operator, node_class = operators.pop()
+            right = operands.pop()
+            if operator_precedence == Precedence.UNARY:
+                operands.append(self.mark(Expr.Unary(operator.type, right), operator))
+            elif operator_precedence == Precedence.ASSIGNMENT:
+                target = operands.pop()
+                if not isinstance(target, Expr.Variable):
+                    raise self.error(operator, "Invalid assignment target.")
+                operands.append(Expr.Assign(target.name, right))
+            else:
+                operands.append(self.mark(node_class(operands.pop(), operator.type, right), operator))
@@ -0,0 +1,279 @@
+"""Profiles Lox programs for ``main.py profile``.
+
+ProfilingInterpreter is the tree walker with hooks on calls and
+statements, so programs run by any other command pay nothing for it. It
+records, per function, how often it was called and the time spent in it
+(total) and in it but not in the functions it called (self), per source
+line, how many statements on it ran, and the self time of every distinct
+call stack, which ``write_collapsed`` exports in the collapsed format
+flamegraph.pl and speedscope read. ``main.py profile`` compiles without
+inlining, so that every call in the source is one in the report.
+
+Statements carry no line of their own, so a statement's line is taken
+from the first token found in it: a declared name, a return or import
+keyword, a variable, or an operator or call the parser marked. One made
+only of literals gets the line of the statement before it.
+"""
+import os
+import time
+
+from .parser import Expr, Stmt
+from .interpreter import Interpreter
+from .fun_impl.jplox_function import LoxFunction, NativeFunction
+from .fun_impl.fun_return import Return
+
+# Name of the outermost frame, the program's top level
+SCRIPT = "<script>"
+
+
+class FunctionStats:
+    __slots__ = ("calls", "total", "self_time")
+
+    def __init__(self):
+        self.calls = 0
+        # Seconds, counting a recursive function's time once
+        self.total = 0.0
+        self.self_time = 0.0
+
+
+class Frame:
+    __slots__ = ("label", "path", "start", "children")
+
+    def __init__(self, label, path, start):
+        self.label = label
+        # The labels of the frames below and this one, joined by ";"
+        self.path = path
+        self.start = start
+        # Seconds spent in calls made from this frame
+        self.children = 0.0
+
+
+class Profiler:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # Label -> FunctionStats
+        self.functions = {}
+        # (path, line) -> statements run
+        self.lines = {}
+        # Collapsed stack -> self seconds
+        self.stacks = {}
+        # Label -> frames with it on the stack, so recursion counts once
+        self.active = {}
+        # The top level's frame first, once start has been called
+        self.frames = []
+
+    def start(self):
+        self.frames.append(Frame(SCRIPT, SCRIPT, self.clock()))
+
+    def enter(self, label):
+        """Opens a frame for a call of ``label``; returns the depth to
+        leave back to when the call returns."""
+        depth = len(self.frames)
+        stats = self.functions.get(label)
+        if stats is None:
+            stats = self.functions[label] = FunctionStats()
+        stats.calls += 1
+        self.active[label] = self.active.get(label, 0) + 1
+        self.frames.append(Frame(label, self.frames[-1].path + ";" + label, self.clock()))
+        return depth
+
+    def leave(self, depth):
+        """Closes frames until ``depth`` remain."""
+        while len(self.frames) > depth:
+            self.close()
+
+    def replace(self, label):
+        """Closes the innermost frame and opens one for ``label`` in its
+        place, as a tail call does."""
+        self.close()
+        self.enter(label)
+
+    def close(self):
+        now = self.clock()
+        frame = self.frames.pop()
+        elapsed = now - frame.start
+        own = elapsed - frame.children
+        self.frames[-1].children += elapsed
+        self.stacks[frame.path] = self.stacks.get(frame.path, 0.0) + own
+
+        label = frame.label
+        stats = self.functions[label]
+        stats.self_time += own
+        self.active[label] -= 1
+        if not self.active[label]:
+            stats.total += elapsed
+
+    def hit(self, line):
+        self.lines[line] = self.lines.get(line, 0) + 1
+
+    def finish(self):
+        """Closes every frame and books the top level's own time."""
+        if not self.frames:
+            return
+        self.leave(1)
+        root = self.frames[0]
+        own = self.clock() - root.start - root.children
+        self.stacks[SCRIPT] = self.stacks.get(SCRIPT, 0.0) + own
+
+    def report(self, out, limit=20):
+        """Writes the ``limit`` functions with the most self time and the
+        ``limit`` lines with the most statements run."""
+        functions = sorted(self.functions.items(), key=lambda item: item[1].self_time, reverse=True)
+        print(f"{'calls':>10} {'total s':>10} {'self s':>10}  function", file=out)
+        for label, stats in functions[:limit]:
+            print(f"{stats.calls:>10} {stats.total:>10.4f} {stats.self_time:>10.4f}  {label}", file=out)
+
+        lines = sorted(self.lines.items(), key=lambda item: (-item[1], item[0]))
+        print(file=out)
+        print(f"{'hits':>10}  line", file=out)
+        for (path, line), hits in lines[:limit]:
+            print(f"{hits:>10}  {path}:{line}", file=out)
+
+    def write_collapsed(self, out):
+        """Writes one ``stack microseconds`` line per call stack."""
+        for path, seconds in sorted(self.stacks.items()):
+            microseconds = round(seconds * 1e6)
+            if microseconds > 0:
+                out.write(f"{path} {microseconds}\n")
+
+
+class TailCall:
+    """Stands in for the callee of a tail call, which LoxFunction.call
+    runs in place of the function that returned it, so that its profile
+    frame replaces the caller's too."""
+
+    __slots__ = ("interpreter", "function", "globals")
+
+    def __init__(self, interpreter, function):
+        self.interpreter = interpreter
+        self.function = function
+        self.globals = function.globals
+
+    def run_body(self, interpreter, arguments):
+        self.interpreter.profiler.replace(self.interpreter.label(self.function))
+        return self.function.run_body(interpreter, arguments)
+
+
+class ProfilingInterpreter(Interpreter):
+    def __init__(self):
+        super().__init__()
+        self.profiler = Profiler()
+        # Stmt -> (path, line) of each statement of the modules run
+        self.statement_lines = {}
+        # Stmt.Function -> its label in the report
+        self.labels = {}
+        # Path of the first module run, for functions no module indexed
+        self.main_path = SCRIPT
+
+    def execute_module(self, module):
+        if not self.profiler.frames:
+            self.profiler.start()
+        self.index(module)
+        super().execute_module(module)
+
+    def run(self, stmt):
+        line = self.statement_lines.get(stmt)
+        if line is not None:
+            self.profiler.hit(line)
+        return stmt.accept(self)
+
+    def visit_call_expr(self, expr):
+        function, arguments = self.call_target(expr)
+        return self.profile_call(function, arguments)
+
+    def visit_return_stmt(self, stmt):
+        if isinstance(stmt.value, Expr.Call):
+            function, arguments = self.call_target(stmt.value)
+            if function.__class__ is LoxFunction:
+                return Return(None, TailCall(self, function), arguments)
+            return Return(self.profile_call(function, arguments))
+        return super().visit_return_stmt(stmt)
+
+    def profile_call(self, function, arguments):
+        profiler = self.profiler
+        depth = profiler.enter(self.label(function))
+        try:
+            return function.call(self, arguments)
+        finally:
+            profiler.leave(depth)
+
+    def label(self, function):
+        if function.__class__ is LoxFunction:
+            declaration = function.declaration
+            label = self.labels.get(declaration)
+            if label is None:
+                path, line = self.statement_lines.get(declaration, (self.main_path, declaration.name.line))
+                label = self.labels[declaration] = f"{declaration.name.lexeme} ({path}:{line})"
+            return label
+        if function.__class__ is NativeFunction:
+            return f"{function.name} (native)"
+        return function.to_string()
+
+    def index(self, module):
+        """Records the line of every statement in ``module``, function
+        declarations included."""
+        path = os.path.relpath(module.path) if os.path.isabs(module.path) else module.path
+        if not self.statement_lines:
+            self.main_path = path
+        self.index_statements(module.statements, path, module.lines, None)
+
+    def index_statements(self, statements, path, lines, line):
+        for statement in statements:
+            line = self.index_statement(statement, path, lines, line)
+        return line
+
+    def index_statement(self, stmt, path, lines, line):
+        """Indexes ``stmt``; returns the line of the last statement in it."""
+        if stmt.__class__ is Stmt.Block:
+            return self.index_statements(stmt.declarations, path, lines, line)
+        line = statement_line(stmt, lines) or line
+        if line is not None:
+            self.statement_lines[stmt] = (path, line)
+
+        if stmt.__class__ is Stmt.Function:
+            return self.index_statements(stmt.body, path, lines, line)
+        if stmt.__class__ is Stmt.If:
+            line = self.index_statement(stmt.then_branch, path, lines, line)
+            if stmt.else_branch is not None:
+                line = self.index_statement(stmt.else_branch, path, lines, line)
+        elif stmt.__class__ is Stmt.While:
+            # The counted-loop path steps the counter without running the
+            # increment statement, which would then go uncounted
+            stmt.loop = False
+            line = self.index_statement(stmt.body, path, lines, line)
+        return line
+
+
+def statement_line(stmt, lines):
+    """The line of the first token in ``stmt`` that has one, or None."""
+    if stmt.__class__ in (Stmt.Var, Stmt.Function):
+        return stmt.name.line
+    if stmt.__class__ in (Stmt.Return, Stmt.Import):
+        return stmt.keyword.line
+    if stmt.__class__ in (Stmt.Expression, Stmt.Print):
+        return expression_line(stmt.expression, lines)
+    if stmt.__class__ in (Stmt.If, Stmt.While):
+        return expression_line(stmt.condition, lines)
+    return None
+
+
+def expression_line(expr, lines):
+    pending = [expr]
+    while pending:
+        expr = pending.pop()
+        line = lines.get(expr)
+        if line is not None:
+            return line
+        if expr.__class__ in (Expr.Variable, Expr.Assign):
+            return expr.name.line
+        if expr.__class__ in (Expr.Binary, Expr.Logical):
+            pending.append(expr.right)
+            pending.append(expr.left)
+        elif expr.__class__ is Expr.Unary:
+            pending.append(expr.right)
+        elif expr.__class__ is Expr.Grouping:
+            pending.append(expr.expression)
+        elif expr.__class__ is Expr.Call:
+            pending.extend(reversed(expr.arguments))
+            pending.append(expr.callee)
+    return None
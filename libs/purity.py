@@ -0,0 +1,134 @@
+"""Finds the functions whose calls can be memoized.
+
+A function is pure when a call's result depends only on its arguments and
+the call has no other effect. The resolver reports what it sees inside
+each function body; once the whole module is resolved, ``finish`` sets
+``pure`` on every Stmt.Function that passes. A function is impure if its
+body
+
+  - prints, which includes while loops: blocks print a loop's results
+  - declares a function, as each call would return a new closure
+  - assigns a variable that is not its own
+  - reads a variable that is not its own and is ever assigned, declared
+    more than once, or a global of a module with imports, which may
+    redefine it
+  - calls anything but a pure function or pure native held by such a
+    variable
+
+Variables are told apart by their resolver Frame and slot, or by name for
+globals. A closure reads the variables of the one environment it
+captured, so the interpreter keys its cache on the function object.
+"""
+
+
+class FunctionFacts:
+    """What the resolver saw in one function body."""
+
+    __slots__ = ("function", "scope", "impure", "reads", "calls")
+
+    def __init__(self, function, scope):
+        self.function = function
+        # Index of the function's outermost scope in the resolver's stack;
+        # variables in it or deeper belong to the function
+        self.scope = scope
+        self.impure = False
+        # Variables read or called that are not the function's own
+        self.reads = []
+        self.calls = []
+
+
+class Purity:
+    def __init__(self, globals):
+        # Where the natives are, to look up their purity
+        self.globals = globals
+        self.functions = []
+        # Facts of the functions being resolved, innermost last
+        self.stack = []
+        # Variables assigned anywhere in the module
+        self.assigned = set()
+        # Variable -> number of declarations
+        self.declarations = {}
+        # Variable -> the Stmt.Function that declared it
+        self.function_declarations = {}
+        self.imports = False
+
+    def enter(self, function, scope):
+        facts = FunctionFacts(function, scope)
+        self.functions.append(facts)
+        self.stack.append(facts)
+
+    def leave(self):
+        self.stack.pop()
+
+    def impure(self):
+        """Marks the function being resolved, if any, as impure."""
+        if self.stack:
+            self.stack[-1].impure = True
+
+    def declare(self, variable, function=None):
+        self.declarations[variable] = self.declarations.get(variable, 0) + 1
+        if function is not None:
+            self.function_declarations[variable] = function
+
+    def assign(self, variable, scope):
+        self.assigned.add(variable)
+        if self.stack and not self.owns(scope):
+            self.stack[-1].impure = True
+
+    def read(self, variable, scope):
+        if self.stack and not self.owns(scope):
+            self.stack[-1].reads.append(variable)
+
+    def call(self, variable, scope):
+        if not self.stack:
+            return
+        if self.owns(scope):
+            # A parameter or local: it could hold any function
+            self.stack[-1].impure = True
+        else:
+            self.stack[-1].calls.append(variable)
+
+    def owns(self, scope):
+        """Whether a variable found in ``scope`` belongs to the innermost
+        function; globals have scope None."""
+        return scope is not None and scope >= self.stack[-1].scope
+
+    def finish(self):
+        pure = {facts.function for facts in self.functions if not facts.impure}
+        # Assume every candidate pure, then drop those relying on one that
+        # is not, until nothing changes; recursion keeps its assumption
+        changed = True
+        while changed:
+            changed = False
+            for facts in self.functions:
+                if facts.function in pure and not self.holds(facts, pure):
+                    pure.discard(facts.function)
+                    changed = True
+        for facts in self.functions:
+            facts.function.pure = facts.function in pure
+
+    def holds(self, facts, pure):
+        for variable in facts.reads:
+            if not self.constant(variable):
+                return False
+        for variable in facts.calls:
+            function = self.function_declarations.get(variable)
+            if function is not None:
+                if function not in pure:
+                    return False
+            elif not self.pure_native(variable):
+                return False
+        return True
+
+    def constant(self, variable):
+        """Whether ``variable`` holds one value from its declaration on."""
+        if variable in self.assigned or self.declarations.get(variable, 0) > 1:
+            return False
+        return not (self.imports and variable.__class__ is str)
+
+    def pure_native(self, variable):
+        if variable.__class__ is not str or variable in self.declarations:
+            return False
+        slot = self.globals.slots.get(variable)
+        native = self.globals.values[slot] if slot is not None else None
+        return getattr(native, "pure", False)
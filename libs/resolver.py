@@ -1,28 +1,89 @@
 from .parser import Expr, Stmt, Lox 
+from .purity import Purity
 
 class FunctionType:
     NONE = "NONE"
     FUNCTION = "FUNCTION"
 
+class Frame:
+    """Slots handed out so far in one runtime Environment."""
+
+    def __init__(self, leaf):
+        self.size = 0
+        # No function is declared anywhere inside, so nothing can capture it
+        self.leaf = leaf
+
+    def allocate(self):
+        self.size += 1
+        return self.size - 1
+
+def declares_function(statements):
+    """Whether a function declaration appears anywhere in ``statements``."""
+    pending = list(statements)
+    while pending:
+        stmt = pending.pop()
+        if isinstance(stmt, Stmt.Function):
+            return True
+        if isinstance(stmt, Stmt.Block):
+            pending.extend(stmt.declarations)
+        elif isinstance(stmt, Stmt.If):
+            pending.append(stmt.then_branch)
+            if stmt.else_branch is not None:
+                pending.append(stmt.else_branch)
+        elif isinstance(stmt, Stmt.While):
+            pending.append(stmt.body)
+    return False
+
 class Resolver(Expr.Visitor, Stmt.Visitor):
+    """Resolves every local to a (depth, slot) pair.
+
+    Scopes are what the language sees; frames are what the interpreter
+    allocates. Functions always get a frame. A block only gets one when it
+    declares something and may be captured by a closure, or when it is the
+    outermost block of a region no closure can reach; blocks nested inside
+    such a region (including leaf function bodies) put their locals in that
+    region's frame instead of allocating their own.
+    """
+
     def __init__(self, interpreter):
         self.interpreter = interpreter
         self.scopes = []
+        # Slot of each name in the matching scope's frame
+        self.slots = []
+        # Index into self.frames of the frame each scope allocates in
+        self.scope_frames = []
+        self.frames = []
         self.current_function = FunctionType.NONE
         self.has_error = False
+        self.has_warning = False
+        self.purity = Purity(interpreter.globals)
 
     def resolve(self, statements):
+        top_level = not self.scopes
         for statement in statements:
             self.resolve_stmt(statement)
+        if top_level:
+            self.purity.finish()
 
     def visit_block_stmt(self, stmt):
+        owns_frame = (not (self.frames and self.frames[-1].leaf)
+                      and any(isinstance(declaration, (Stmt.Var, Stmt.Function))
+                              for declaration in stmt.declarations))
+        if owns_frame:
+            self.frames.append(Frame(not declares_function(stmt.declarations)))
         self.begin_scope()
         self.resolve(stmt.declarations)
         self.end_scope()
+        if owns_frame:
+            stmt.size = self.frames.pop().size
+        else:
+            stmt.size = None
         return None
 
     def visit_function_stmt(self, stmt):
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
+        self.purity.impure()
+        self.purity.declare(self.declared_variable(stmt), stmt)
         self.define(stmt.name)
         self.resolve_function(stmt, FunctionType.FUNCTION)
         return None
@@ -39,6 +100,7 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         return None
 
     def visit_print_stmt(self, stmt):
+        self.purity.impure()
         self.resolve_expr(stmt.expression)
         return None
 
@@ -50,7 +112,15 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
             self.resolve_expr(stmt.value)
         return None
 
+    def visit_import_stmt(self, stmt):
+        if self.scopes:
+            self.has_error = True
+            Lox.error(stmt.keyword, "Can only import at top level.")
+        self.purity.imports = True
+        return None
+
     def visit_while_stmt(self, stmt):
+        self.purity.impure()
         self.resolve_expr(stmt.condition)
         self.resolve_stmt(stmt.body)
         return None
@@ -61,7 +131,12 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         return None
 
     def visit_call_expr(self, expr):
-        self.resolve_expr(expr.callee)
+        if isinstance(expr.callee, Expr.Variable):
+            scope = self.resolve_variable(expr.callee)
+            self.purity.call(self.variable(scope, expr.callee), scope)
+        else:
+            self.resolve_expr(expr.callee)
+            self.purity.impure()
         for argument in expr.arguments:
             self.resolve_expr(argument)
         return None
@@ -83,7 +158,8 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         return None
 
     def visit_var_stmt(self, stmt):
-        self.declare(stmt.name)
+        stmt.slot = self.declare(stmt.name)
+        self.purity.declare(self.declared_variable(stmt))
         if stmt.initializer is not None:
             self.resolve_expr(stmt.initializer)
         self.define(stmt.name)
@@ -91,14 +167,28 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
 
     def visit_assign_expr(self, expr):
         self.resolve_expr(expr.value)
-        self.resolve_local(expr, expr.name)
+        scope = self.resolve_local(expr, expr.name)
+        self.purity.assign(self.variable(scope, expr), scope)
         return None
 
     def visit_variable_expr(self, expr):
+        self.resolve_variable(expr)
+        return None
+
+    def resolve_variable(self, expr):
+        """Resolves a read of a variable; returns its scope index as
+        resolve_local does."""
         if self.scopes and self.scopes[-1].get(expr.name.lexeme) is False:
+            self.has_warning = True
             Lox.error(expr.name, "Can't read local variable in its own initializer.")
-        self.resolve_local(expr, expr.name)
-        return None
+            # The variable has no value yet. Frames can be reused, so its own
+            # slot may hold a stale one; read a slot nothing ever writes.
+            expr.depth = 0
+            expr.slot = self.frames[-1].allocate()
+            return len(self.scopes) - 1
+        scope = self.resolve_local(expr, expr.name)
+        self.purity.read(self.variable(scope, expr), scope)
+        return scope
 
     def resolve_stmt(self, stmt):
         stmt.accept(self)
@@ -109,28 +199,42 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
     def resolve_function(self, function, function_type):
         enclosing_function = self.current_function
         self.current_function = function_type
+        function.leaf = not declares_function(function.body)
+        self.frames.append(Frame(function.leaf))
+        self.purity.enter(function, len(self.scopes))
         self.begin_scope()
         for param in function.params:
             self.declare(param)
             self.define(param)
         self.resolve(function.body)
         self.end_scope()
+        self.purity.leave()
+        function.size = self.frames.pop().size
         self.current_function = enclosing_function
 
     def begin_scope(self):
         self.scopes.append({})
+        self.slots.append({})
+        self.scope_frames.append(len(self.frames) - 1)
 
     def end_scope(self):
         self.scopes.pop()
+        self.slots.pop()
+        self.scope_frames.pop()
 
     def declare(self, name):
+        """Declares ``name`` in the innermost scope and returns its slot."""
         if not self.scopes:
-            return
+            return self.interpreter.globals.slot(name.lexeme)
         scope = self.scopes[-1]
+        slots = self.slots[-1]
         if name.lexeme in scope:
             self.has_error = True 
             Lox.error(name, f"Variable with this name already declared in this scope.")
+            return slots[name.lexeme]
         scope[name.lexeme] = False
+        slots[name.lexeme] = self.frames[self.scope_frames[-1]].allocate()
+        return slots[name.lexeme]
 
     def define(self, name):
         if not self.scopes:
@@ -138,8 +242,26 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         self.scopes[-1][name.lexeme] = True
 
     def resolve_local(self, expr, name):
+        """Sets ``expr``'s depth and slot; returns the index of the scope
+        ``name`` was found in, or None for a global."""
         for i in range(len(self.scopes) - 1, -1, -1):
             if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
-                return
+                expr.depth = len(self.frames) - 1 - self.scope_frames[i]
+                expr.slot = self.slots[i][name.lexeme]
+                return i
+        expr.depth = None
+        expr.slot = self.interpreter.globals.slot(name.lexeme)
+        return None
+
+    def variable(self, scope, expr):
+        """Identifies the variable ``expr`` resolved to, for Purity."""
+        if scope is None:
+            return expr.name.lexeme
+        return (self.frames[self.scope_frames[scope]], expr.slot)
+
+    def declared_variable(self, stmt):
+        """Identifies the variable a declaration just declared."""
+        if not self.scopes:
+            return stmt.name.lexeme
+        return (self.frames[self.scope_frames[-1]], stmt.slot)
 
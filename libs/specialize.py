@@ -0,0 +1,116 @@
+"""Specialized handlers for binary operators, used to quicken Expr.Binary nodes.
+
+The first time the tree walker evaluates a binary node it looks up a handler
+for the node's operator and the classes of the operands it just saw, and
+stores it on the node. A handler checks that its operands still have those
+classes and returns the result, or MISS when they don't, after which the
+node goes back to the generic path for good.
+"""
+from .tokenizer import TokenType
+from .values import lox_string
+
+# Returned by a handler whose operands are not the ones it was made for
+MISS = object()
+
+
+def less_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a < b
+    return MISS
+
+
+def less_equal_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a <= b
+    return MISS
+
+
+def greater_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a > b
+    return MISS
+
+
+def greater_equal_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a >= b
+    return MISS
+
+
+def add_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a + b
+    return MISS
+
+
+def subtract_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a - b
+    return MISS
+
+
+def multiply_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a * b
+    return MISS
+
+
+def divide_floats(a, b):
+    # Division by zero raises, as on the generic path
+    if a.__class__ is float and b.__class__ is float:
+        return a / b
+    return MISS
+
+
+def equal_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a == b
+    return MISS
+
+
+def not_equal_floats(a, b):
+    if a.__class__ is float and b.__class__ is float:
+        return a != b
+    return MISS
+
+
+def add_strings(a, b):
+    if a.__class__ is str and b.__class__ is str:
+        return lox_string(a + b)
+    return MISS
+
+
+def equal_strings(a, b):
+    if a.__class__ is str and b.__class__ is str:
+        return a == b
+    return MISS
+
+
+def not_equal_strings(a, b):
+    if a.__class__ is str and b.__class__ is str:
+        return a != b
+    return MISS
+
+
+# (operator, left class, right class) -> handler
+HANDLERS = {
+    (TokenType.LESS, float, float): less_floats,
+    (TokenType.LESS_EQUAL, float, float): less_equal_floats,
+    (TokenType.GREATER, float, float): greater_floats,
+    (TokenType.GREATER_EQUAL, float, float): greater_equal_floats,
+    (TokenType.PLUS, float, float): add_floats,
+    (TokenType.MINUS, float, float): subtract_floats,
+    (TokenType.STAR, float, float): multiply_floats,
+    (TokenType.SLASH, float, float): divide_floats,
+    (TokenType.EQUAL_EQUAL, float, float): equal_floats,
+    (TokenType.BANG_EQUAL, float, float): not_equal_floats,
+    (TokenType.PLUS, str, str): add_strings,
+    (TokenType.EQUAL_EQUAL, str, str): equal_strings,
+    (TokenType.BANG_EQUAL, str, str): not_equal_strings,
+}
+
+
+def handler_for(operator, left, right):
+    """The handler for ``operator`` applied to values like ``left`` and
+    ``right``, or False if that combination has none."""
+    return HANDLERS.get((operator, left.__class__, right.__class__), False)
@@ -0,0 +1,319 @@
+from .tokenizer import TokenType
+from .parser import Expr, Stmt
+from .enviornment import Environment, MISSING
+from .interpreter import Interpreter, RuntimeError
+from .fun_impl.jplox_callable import LoxCallable
+from .fun_impl.jplox_function import LoxFunction
+from .fun_impl.fun_return import Return
+from .values import LoopResults, is_falsey, bang, stringify
+from .memo import MISSING as NOT_MEMOIZED, memo_key
+
+# Default for StackInterpreter.memory_budget, in bytes
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+# What one suspended Lox call is assumed to hold on to: its activation, the
+# generators of the statements and expressions the call sits in, and its
+# Environment. tracemalloc puts this at 1.4 KB for `return 1 + f(n - 1);`
+# and 4.4 KB for a call nested in a loop, an if and three operators.
+ACTIVATION_BYTES = 4096
+
+# Lox calls made as ordinary Python calls before the driver takes over.
+# Each one nests about ten Python frames, so this stays well inside the
+# default recursion limit.
+RECURSIVE_CALLS = 40
+
+
+class StackInterpreter(Interpreter):
+    """A tree walker whose deep Lox calls do not nest Python calls.
+
+    The first RECURSIVE_CALLS levels of calls run as in the tree walker.
+    Below that, every Lox call runs as a generator, its activation, kept on
+    a list that a driver loop works through: a call inside it yields the
+    callee and arguments to the driver, which pushes the callee's
+    activation and later sends the result back. Recursion depth is then
+    bounded by ``memory_budget`` rather than Python's recursion limit.
+
+    Within an activation, only statements and expressions that contain a
+    call need to be able to suspend; everything else runs on the ordinary
+    tree walker methods.
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        super().__init__()
+        self.memory_budget = memory_budget
+        # Lox calls currently nested as Python calls
+        self.depth = 0
+
+    def visit_call_expr(self, expr):
+        function, arguments = self.call_target(expr)
+        if function.__class__ is not LoxFunction:
+            return function.call(self, arguments)
+        depth = self.depth
+        if depth < RECURSIVE_CALLS:
+            # A runtime error ends the program, so nothing needs to undo
+            # the count if the call raises
+            self.depth = depth + 1
+            result = function.call(self, arguments)
+            self.depth = depth
+            return result
+        return self.drive(function, arguments)
+
+    def drive(self, function, arguments):
+        """Runs the call and every call it makes; returns its result.
+
+        The caller's environment and globals are restored afterwards.
+        """
+        max_depth = max(1, self.memory_budget // ACTIVATION_BYTES)
+        # (activation, environment and globals to restore when it finishes,
+        # memo key to store its result under or None)
+        stack = [(*self.start(function, arguments), self.environment, self.globals)]
+        value = None
+        while True:
+            try:
+                request = stack[-1][0].send(value)
+            except StopIteration as finished:
+                _, key, self.environment, self.globals = stack.pop()
+                value = finished.value
+                if key is not None:
+                    self.memo.store(key, value)
+                if len(stack) == 0:
+                    return value
+                continue
+
+            if request.__class__ is Return:
+                # A tail call: the callee takes the place of the activation
+                # that returned it, and its result is that activation's
+                _, key, environment, globals = stack.pop()
+                self.environment = environment
+                self.globals = globals
+                stack.append((self.activation(request.callee, request.arguments), key, environment, globals))
+            else:
+                if len(stack) >= max_depth:
+                    raise RuntimeError(None, "Stack overflow.")
+                function, arguments = request
+                stack.append((*self.start(function, arguments), self.environment, self.globals))
+            value = None
+
+    def start(self, function, arguments):
+        """Returns the activation for a call and the memo key its result
+        goes under, None unless the function is memoized. A call the memo
+        cache has the result of gets an activation that just returns it."""
+        memo = self.memo
+        if memo is None or not function.declaration.pure:
+            return self.activation(function, arguments), None
+        key = memo_key(function, arguments)
+        result = memo.lookup(key)
+        if result is not NOT_MEMOIZED:
+            return remembered(result), None
+        return self.activation(function, arguments), key
+
+    def activation(self, function, arguments):
+        declaration = function.declaration
+        environment = Environment(declaration.size, function.closure)
+        environment.values[:len(arguments)] = arguments
+        if function.globals is not None:
+            self.globals = function.globals
+        self.environment = environment
+        result = yield from self.statements(declaration.body)
+        if result is None:
+            return None
+        if result.callee is not None:
+            yield result
+            return None
+        return result.value
+
+    # The generators below mirror the tree walker's visit methods for nodes
+    # that contain a call. Each returns what its visit method would.
+
+    def value(self, expr):
+        if isinstance(expr, Expr.Call):
+            function, arguments = yield from self.call_target_of(expr)
+            if function.__class__ is LoxFunction:
+                return (yield function, arguments)
+            return function.call(self, arguments)
+
+        if isinstance(expr, Expr.Binary):
+            left = (yield from self.value(expr.left)) if expr.left.has_call else self.evaluate(expr.left)
+            right = (yield from self.value(expr.right)) if expr.right.has_call else self.evaluate(expr.right)
+            return self.binary_operation(expr, left, right)
+
+        if isinstance(expr, Expr.Logical):
+            left = (yield from self.value(expr.left)) if expr.left.has_call else self.evaluate(expr.left)
+            if expr.operator == TokenType.OR:
+                if not is_falsey(left):
+                    return left
+            else:
+                if is_falsey(left):
+                    return left
+            if expr.right.has_call:
+                return (yield from self.value(expr.right))
+            return self.evaluate(expr.right)
+
+        if isinstance(expr, Expr.Unary):
+            right = yield from self.value(expr.right)
+            if expr.operator == TokenType.BANG:
+                return bang(right)
+            if expr.operator == TokenType.MINUS:
+                self.check_number_operand(expr.operator, right)
+                return -right
+            return None
+
+        if isinstance(expr, Expr.Grouping):
+            return (yield from self.value(expr.expression))
+
+        if isinstance(expr, Expr.Assign):
+            value = yield from self.value(expr.value)
+            if expr.depth is None:
+                values = self.globals.values
+                if values[expr.slot] is MISSING:
+                    self.globals.assign(expr.name, expr.slot, value)
+                values[expr.slot] = value
+            else:
+                self.environment.assign_at(expr.depth, expr.slot, value)
+            return value
+
+        raise TypeError(f"Cannot suspend {type(expr).__name__}")
+
+    def call_target_of(self, expr):
+        """Interpreter.call_target, for a call that may suspend."""
+        callee = (yield from self.value(expr.callee)) if expr.callee.has_call else self.evaluate(expr.callee)
+        arguments = []
+        for argument in expr.arguments:
+            if argument.has_call:
+                arguments.append((yield from self.value(argument)))
+            else:
+                arguments.append(self.evaluate(argument))
+
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeError(expr, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise RuntimeError(expr, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee, arguments
+
+    def execute(self, stmt):
+        if isinstance(stmt, Stmt.Expression):
+            yield from self.value(stmt.expression)
+            return None
+
+        if isinstance(stmt, Stmt.Print):
+            return (yield from self.value(stmt.expression))
+
+        if isinstance(stmt, Stmt.Var):
+            value = yield from self.value(stmt.initializer)
+            self.environment.values[stmt.slot] = value
+            return None
+
+        if isinstance(stmt, Stmt.Return):
+            if isinstance(stmt.value, Expr.Call):
+                function, arguments = yield from self.call_target_of(stmt.value)
+                if function.__class__ is LoxFunction:
+                    return Return(None, function, arguments)
+                return Return(function.call(self, arguments))
+            return Return((yield from self.value(stmt.value)))
+
+        if isinstance(stmt, Stmt.If):
+            if stmt.condition.has_call:
+                condition = yield from self.value(stmt.condition)
+            else:
+                condition = self.evaluate(stmt.condition)
+            if not is_falsey(condition):
+                branch = stmt.then_branch
+            elif stmt.else_branch is not None:
+                branch = stmt.else_branch
+            else:
+                return None
+            if branch.has_call:
+                return (yield from self.execute(branch))
+            return self.run(branch)
+
+        if isinstance(stmt, Stmt.While):
+            condition_calls = stmt.condition.has_call
+            body_calls = stmt.body.has_call
+            result = LoopResults()
+            while True:
+                if condition_calls:
+                    condition = yield from self.value(stmt.condition)
+                else:
+                    condition = self.evaluate(stmt.condition)
+                if is_falsey(condition):
+                    return result
+                if body_calls:
+                    value = yield from self.execute(stmt.body)
+                else:
+                    value = self.run(stmt.body)
+                if value.__class__ is Return:
+                    return value
+                result.append(value)
+
+        if isinstance(stmt, Stmt.Block):
+            if stmt.size is None:
+                return (yield from self.statements(stmt.declarations))
+            previous = self.environment
+            self.environment = Environment(stmt.size, previous)
+            result = yield from self.statements(stmt.declarations)
+            self.environment = previous
+            return result
+
+        raise TypeError(f"Cannot suspend {type(stmt).__name__}")
+
+    def statements(self, statements):
+        """execute_block's loop, in the current environment."""
+        for statement in statements:
+            calls = statement.has_call
+            if calls is None:
+                calls = mark_calls(statement)
+            if calls:
+                result = yield from self.execute(statement)
+            else:
+                result = self.run(statement)
+            if result is not None:
+                if result.__class__ is Return:
+                    return result
+                self.output.line(stringify(result))
+        return None
+
+
+def remembered(result):
+    """An activation that returns ``result`` without running anything."""
+    return result
+    yield
+
+
+def mark_calls(node):
+    """Sets has_call on ``node`` and on every node inside it, and returns
+    ``node``'s. Function bodies are left to be marked when they run."""
+    if isinstance(node, list):
+        found = False
+        for item in node:
+            found = mark_calls(item) or found
+        return found
+    if isinstance(node, Expr.Call):
+        mark_calls(node.callee)
+        mark_calls(node.arguments)
+        return True
+    if isinstance(node, (Expr.Binary, Expr.Logical)):
+        found = mark_calls(node.left) | mark_calls(node.right)
+    elif isinstance(node, Expr.Unary):
+        found = mark_calls(node.right)
+    elif isinstance(node, (Expr.Grouping, Stmt.Expression, Stmt.Print)):
+        found = mark_calls(node.expression)
+    elif isinstance(node, Expr.Assign):
+        found = mark_calls(node.value)
+    elif isinstance(node, Stmt.Var):
+        found = node.initializer is not None and mark_calls(node.initializer)
+    elif isinstance(node, Stmt.Return):
+        found = node.value is not None and mark_calls(node.value)
+    elif isinstance(node, Stmt.If):
+        found = mark_calls(node.condition) | mark_calls(node.then_branch)
+        if node.else_branch is not None:
+            found = mark_calls(node.else_branch) or found
+    elif isinstance(node, Stmt.While):
+        found = mark_calls(node.condition) | mark_calls(node.body)
+    elif isinstance(node, Stmt.Block):
+        found = mark_calls(node.declarations)
+    else:
+        # Literals, variables, imports, and function declarations, whose
+        # bodies only run when called
+        return False
+    node.has_call = found
+    return found
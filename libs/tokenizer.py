@@ -1,4 +1,8 @@
+import codecs
 import enum
+import re
+import sys
+from array import array
 
 class TokenType(enum.Enum):
     LEFT_PAREN = "LEFT_PAREN"
@@ -31,6 +35,7 @@ class TokenType(enum.Enum):
     FOR = "FOR"
     FUN = "FUN"
     IF = "IF"
+    IMPORT = "IMPORT"
     NIL = "NIL"
     OR = "OR"
     PRINT = "PRINT"
@@ -42,12 +47,17 @@ class TokenType(enum.Enum):
     WHILE = "WHILE"
 
 class Token:
+    __slots__ = ("type", "lexeme", "literal", "line")
+
     def __init__(self, type, lexeme, literal, line):
         self.type = type
         self.lexeme = lexeme
         self.literal = literal
         self.line = line
 
+    def __reduce__(self):
+        return Token, (self.type, self.lexeme, self.literal, self.line)
+
     def __str__(self):
         literal_str = "null" if self.literal is None else str(self.literal)
         return f"{self.type.value} {self.lexeme} {literal_str}"
@@ -55,6 +65,70 @@ class Token:
     def __repr__(self):
         return f"Token(type={self.type}, lexeme='{self.lexeme}', literal={self.literal}, line={self.line})"
 
+token_types = list(TokenType)
+IDENTIFIER = TokenType.IDENTIFIER
+NUMBER = TokenType.NUMBER
+STRING = TokenType.STRING
+token_type_ids = {token_type: index for index, token_type in enumerate(token_types)}
+
+
+class TokenBuffer:
+    """Struct-of-arrays token storage.
+
+    Keeps one small integer per column (type id, start/end offset into the
+    source and line) instead of a ``Token`` object per token. Indexing
+    and iterating rebuild ``Token`` objects on demand; ``Parser`` iterates,
+    keeping the few it is looking at.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.lines = array("I")
+
+    def append(self, type_id, start, end, line):
+        self.types.append(type_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        return self.token_at(index if index >= 0 else index + len(self.types))
+
+    def __iter__(self):
+        # token_at, unrolled over the columns
+        source = self.source
+        intern = sys.intern
+        for type_id, start, end, line in zip(self.types, self.starts, self.ends, self.lines):
+            type = token_types[type_id]
+            lexeme = source[start:end]
+            literal = None
+            if type is IDENTIFIER:
+                lexeme = intern(lexeme)
+            elif type is NUMBER:
+                literal = float(lexeme)
+            elif type is STRING:
+                literal = intern(lexeme[1:-1])
+            yield Token(type, lexeme, literal, line)
+
+    def token_at(self, index):
+        type = token_types[self.types[index]]
+        lexeme = self.source[self.starts[index] : self.ends[index]]
+        literal = None
+        if type == TokenType.IDENTIFIER:
+            lexeme = sys.intern(lexeme)
+        elif type == TokenType.NUMBER:
+            literal = float(lexeme)
+        elif type == TokenType.STRING:
+            literal = sys.intern(lexeme[1:-1])
+        return Token(type, lexeme, literal, self.lines[index])
+
+
 class Scanner:
     keywords = {
         "and": TokenType.AND,
@@ -64,6 +138,7 @@ class Scanner:
         "for": TokenType.FOR,
         "fun": TokenType.FUN,
         "if": TokenType.IF,
+        "import": TokenType.IMPORT,
         "nil": TokenType.NIL,
         "or": TokenType.OR,
         "print": TokenType.PRINT,
@@ -158,6 +233,10 @@ class Scanner:
 
     def add_token(self, type, literal=None):
         text = self.source[self.start : self.current]
+        if type == TokenType.IDENTIFIER:
+            # Names are looked up in environments and scopes over and over;
+            # interning lets those dict probes succeed on identity.
+            text = sys.intern(text)
         self.tokens.append(Token(type, text, literal, self.line))
 
     def peek(self) -> str:
@@ -185,7 +264,7 @@ class Scanner:
             self.errors.append(f"[line {self.line}] Error: Unterminated string.")
             return
         self.advance()
-        value = self.source[self.start + 1 : self.current - 1]
+        value = sys.intern(self.source[self.start + 1 : self.current - 1])
         self.add_token(TokenType.STRING, value)
 
     def is_digit(self, char: str) -> bool:
@@ -217,3 +296,200 @@ class Scanner:
         self.errors.append(f"[line {self.line}] Error: {char}")
 
 
+
+
+class RegexScanner(Scanner):
+    """Scanner driven by a single compiled master regex.
+
+    Produces exactly the same token stream and error messages as
+    ``Scanner`` but lets ``re`` walk the source instead of calling
+    ``advance``/``peek`` once per character.
+    """
+
+    token_pattern = re.compile(
+        r"""
+        (?P<whitespace>[ \t\r]+)
+        |(?P<newline>\n)
+        |(?P<comment>//[^\n]*)
+        |(?P<string>"[^"]*")
+        |(?P<unterminated>"[^"]*)
+        |(?P<number>[0-9]+(?:\.[0-9]+)?)
+        |(?P<identifier>[A-Za-z_][A-Za-z_0-9]*)
+        |(?P<operator>!=|==|<=|>=|[(){}*.,+\-;!=<>/])
+        |(?P<error>.)
+        """,
+        re.VERBOSE | re.DOTALL,
+    )
+
+    operators = {
+        "(": TokenType.LEFT_PAREN,
+        ")": TokenType.RIGHT_PAREN,
+        "{": TokenType.LEFT_BRACE,
+        "}": TokenType.RIGHT_BRACE,
+        "*": TokenType.STAR,
+        ".": TokenType.DOT,
+        ",": TokenType.COMMA,
+        "+": TokenType.PLUS,
+        "-": TokenType.MINUS,
+        ";": TokenType.SEMICOLON,
+        "!": TokenType.BANG,
+        "!=": TokenType.BANG_EQUAL,
+        "=": TokenType.EQUAL,
+        "==": TokenType.EQUAL_EQUAL,
+        "<": TokenType.LESS,
+        "<=": TokenType.LESS_EQUAL,
+        ">": TokenType.GREATER,
+        ">=": TokenType.GREATER_EQUAL,
+        "/": TokenType.SLASH,
+    }
+
+    def scan_tokens(self) -> tuple[list[Token], list[str]]:
+        self.scan_chunk(self.source, final=True)
+        self.current = len(self.source)
+        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        return self.tokens, self.errors
+
+    def scan_buffer(self) -> tuple[TokenBuffer, list[str]]:
+        """Scans the whole source into a compact ``TokenBuffer``."""
+        buffer = TokenBuffer(self.source)
+        append = buffer.append
+        type_ids = token_type_ids
+        keywords = self.keywords
+        operators = self.operators
+        identifier_id = type_ids[TokenType.IDENTIFIER]
+        number_id = type_ids[TokenType.NUMBER]
+        string_id = type_ids[TokenType.STRING]
+        line = self.line
+
+        for match in self.token_pattern.finditer(self.source):
+            kind = match.lastgroup
+            if kind == "whitespace" or kind == "comment":
+                continue
+            start, end = match.span()
+            if kind == "identifier":
+                keyword = keywords.get(match.group())
+                append(identifier_id if keyword is None else type_ids[keyword], start, end, line)
+            elif kind == "operator":
+                append(type_ids[operators[match.group()]], start, end, line)
+            elif kind == "newline":
+                line += 1
+            elif kind == "number":
+                append(number_id, start, end, line)
+            elif kind == "string":
+                line += self.source.count("\n", start, end)
+                append(string_id, start, end, line)
+            elif kind == "unterminated":
+                line += self.source.count("\n", start, end)
+                self.errors.append(f"[line {line}] Error: Unterminated string.")
+            else:
+                self.errors.append(f"[line {line}] Error: Unexpected character: {match.group()}")
+
+        self.line = line
+        self.current = len(self.source)
+        append(type_ids[TokenType.EOF], len(self.source), len(self.source), line)
+        return buffer, self.errors
+
+    def iter_tokens(self):
+        """Yields tokens lazily, scanning the source one chunk at a time.
+
+        A token is only emitted once enough text follows it to be sure it
+        cannot grow, so strings, comments and numbers may span chunks.
+        """
+        pending = ""
+        for chunk in self.read_chunks():
+            pending += chunk
+            stop = self.scan_chunk(pending, final=False)
+            pending = pending[stop:]
+            yield from self.tokens
+            self.tokens.clear()
+        self.scan_chunk(pending, final=True)
+        yield from self.tokens
+        self.tokens.clear()
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def read_chunks(self):
+        yield self.source
+
+    def scan_chunk(self, text, final):
+        """Scans ``text`` into ``self.tokens`` and returns where scanning stopped.
+
+        Unless ``final`` is set, scanning stops before any match ending within
+        two characters of the end of ``text`` (the longest lookahead a Lox token
+        needs), leaving it to be rescanned together with the next chunk.
+        """
+        append = self.tokens.append
+        keywords = self.keywords
+        operators = self.operators
+        identifier_type = TokenType.IDENTIFIER
+        intern = sys.intern
+        limit = len(text) if final else len(text) - 2
+        line = self.line
+
+        for match in self.token_pattern.finditer(text):
+            if match.end() > limit:
+                self.line = line
+                return match.start()
+            kind = match.lastgroup
+            if kind == "whitespace" or kind == "comment":
+                continue
+            lexeme = match.group()
+            if kind == "identifier":
+                keyword = keywords.get(lexeme)
+                if keyword is None:
+                    append(Token(identifier_type, intern(lexeme), None, line))
+                else:
+                    append(Token(keyword, lexeme, None, line))
+            elif kind == "operator":
+                append(Token(operators[lexeme], lexeme, None, line))
+            elif kind == "newline":
+                line += 1
+            elif kind == "number":
+                append(Token(TokenType.NUMBER, lexeme, float(lexeme), line))
+            elif kind == "string":
+                line += lexeme.count("\n")
+                append(Token(TokenType.STRING, lexeme, intern(lexeme[1:-1]), line))
+            elif kind == "unterminated":
+                line += lexeme.count("\n")
+                self.errors.append(f"[line {line}] Error: Unterminated string.")
+            else:
+                self.errors.append(f"[line {line}] Error: Unexpected character: {lexeme}")
+
+        self.line = line
+        return len(text)
+
+
+class StreamScanner(RegexScanner):
+    """Tokenizes a file object or memory-mapped file in fixed-size chunks.
+
+    ``stream`` only needs a ``read(size)`` method; byte streams (binary
+    files, ``mmap``) are decoded incrementally as UTF-8.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self, stream, chunk_size=None):
+        super().__init__("")
+        self.stream = stream
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    def read_chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                break
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk)
+            yield chunk
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def scan_tokens(self) -> tuple[list[Token], list[str]]:
+        return list(self.iter_tokens()), self.errors
+
+scanners = {
+    "classic": Scanner,
+    "regex": RegexScanner,
+}
@@ -0,0 +1,653 @@
+import ast
+import marshal
+import operator
+from types import FunctionType
+
+from .tokenizer import Token, TokenType
+from .parser import Expr, Stmt
+from .enviornment import MISSING
+from .interpreter import Interpreter, RuntimeError
+from .fun_impl.jplox_callable import LoxCallable
+from .values import NUMBER_CLASSES, NIL, lox_string, is_falsey, is_equal, stringify
+
+# Translates each module into one Python function, __lox_module__, whose
+# body is the module's top level. Lox functions become nested Python
+# functions taking their parameters positionally, so a function's arity is
+# its code object's co_argcount. Lox locals become Python locals with a
+# unique name each, since Lox blocks nest scopes and Python functions
+# don't. A local that some nested function captures lives in a one-element
+# list, its cell, which nested functions receive as a keyword-only default:
+# the cell is bound when the ``def`` runs, so a closure made in a loop
+# keeps the cell of its own iteration, as in Lox. Globals index the
+# module's GlobalEnvironment values, G.
+
+COMPARISONS = {
+    TokenType.LESS: (ast.Lt, "lt"),
+    TokenType.LESS_EQUAL: (ast.LtE, "le"),
+    TokenType.GREATER: (ast.Gt, "gt"),
+    TokenType.GREATER_EQUAL: (ast.GtE, "ge"),
+}
+
+ARITHMETIC = {
+    TokenType.MINUS: (ast.Sub, "sub"),
+    TokenType.STAR: (ast.Mult, "mul"),
+    TokenType.SLASH: (ast.Div, "truediv"),
+}
+
+# A read in a variable's own initializer, which sees nil
+SELF_INIT = object()
+
+
+def number_op(function, a, b):
+    # Interpreter.check_number_operands, which also accepts the ints ! returns
+    if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+        return function(float(a), float(b))
+    raise RuntimeError(None, "Operands must be numbers.")
+
+
+def add(a, b):
+    if a.__class__ is str and b.__class__ is str:
+        return lox_string(a + b)
+    raise RuntimeError(None, "Operands must be two numbers or two strings.")
+
+
+def negate(value):
+    raise RuntimeError(None, "Operand must be a number.")
+
+
+def name(identifier):
+    return ast.Name(identifier, ast.Load())
+
+
+def store(identifier):
+    return ast.Name(identifier, ast.Store())
+
+
+def const(value):
+    return ast.Constant(value)
+
+
+def call(function, *arguments):
+    return ast.Call(name(function), list(arguments), [])
+
+
+def method(target, method_name, *arguments):
+    return ast.Call(ast.Attribute(name(target), method_name, ast.Load()), list(arguments), [])
+
+
+def walrus(identifier, value):
+    return ast.NamedExpr(store(identifier), value)
+
+
+def item(target, index):
+    return ast.Subscript(name(target), const(index), ast.Load())
+
+
+def store_item(target, index):
+    return ast.Subscript(name(target), const(index), ast.Store())
+
+
+def compare(left, op, right):
+    return ast.Compare(left, [op()], [right])
+
+
+def class_of(value):
+    return ast.Attribute(value, "__class__", ast.Load())
+
+
+class Binding:
+    """One local declaration: a parameter, variable or function name."""
+
+    __slots__ = ("name", "function", "captured", "ready")
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+        self.captured = False
+        # False while the variable's initializer is running
+        self.ready = True
+
+
+class FunctionInfo:
+    def __init__(self, enclosing):
+        self.enclosing = enclosing
+        # Captured bindings of enclosing functions that this function, or
+        # one nested in it, uses; in first-use order
+        self.free = {}
+
+
+class Analyzer(Expr.Visitor, Stmt.Visitor):
+    """Finds the declaration each local reference means, and which locals
+    a nested function captures. The resolver has already reported every
+    error; globals are left to the slots it assigned."""
+
+    def __init__(self):
+        self.scopes = []
+        self.function = FunctionInfo(None)
+        self.count = 0
+        # Variable or Assign -> Binding (or SELF_INIT)
+        self.references = {}
+        # Var, Function or parameter Token -> Binding
+        self.declarations = {}
+        # Function -> FunctionInfo
+        self.functions = {}
+
+    def analyze(self, statements):
+        for statement in statements:
+            statement.accept(self)
+        return self
+
+    def declare(self, key, token):
+        self.count += 1
+        binding = Binding(f"{token.lexeme}_{self.count}", self.function)
+        self.scopes[-1][token.lexeme] = binding
+        self.declarations[key] = binding
+        return binding
+
+    def reference(self, expr):
+        if expr.depth is None:
+            return
+        for scope in reversed(self.scopes):
+            binding = scope.get(expr.name.lexeme)
+            if binding is not None:
+                break
+        else:
+            return
+        if not binding.ready:
+            self.references[expr] = SELF_INIT
+            return
+        self.references[expr] = binding
+        function = self.function
+        if binding.function is not function:
+            binding.captured = True
+            while function is not binding.function:
+                function.free[binding] = None
+                function = function.enclosing
+
+    def visit_block_stmt(self, stmt):
+        self.scopes.append({})
+        for statement in stmt.declarations:
+            statement.accept(self)
+        self.scopes.pop()
+
+    def visit_var_stmt(self, stmt):
+        binding = None
+        if self.scopes:
+            binding = self.declare(stmt, stmt.name)
+            binding.ready = False
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        if binding is not None:
+            binding.ready = True
+
+    def visit_function_stmt(self, stmt):
+        if self.scopes:
+            self.declare(stmt, stmt.name)
+        enclosing = self.function
+        self.function = self.functions[stmt] = FunctionInfo(enclosing)
+        self.scopes.append({})
+        for param in stmt.params:
+            self.declare(param, param)
+        for statement in stmt.body:
+            statement.accept(self)
+        self.scopes.pop()
+        self.function = enclosing
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visit_import_stmt(self, stmt):
+        pass
+
+    def visit_variable_expr(self, expr):
+        self.reference(expr)
+
+    def visit_assign_expr(self, expr):
+        expr.value.accept(self)
+        self.reference(expr)
+
+    def visit_binary_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_logical_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_unary_expr(self, expr):
+        expr.right.accept(self)
+
+    def visit_grouping_expr(self, expr):
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        pass
+
+    def visit_call_expr(self, expr):
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+
+# How a statement's result is used, mirroring the tree walker: dropped at
+# the top level, printed unless None inside a block, or collected into a
+# while loop's result list
+DISCARD = "discard"
+PRINT = "print"
+
+
+class Transpiler(Expr.Visitor):
+    """Builds the Python ast.Module for one resolved module."""
+
+    def __init__(self, analysis):
+        self.analysis = analysis
+        self.temps = 0
+
+    def transpile(self, statements, imports):
+        # Import statement -> its index in the IMPORTS list of the namespace
+        self.imports = {statement: index for index, statement in enumerate(imports)}
+        body = []
+        for statement in statements:
+            body.extend(self.statement(statement, DISCARD))
+        module = ast.Module([self.function_def("__lox_module__", [], [], body)], [])
+        return ast.fix_missing_locations(module)
+
+    def temp(self):
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def function_def(self, function_name, params, keywords, body):
+        arguments = ast.arguments(
+            posonlyargs=[], args=[ast.arg(param) for param in params], vararg=None,
+            kwonlyargs=[ast.arg(keyword) for keyword in keywords],
+            kw_defaults=[name(keyword) for keyword in keywords], kwarg=None, defaults=[])
+        fields = dict(name=function_name, args=arguments, body=body or [ast.Pass()],
+                      decorator_list=[], returns=None)
+        if "type_params" in ast.FunctionDef._fields:
+            fields["type_params"] = []
+        return ast.FunctionDef(**fields)
+
+    # Statements. Each returns a list of Python statements.
+
+    def statement(self, stmt, mode):
+        """``mode`` is DISCARD, PRINT or the name of a result list."""
+        if isinstance(stmt, Stmt.Print):
+            return self.use_result(self.expression(stmt.expression), mode)
+        if isinstance(stmt, Stmt.If):
+            return self.if_statement(stmt, mode)
+        if isinstance(stmt, Stmt.While):
+            return self.while_statement(stmt, mode)
+
+        # The rest always produce None
+        if isinstance(stmt, Stmt.Expression):
+            body = self.expression_statement(stmt.expression)
+        elif isinstance(stmt, Stmt.Var):
+            body = self.var_statement(stmt)
+        elif isinstance(stmt, Stmt.Function):
+            body = self.function_statement(stmt)
+        elif isinstance(stmt, Stmt.Block):
+            body = []
+            for statement in stmt.declarations:
+                body.extend(self.statement(statement, PRINT))
+        elif isinstance(stmt, Stmt.Return):
+            value = const(None) if stmt.value is None else self.expression(stmt.value)
+            return [ast.Return(value)]
+        elif isinstance(stmt, Stmt.Import):
+            body = [ast.Expr(call("lox_import", const(self.imports[stmt])))]
+        else:
+            raise TypeError(f"Cannot transpile {type(stmt).__name__}")
+
+        if mode not in (DISCARD, PRINT):
+            body.append(ast.Expr(method(mode, "append", const(None))))
+        return body
+
+    def use_result(self, value, mode):
+        if mode == DISCARD:
+            return [ast.Expr(value)]
+        if mode == PRINT:
+            result = self.temp()
+            return [ast.If(compare(walrus(result, value), ast.IsNot, const(None)),
+                           [ast.Expr(call("write_line", call("stringify", name(result))))], [])]
+        return [ast.Expr(method(mode, "append", value))]
+
+    def expression_statement(self, expr):
+        if isinstance(expr, Expr.Assign):
+            binding = self.analysis.references.get(expr)
+            if binding is not None:
+                value = self.expression(expr.value)
+                if binding.captured:
+                    return [ast.Assign([store_item(binding.name, 0)], value)]
+                return [ast.Assign([store(binding.name)], value)]
+        return [ast.Expr(self.expression(expr))]
+
+    def var_statement(self, stmt):
+        value = const(None) if stmt.initializer is None else self.expression(stmt.initializer)
+        binding = self.analysis.declarations.get(stmt)
+        if binding is None:
+            return [ast.Assign([store_item("G", stmt.slot)], value)]
+        if binding.captured:
+            value = ast.List([value], ast.Load())
+        return [ast.Assign([store(binding.name)], value)]
+
+    def function_statement(self, stmt):
+        analysis = self.analysis
+        info = analysis.functions[stmt]
+        params = [analysis.declarations[param] for param in stmt.params]
+        body = []
+        for param in params:
+            if param.captured:
+                body.append(ast.Assign([store(param.name)], ast.List([name(param.name)], ast.Load())))
+        for statement in stmt.body:
+            body.extend(self.statement(statement, PRINT))
+
+        binding = analysis.declarations.get(stmt)
+        if binding is None:
+            self.temps += 1
+            function_name = f"{stmt.name.lexeme}_g{self.temps}"
+        elif binding.captured:
+            function_name = binding.name + "_fn"
+        else:
+            function_name = binding.name
+        definition = self.function_def(
+            function_name, [param.name for param in params],
+            [free.name for free in info.free], body)
+
+        if binding is None:
+            return [definition, ast.Assign([store_item("G", stmt.slot)], name(function_name))]
+        if binding.captured:
+            # The cell exists first, so the function can capture itself
+            return [ast.Assign([store(binding.name)], ast.List([const(None)], ast.Load())),
+                    definition,
+                    ast.Assign([store_item(binding.name, 0)], name(function_name))]
+        return [definition]
+
+    def if_statement(self, stmt, mode):
+        body = self.statement(stmt.then_branch, mode)
+        if stmt.else_branch is not None:
+            orelse = self.statement(stmt.else_branch, mode)
+        elif mode not in (DISCARD, PRINT):
+            orelse = [ast.Expr(method(mode, "append", const(None)))]
+        else:
+            orelse = []
+        return [ast.If(self.test(stmt.condition), body or [ast.Pass()], orelse)]
+
+    def while_statement(self, stmt, mode):
+        test = self.test(stmt.condition)
+        if mode == DISCARD:
+            return [ast.While(test, self.statement(stmt.body, DISCARD) or [ast.Pass()], [])]
+
+        if isinstance(stmt.body, (Stmt.Block, Stmt.Expression)):
+            # Every iteration's result is None; count them instead
+            counter = self.temp()
+            body = self.statement(stmt.body, DISCARD)
+            body.append(ast.AugAssign(store(counter), ast.Add(), const(1)))
+            loop = [ast.Assign([store(counter)], const(0)), ast.While(test, body, [])]
+            result = ast.BinOp(ast.List([const(None)], ast.Load()), ast.Mult(), name(counter))
+        else:
+            results = self.temp()
+            loop = [ast.Assign([store(results)], ast.List([], ast.Load())),
+                    ast.While(test, self.statement(stmt.body, results) or [ast.Pass()], [])]
+            result = name(results)
+
+        if mode == PRINT:
+            # A list is never None
+            return loop + [ast.Expr(call("write_line", call("stringify", result)))]
+        return loop + [ast.Expr(method(mode, "append", result))]
+
+    # Expressions
+
+    def expression(self, expr):
+        return expr.accept(self)
+
+    def truthy(self, value):
+        """A Python bool: ``not values.is_falsey(value)``."""
+        temp = self.temp()
+        return ast.BoolOp(ast.And(), [
+            compare(walrus(temp, value), ast.IsNot, const(False)),
+            compare(name(temp), ast.IsNot, const(None)),
+            compare(name(temp), ast.IsNot, name("NIL")),
+            ast.BoolOp(ast.Or(), [
+                compare(class_of(name(temp)), ast.IsNot, name("int")),
+                compare(name(temp), ast.NotEq, const(0)),
+            ]),
+        ])
+
+    def test(self, expr):
+        """Compiles ``expr`` as a condition, straight to a Python bool."""
+        if isinstance(expr, Expr.Grouping):
+            return self.test(expr.expression)
+        if isinstance(expr, Expr.Literal):
+            return const(not is_falsey(expr.value))
+        if isinstance(expr, Expr.Binary):
+            if expr.operator in COMPARISONS:
+                return self.comparison(expr)
+            if expr.operator == TokenType.EQUAL_EQUAL:
+                return self.equality(expr)
+            if expr.operator == TokenType.BANG_EQUAL:
+                return ast.UnaryOp(ast.Not(), self.equality(expr))
+        if isinstance(expr, Expr.Logical):
+            op = ast.Or() if expr.operator == TokenType.OR else ast.And()
+            return ast.BoolOp(op, [self.test(expr.left), self.test(expr.right)])
+        if isinstance(expr, Expr.Unary) and expr.operator == TokenType.BANG:
+            # values.bang is 0 for None and for 0, and nonzero otherwise
+            temp = self.temp()
+            return ast.BoolOp(ast.And(), [
+                compare(walrus(temp, self.expression(expr.right)), ast.IsNot, const(None)),
+                ast.BoolOp(ast.Or(), [
+                    compare(class_of(name(temp)), ast.IsNot, name("int")),
+                    compare(name(temp), ast.NotEq, const(0)),
+                ]),
+            ])
+        return self.truthy(self.expression(expr))
+
+    def both_floats(self, expr):
+        """Evaluates both operands into temporaries; tests they are floats."""
+        a = self.temp()
+        b = self.temp()
+        left = class_of(walrus(a, self.expression(expr.left)))
+        right = class_of(walrus(b, self.expression(expr.right)))
+        return a, b, ast.Compare(left, [ast.Is(), ast.Is()], [right, name("float")])
+
+    def comparison(self, expr):
+        op, function = COMPARISONS[expr.operator]
+        a, b, floats = self.both_floats(expr)
+        return ast.IfExp(floats, compare(name(a), op, name(b)),
+                         call("number_op", name(function), name(a), name(b)))
+
+    def equality(self, expr):
+        # Values of one class compare as Python does; mixed ones, which
+        # include None and bools beside numbers, go through is_equal
+        a = self.temp()
+        b = self.temp()
+        same_class = compare(class_of(walrus(a, self.expression(expr.left))), ast.Is,
+                             class_of(walrus(b, self.expression(expr.right))))
+        return ast.IfExp(same_class, compare(name(a), ast.Eq, name(b)),
+                         call("is_equal", name(a), name(b)))
+
+    def visit_binary_expr(self, expr):
+        operator_type = expr.operator
+        if operator_type in COMPARISONS or operator_type in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            return self.test(expr)
+        if operator_type == TokenType.PLUS:
+            a, b, floats = self.both_floats(expr)
+            return ast.IfExp(floats, ast.BinOp(name(a), ast.Add(), name(b)),
+                             call("add", name(a), name(b)))
+        if operator_type in ARITHMETIC:
+            op, function = ARITHMETIC[operator_type]
+            a, b, floats = self.both_floats(expr)
+            return ast.IfExp(floats, ast.BinOp(name(a), op(), name(b)),
+                             call("number_op", name(function), name(a), name(b)))
+        # Unknown operators evaluate both sides to None, like the tree walker
+        operands = ast.Tuple([self.expression(expr.left), self.expression(expr.right), const(None)], ast.Load())
+        return ast.Subscript(operands, const(2), ast.Load())
+
+    def visit_logical_expr(self, expr):
+        temp = self.temp()
+        test = self.truthy(walrus(temp, self.expression(expr.left)))
+        right = self.expression(expr.right)
+        if expr.operator == TokenType.OR:
+            return ast.IfExp(test, name(temp), right)
+        return ast.IfExp(test, right, name(temp))
+
+    def visit_unary_expr(self, expr):
+        temp = self.temp()
+        value = walrus(temp, self.expression(expr.right))
+        if expr.operator == TokenType.BANG:
+            # values.bang
+            is_int = compare(class_of(name(temp)), ast.Is, name("int"))
+            return ast.IfExp(compare(value, ast.Is, const(None)), const(0),
+                             ast.IfExp(is_int, name(temp), const(1)))
+        if expr.operator == TokenType.MINUS:
+            is_float = compare(class_of(value), ast.Is, name("float"))
+            return ast.IfExp(is_float, ast.UnaryOp(ast.USub(), name(temp)), call("negate", name(temp)))
+        return ast.Subscript(ast.Tuple([value, const(None)], ast.Load()), const(1), ast.Load())
+
+    def visit_grouping_expr(self, expr):
+        return self.expression(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        if expr.value is NIL:
+            # Code objects are marshalled, which only takes built-in types
+            return name("NIL")
+        return const(expr.value)
+
+    def visit_variable_expr(self, expr):
+        if expr.depth is None:
+            temp = self.temp()
+            found = compare(walrus(temp, item("G", expr.slot)), ast.IsNot, name("MISSING"))
+            return ast.IfExp(found, name(temp), call("global_get", const(expr.slot),
+                                                     const(expr.name.lexeme), const(expr.name.line)))
+        binding = self.analysis.references[expr]
+        if binding is SELF_INIT:
+            return const(None)
+        if binding.captured:
+            return item(binding.name, 0)
+        return name(binding.name)
+
+    def visit_assign_expr(self, expr):
+        value = self.expression(expr.value)
+        if expr.depth is None:
+            return call("assign_global", const(expr.slot), value,
+                        const(expr.name.lexeme), const(expr.name.line))
+        binding = self.analysis.references[expr]
+        if binding.captured:
+            temp = self.temp()
+            stored = method(binding.name, "__setitem__", const(0), walrus(temp, value))
+            return ast.Subscript(ast.Tuple([stored, name(temp)], ast.Load()), const(1), ast.Load())
+        return walrus(binding.name, value)
+
+    def visit_call_expr(self, expr):
+        temp = self.temp()
+        callee = walrus(temp, self.expression(expr.callee))
+        arguments = [self.expression(argument) for argument in expr.arguments]
+        # Transpiled functions are plain Python functions of the right arity
+        is_function = compare(class_of(callee), ast.Is, name("FunctionType"))
+        argcount = ast.Attribute(ast.Attribute(name(temp), "__code__", ast.Load()), "co_argcount", ast.Load())
+        fast = ast.BoolOp(ast.And(), [is_function, compare(argcount, ast.Eq, const(len(arguments)))])
+        return ast.IfExp(fast, ast.Call(name(temp), arguments, []),
+                         call("call", name(temp), ast.List(list(arguments), ast.Load())))
+
+
+def transpile(module):
+    """Returns the code object defining ``module``'s __lox_module__."""
+    imports = [statement for statement, _ in module.imports()]
+    tree = Transpiler(Analyzer().analyze(module.statements)).transpile(module.statements, imports)
+    return compile(tree, module.path, "exec")
+
+
+class PythonInterpreter(Interpreter):
+    """Runs each module as Python code transpiled from its AST.
+
+    Code objects are kept in the AST cache, marshalled, next to the module's
+    own entry, so later runs skip transpiling and compiling too. Modules
+    Python cannot compile, such as ones nesting loops too deeply, run on the
+    tree walker instead.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Set by the module loader when the AST cache is enabled
+        self.cache = None
+        self.cache_variant = ""
+
+    def code_for(self, module):
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(module.path, f"python{self.cache_variant}")
+            data = self.cache.load(key)
+            if data is not None:
+                try:
+                    return marshal.loads(data)
+                except (EOFError, ValueError, TypeError):
+                    pass
+
+        code = transpile(module)
+        if key is not None:
+            self.cache.store(key, marshal.dumps(code))
+        return code
+
+    def execute_module(self, module):
+        try:
+            code = self.code_for(module)
+        except (SyntaxError, RecursionError, MemoryError):
+            return super().execute_module(module)
+
+        module.globals = self.new_globals(module.global_slots)
+        namespace = self.namespace(module)
+        exec(code, namespace)
+        namespace["__lox_module__"]()
+
+    def namespace(self, module):
+        globals = module.globals
+        imports = [statement for statement, _ in module.imports()]
+
+        def global_get(slot, lexeme, line):
+            return globals.get(Token(TokenType.IDENTIFIER, lexeme, None, line), slot)
+
+        def assign_global(slot, value, lexeme, line):
+            if globals.values[slot] is MISSING:
+                globals.assign(Token(TokenType.IDENTIFIER, lexeme, None, line), slot, value)
+            globals.values[slot] = value
+            return value
+
+        def lox_import(index):
+            self.import_module(imports[index], globals)
+
+        return {
+            "G": globals.values, "MISSING": MISSING, "FunctionType": FunctionType,
+            "NIL": NIL, "number_op": number_op, "add": add, "negate": negate,
+            "is_equal": is_equal, "stringify": stringify, "write_line": self.output.line,
+            "lt": operator.lt, "le": operator.le, "gt": operator.gt, "ge": operator.ge,
+            "sub": operator.sub, "mul": operator.mul, "truediv": operator.truediv,
+            "call": self.call_value, "global_get": global_get,
+            "assign_global": assign_global, "lox_import": lox_import,
+        }
+
+    def call_value(self, callee, arguments):
+        if isinstance(callee, FunctionType):
+            arity = callee.__code__.co_argcount
+            if len(arguments) != arity:
+                raise RuntimeError(None, f"Expected {arity} arguments but got {len(arguments)}.")
+            return callee(*arguments)
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeError(None, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise RuntimeError(None, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee.call(self, arguments)
@@ -0,0 +1,149 @@
+"""Runtime representation of Lox values, shared by every engine.
+
+numbers     float
+strings     str, never one spelling true, false or nil: those strings have
+            always been the boolean and nil values themselves
+booleans    True and False
+nil         NIL. None is not nil: it is "no value", what an uninitialized
+            variable or a function that returns nothing holds, and it is
+            never printed by a block
+! results   the ints 1 and 0. They print as True and False and, unlike
+            booleans, pass as numbers, as the Python bools they used to be
+
+While statements evaluate to a LoopResults, which prints as the list of
+their iterations' results.
+
+Values only become text when printed, through ``stringify``.
+"""
+
+
+class Nil:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "'nil'"
+
+    def __str__(self):
+        return "nil"
+
+    def __reduce__(self):
+        # Unpickles as the one NIL
+        return "NIL"
+
+
+NIL = Nil()
+
+
+class LoopResults:
+    """The result of each iteration of a while loop, in order.
+
+    A run of iterations that gave the same object is stored once with its
+    length. Loop bodies are nearly always blocks or expression statements,
+    which give None, so most loops keep a single run however long they go.
+    """
+
+    __slots__ = ("runs",)
+
+    def __init__(self):
+        # [value, count] pairs
+        self.runs = []
+
+    def append(self, value, count=1):
+        runs = self.runs
+        if runs and runs[-1][0] is value:
+            runs[-1][1] += count
+        else:
+            runs.append([value, count])
+
+# Strings that are not strings to Lox
+CANONICAL = {"true": True, "false": False, "nil": NIL}
+
+# Classes that pass Interpreter.check_number_operands; bool subclasses int
+# but is not one of them
+NUMBER_CLASSES = (float, int)
+
+
+def lox_string(value):
+    """Returns the Lox value for the Python string ``value``."""
+    return CANONICAL.get(value, value) if len(value) <= 5 else value
+
+
+def is_falsey(value):
+    return (value is False or value is None or value is NIL
+            or (value.__class__ is int and value == 0))
+
+
+def bang(value):
+    """What ``!value`` evaluates to."""
+    if value is None:
+        return 0
+    if value.__class__ is int:
+        return value
+    return 1
+
+
+def is_equal(a, b):
+    if a is None:
+        return b is None
+    if (a.__class__ is bool) is not (b.__class__ is bool):
+        return False
+    return a == b
+
+
+# How many floats number_text remembers the text of before starting over
+NUMBER_TEXT_SIZE = 4096
+
+# Float -> its printed text
+number_texts = {}
+
+
+def number_text(value):
+    """The float ``value`` as Lox prints it.
+
+    That is its repr, which takes several times as long to work out as a
+    dict lookup, so the text of recent numbers is kept.
+    """
+    text = number_texts.get(value)
+    if text is None:
+        text = repr(value)
+        # 0.0 and -0.0 are equal keys but print differently, and nan is
+        # never found again
+        if value and value == value:
+            if len(number_texts) >= NUMBER_TEXT_SIZE:
+                number_texts.clear()
+            number_texts[value] = text
+    return text
+
+
+def stringify(value):
+    if value.__class__ is str:
+        return value
+    if value.__class__ is float:
+        return number_text(value)
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value.__class__ is int:
+        return "True" if value else "False"
+    if value.__class__ is LoopResults:
+        return "[" + ", ".join(repeat(represent(item), count) for item, count in value.runs) + "]"
+    if value.__class__ is list:
+        return "[" + ", ".join(map(represent, value)) + "]"
+    return str(value)
+
+
+def repeat(text, count):
+    """``count`` copies of ``text`` separated by commas."""
+    return (text + ", ") * (count - 1) + text
+
+
+def represent(value):
+    """How ``value`` appears inside a printed list of loop results."""
+    if value is True:
+        return "'true'"
+    if value is False:
+        return "'false'"
+    if value.__class__ in (int, list, LoopResults):
+        return stringify(value)
+    return repr(value)
@@ -0,0 +1,403 @@
+from .tokenizer import Token, TokenType
+from .enviornment import MISSING
+from .interpreter import Interpreter, RuntimeError
+from .fun_impl.jplox_callable import LoxCallable
+from .values import NUMBER_CLASSES, NIL as NIL_VALUE, LoopResults, lox_string, is_falsey, bang, is_equal, stringify
+from .bytecode import (
+    Compiler, CONSTANT, NIL, POP, POPN, GET_LOCAL, SET_LOCAL, GET_UPVALUE,
+    SET_UPVALUE, GET_GLOBAL, SET_GLOBAL, DEFINE_GLOBAL, ADD, SUBTRACT,
+    MULTIPLY, DIVIDE, NEGATE, NOT, EQUAL, NOT_EQUAL, LESS, LESS_EQUAL, GREATER,
+    GREATER_EQUAL, JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, POP_JUMP_IF_FALSE, CALL,
+    CLOSURE, CLOSE_UPVALUE, RETURN, PRINT_RESULT, NEW_LIST, LIST_APPEND, IMPORT,
+    STORE_LOCAL, JUMP_UNLESS_LESS, JUMP_UNLESS_LESS_EQUAL, JUMP_UNLESS_GREATER,
+    JUMP_UNLESS_GREATER_EQUAL, TAIL_CALL, STORE_GLOBAL, ADD_CONSTANT,
+    SUBTRACT_CONSTANT, APPEND_NIL, MULTIPLY_CONSTANT, DIVIDE_CONSTANT,
+)
+
+# Lox calls no longer nest Python frames, so this is what stops runaway
+# recursion
+FRAMES_MAX = 100000
+
+
+class Upvalue:
+    """A variable captured by a closure.
+
+    While the variable is still on the VM stack, ``cell`` is the stack
+    itself and ``index`` its position there; once its scope ends, the value
+    moves into a cell of its own.
+    """
+
+    __slots__ = ("cell", "index")
+
+    def __init__(self, cell, index):
+        self.cell = cell
+        self.index = index
+
+    def close(self):
+        self.cell = [self.cell[self.index]]
+        self.index = 0
+
+
+class Closure(LoxCallable):
+    """A compiled function together with its captured variables."""
+
+    def __init__(self, function, globals, upvalues):
+        self.function = function
+        # Global namespace of the module the function was defined in
+        self.globals = globals
+        self.upvalues = upvalues
+
+    def arity(self):
+        return self.function.arity
+
+    def call(self, interpreter, arguments):
+        return interpreter.call_closure(self, arguments)
+
+    def to_string(self):
+        return f"<fn {self.function.name}>"
+
+
+def number_operands(a, b):
+    # Interpreter.check_number_operands, which also accepts the ints ! returns
+    if a.__class__ in NUMBER_CLASSES and b.__class__ in NUMBER_CLASSES:
+        return float(a), float(b)
+    raise RuntimeError(None, "Operands must be numbers.")
+
+
+def add(a, b):
+    if a.__class__ is str and b.__class__ is str:
+        return lox_string(a + b)
+    raise RuntimeError(None, "Operands must be two numbers or two strings.")
+
+
+class VirtualMachine(Interpreter):
+    """Compiles each module to bytecode and runs it on a value stack.
+
+    Locals live on the stack, so a Lox call pushes a frame record instead of
+    recursing in Python. A function's variables that closures capture stay
+    on the stack until their scope ends and are then moved into their
+    Upvalue.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        # (closure, return address, base) of every suspended caller
+        self.frames = []
+        # Stack index -> Upvalue for captured variables still on the stack
+        self.open_upvalues = {}
+
+    def compile(self, module):
+        return Compiler(module.lines).compile(module.statements)
+
+    def execute_module(self, module):
+        module.globals = self.new_globals(module.global_slots)
+        self.call_closure(Closure(self.compile(module), module.globals, []), [])
+
+    def call_closure(self, closure, arguments):
+        stack = self.stack
+        base = len(stack)
+        stack.append(closure)
+        stack.extend(arguments)
+        return self.run(closure, base)
+
+    def capture_upvalue(self, index):
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.open_upvalues[index] = Upvalue(self.stack, index)
+        return upvalue
+
+    def close_upvalues(self, start):
+        open_upvalues = self.open_upvalues
+        for index in [index for index in open_upvalues if index >= start]:
+            open_upvalues.pop(index).close()
+
+    def global_name(self, closure, slot, ip):
+        """The Token the tree walker would report an undefined global with."""
+        name = next(name for name, index in closure.globals.slots.items() if index == slot)
+        line = closure.function.chunk.lines[ip - 1]
+        return Token(TokenType.IDENTIFIER, name, None, line)
+
+    def run(self, closure, base):
+        """Executes ``closure``, whose frame starts at ``base``, until it returns."""
+        stack = self.stack
+        frames = self.frames
+        open_upvalues = self.open_upvalues
+        push = stack.append
+        pop = stack.pop
+        entry = len(frames)
+
+        chunk = closure.function.chunk
+        code = chunk.code
+        args = chunk.args
+        constants = chunk.constants
+        global_values = closure.globals.values
+        upvalues = closure.upvalues
+        ip = 0
+
+        while True:
+            op = code[ip]
+            arg = args[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                push(stack[base + arg])
+            elif op == CONSTANT:
+                push(constants[arg])
+            elif op == ADD:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is float and b.__class__ is float:
+                    stack[-1] = a + b
+                else:
+                    stack[-1] = add(a, b)
+            elif op == STORE_LOCAL:
+                stack[base + arg] = pop()
+            elif op == JUMP_UNLESS_LESS:
+                b = pop()
+                a = pop()
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                if not a < b:
+                    ip = arg
+            elif op == ADD_CONSTANT:
+                a = stack[-1]
+                b = constants[arg]
+                if a.__class__ is float and b.__class__ is float:
+                    stack[-1] = a + b
+                else:
+                    stack[-1] = add(a, b)
+            elif op == GET_GLOBAL:
+                value = global_values[arg]
+                if value is MISSING:
+                    closure.globals.get(self.global_name(closure, arg, ip), arg)
+                push(value)
+            elif op == JUMP:
+                ip = arg
+            elif op == RETURN:
+                result = pop()
+                if open_upvalues:
+                    self.close_upvalues(base)
+                del stack[base:]
+                if len(frames) == entry:
+                    return result
+                push(result)
+                closure, ip, base = frames.pop()
+                chunk = closure.function.chunk
+                code = chunk.code
+                args = chunk.args
+                constants = chunk.constants
+                global_values = closure.globals.values
+                upvalues = closure.upvalues
+            elif op == CALL:
+                callee = stack[-1 - arg]
+                if callee.__class__ is Closure:
+                    function = callee.function
+                    if arg != function.arity:
+                        raise RuntimeError(None, f"Expected {function.arity} arguments but got {arg}.")
+                    if len(frames) >= FRAMES_MAX:
+                        raise RuntimeError(None, "Stack overflow.")
+                    frames.append((closure, ip, base))
+                    closure = callee
+                    chunk = function.chunk
+                    code = chunk.code
+                    args = chunk.args
+                    constants = chunk.constants
+                    global_values = closure.globals.values
+                    upvalues = closure.upvalues
+                    base = len(stack) - arg - 1
+                    ip = 0
+                elif isinstance(callee, LoxCallable):
+                    if arg != callee.arity():
+                        raise RuntimeError(None, f"Expected {callee.arity()} arguments but got {arg}.")
+                    start = len(stack) - arg
+                    arguments = stack[start:]
+                    del stack[start - 1:]
+                    push(callee.call(self, arguments))
+                else:
+                    raise RuntimeError(None, "Can only call functions and classes.")
+            elif op == TAIL_CALL:
+                callee = stack[-1 - arg]
+                if callee.__class__ is Closure:
+                    function = callee.function
+                    if arg != function.arity:
+                        raise RuntimeError(None, f"Expected {function.arity} arguments but got {arg}.")
+                    # The callee takes over this frame, so its return goes
+                    # straight to our caller
+                    if open_upvalues:
+                        self.close_upvalues(base)
+                    stack[base:] = stack[-1 - arg:]
+                    closure = callee
+                    chunk = function.chunk
+                    code = chunk.code
+                    args = chunk.args
+                    constants = chunk.constants
+                    global_values = closure.globals.values
+                    upvalues = closure.upvalues
+                    ip = 0
+                elif isinstance(callee, LoxCallable):
+                    if arg != callee.arity():
+                        raise RuntimeError(None, f"Expected {callee.arity()} arguments but got {arg}.")
+                    start = len(stack) - arg
+                    arguments = stack[start:]
+                    del stack[start - 1:]
+                    push(callee.call(self, arguments))
+                else:
+                    raise RuntimeError(None, "Can only call functions and classes.")
+            elif op == SUBTRACT_CONSTANT:
+                a = stack[-1]
+                b = constants[arg]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a - b
+            elif op == POP_JUMP_IF_FALSE:
+                value = pop()
+                if (value is False or value is None or value is NIL_VALUE
+                        or (value.__class__ is int and not value)):
+                    ip = arg
+            elif op == STORE_GLOBAL:
+                value = pop()
+                if global_values[arg] is MISSING:
+                    closure.globals.assign(self.global_name(closure, arg, ip), arg, value)
+                global_values[arg] = value
+            elif op == APPEND_NIL:
+                stack[base + arg].append(None)
+            elif op == MULTIPLY_CONSTANT:
+                a = stack[-1]
+                b = constants[arg]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a * b
+            elif op == DIVIDE_CONSTANT:
+                a = stack[-1]
+                b = constants[arg]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a / b
+            elif op == JUMP_UNLESS_GREATER:
+                b = pop()
+                a = pop()
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                if not a > b:
+                    ip = arg
+            elif op == JUMP_UNLESS_LESS_EQUAL:
+                b = pop()
+                a = pop()
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                if not a <= b:
+                    ip = arg
+            elif op == JUMP_UNLESS_GREATER_EQUAL:
+                b = pop()
+                a = pop()
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                if not a >= b:
+                    ip = arg
+            elif op == EQUAL:
+                b = pop()
+                stack[-1] = is_equal(stack[-1], b)
+            elif op == NOT_EQUAL:
+                b = pop()
+                stack[-1] = not is_equal(stack[-1], b)
+            elif op == POP:
+                pop()
+            elif op == SET_LOCAL:
+                stack[base + arg] = stack[-1]
+            elif op == SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a - b
+            elif op == MULTIPLY:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a * b
+            elif op == DIVIDE:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a / b
+            elif op == NIL:
+                push(None)
+            elif op == PRINT_RESULT:
+                value = pop()
+                if value is not None:
+                    self.output.line(stringify(value))
+            elif op == LESS:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a < b
+            elif op == GREATER:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a > b
+            elif op == LESS_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a <= b
+            elif op == GREATER_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if a.__class__ is not float or b.__class__ is not float:
+                    a, b = number_operands(a, b)
+                stack[-1] = a >= b
+            elif op == GET_UPVALUE:
+                upvalue = upvalues[arg]
+                push(upvalue.cell[upvalue.index])
+            elif op == SET_UPVALUE:
+                upvalue = upvalues[arg]
+                upvalue.cell[upvalue.index] = stack[-1]
+            elif op == SET_GLOBAL:
+                if global_values[arg] is MISSING:
+                    closure.globals.assign(self.global_name(closure, arg, ip), arg, stack[-1])
+                global_values[arg] = stack[-1]
+            elif op == JUMP_IF_FALSE:
+                if is_falsey(stack[-1]):
+                    ip = arg
+            elif op == JUMP_IF_TRUE:
+                if not is_falsey(stack[-1]):
+                    ip = arg
+            elif op == NOT:
+                stack[-1] = bang(stack[-1])
+            elif op == NEGATE:
+                value = stack[-1]
+                if value.__class__ is not float:
+                    raise RuntimeError(None, "Operand must be a number.")
+                stack[-1] = -value
+            elif op == POPN:
+                del stack[-arg:]
+            elif op == DEFINE_GLOBAL:
+                global_values[arg] = pop()
+            elif op == CLOSURE:
+                function = constants[arg]
+                captured = []
+                for is_local, index in function.upvalues:
+                    if is_local:
+                        captured.append(self.capture_upvalue(base + index))
+                    else:
+                        captured.append(upvalues[index])
+                push(Closure(function, closure.globals, captured))
+            elif op == CLOSE_UPVALUE:
+                self.close_upvalues(len(stack) - 1)
+                pop()
+            elif op == NEW_LIST:
+                push(LoopResults())
+            elif op == LIST_APPEND:
+                value = pop()
+                stack[base + arg].append(value)
+            elif op == IMPORT:
+                self.import_module(constants[arg], closure.globals)
+            else:
+                raise SystemError(f"Unknown opcode {op}.")
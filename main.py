@@ -1,6 +1,7 @@
 import sys
-import pathlib
-from libs import tokenizer, parser, interpreter, resolver  
+import argparse
+from libs import tokenizer, parser, interpreter, stack_interpreter, closure_compiler, vm, bytecode, transpiler, modules, ast_cache, memo, output, profiler
+from libs.values import NUMBER_CLASSES, stringify
 
 def castNonetoNil(value):
     if value is None:
@@ -25,17 +26,108 @@ def flatten(lst):
     return flat_list
 
 
+engines = {
+    "tree": interpreter.Interpreter,
+    "stack": stack_interpreter.StackInterpreter,
+    "closure": closure_compiler.ClosureInterpreter,
+    "vm": vm.VirtualMachine,
+    "python": transpiler.PythonInterpreter,
+}
+
+
+def parse_args(argv):
+    arg_parser = argparse.ArgumentParser(prog="main.py")
+    arg_parser.add_argument("command")
+    arg_parser.add_argument("filename")
+    arg_parser.add_argument("--scanner", choices=sorted(tokenizer.scanners), default="regex",
+                            help="tokenizer engine to use (default: regex)")
+    arg_parser.add_argument("--parser", choices=sorted(modules.parsers), default="pratt",
+                            help="parser to use (default: pratt)")
+    arg_parser.add_argument("--tokens", choices=["list", "buffer"], default="list",
+                            help="hold tokens as Token objects or in a compact TokenBuffer, which takes about "
+                                 "a seventh of the memory but makes scan + parse about 15%% slower")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="tokenize the file lazily in chunks while parsing (regex scanner, token list)")
+    arg_parser.add_argument("--engine", choices=sorted(engines), default=None,
+                            help="how 'run' executes the program (default: tree). vm is fastest on "
+                                 "call-heavy code but 10-30%% slower than tree on simple counted loops, "
+                                 "which tree runs as Python loops; see benchmarks/bench_engines.py")
+    arg_parser.add_argument("--stack-memory", type=int, default=None,
+                            help="memory budget in MB for the call stack of --engine stack (default: 512)")
+    arg_parser.add_argument("--memoize", action="store_true",
+                            help="cache the results of calls to pure functions (tree and stack engines)")
+    arg_parser.add_argument("--memo-size", type=int, default=memo.DEFAULT_SIZE,
+                            help=f"most results --memoize keeps (default: {memo.DEFAULT_SIZE})")
+    arg_parser.add_argument("--output-buffer", type=int, default=output.DEFAULT_BUFFER_SIZE // 1024,
+                            help="KB of program output 'run' collects before writing it, 0 to write every line "
+                                 f"at once (default: {output.DEFAULT_BUFFER_SIZE // 1024})")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="print the interpreter's counters to stderr after 'run'")
+    arg_parser.add_argument("--top", type=int, default=20,
+                            help="rows in each table of the 'profile' report, which runs on the tree engine "
+                                 "without inlining (default: 20)")
+    arg_parser.add_argument("--flamegraph", default=None, metavar="PATH",
+                            help="write the call stacks 'profile' timed to PATH, in the collapsed format "
+                                 "flamegraph.pl and speedscope read")
+    arg_parser.add_argument("--no-opt", action="store_true",
+                            help="skip inlining, constant folding and dead-branch elimination")
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="reuse resolved ASTs from an on-disk cache instead of always running "
+                                 "the front end (default: off)")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help="AST cache directory for --cache, which must belong to the current user "
+                                 "(default: $JPLOX_CACHE_DIR or ~/.cache/jplox)")
+    arg_parser.add_argument("--cache-size", type=int, default=None,
+                            help="AST cache size limit in MB for --cache (default: 64)")
+    arg_parser.add_argument("--jobs", type=int, default=None,
+                            help="processes used to compile imported modules (default: CPU count)")
+    args = arg_parser.parse_args(argv)
+    # The streaming scanner is the regex scanner reading chunks into Token objects
+    if args.stream and args.scanner != "regex":
+        arg_parser.error("--stream only works with --scanner regex")
+    if args.stream and args.tokens != "list":
+        arg_parser.error("--stream only works with --tokens list")
+    # The profiler is a tree walker; no other engine has its hooks
+    if args.command == "profile" and args.engine not in (None, "tree"):
+        arg_parser.error("profile only runs on --engine tree")
+    if args.engine is None:
+        args.engine = "tree"
+    # The other engines run calls in code of their own, which never consults the memo
+    if args.memoize and args.engine not in ("tree", "stack"):
+        arg_parser.error("--memoize only works with --engine tree or stack")
+    # An inlined call would drop out of the profile, its time charged to the caller
+    args.no_inline = args.no_opt or args.command == "profile"
+    return args
+
+
+def open_cache(args):
+    if not args.cache:
+        return None
+    max_bytes = None if args.cache_size is None else args.cache_size * 1024 * 1024
+    try:
+        return ast_cache.AstCache(args.cache_dir, max_bytes)
+    except ast_cache.CacheDirectoryError as error:
+        print(f"Not using the AST cache: {error}", file=sys.stderr)
+        return None
+
+
 def main():
-    command = sys.argv[1]
-    filename = sys.argv[2]
-        
-    file_contents = pathlib.Path(filename).read_text()
-
-    scanner = tokenizer.Scanner(file_contents)
-    tokens, errors = scanner.scan_tokens()
-    parse = parser.Parser(tokens)
-    _interpreter = interpreter.Interpreter()
-    _resolver = resolver.Resolver(_interpreter)
+    args = parse_args(sys.argv[1:])
+    command = args.command
+    filename = args.filename
+
+    if command == "profile":
+        _interpreter = profiler.ProfilingInterpreter()
+    else:
+        _interpreter = engines[args.engine]()
+    if args.engine == "stack" and args.stack_memory is not None:
+        _interpreter.memory_budget = args.stack_memory * 1024 * 1024
+    if args.memoize:
+        _interpreter.memo = memo.MemoCache(args.memo_size)
+    if command not in ("run", "profile", "disassemble"):
+        tokens, errors = modules.scan(filename, args)
+        parse = modules.parsers[args.parser](tokens)
+
     if command == "tokenize":
         for token in tokens:
             print(token)
@@ -49,12 +141,16 @@ def main():
             exit(0)
 
     elif command == "parse":
+        if args.stream:
+            # Lexical errors only surface once the stream has been consumed
+            ast = parse.parse()
         if errors:
             for error in errors:
                 print(error, file=sys.stderr)
             exit(65)
 
-        ast = parse.parse()
+        if not args.stream:
+            ast = parse.parse()
         if len(ast) == 0:
             exit(65);
         printer = parser.AstPrinter()
@@ -71,35 +167,53 @@ def main():
         try:
             for stmt in ast:
                 eval = _interpreter.evaluate(stmt)
+                if eval.__class__ not in NUMBER_CLASSES:
+                    eval = stringify(eval)
                 print("EVAL: ", remove_trailing_zeros(eval))
         except Exception as e:
             print(e, file=sys.stderr)
             exit(70)
 
-    elif command == "run":
-        ast = parse.parse()
-        printer = parser.AstPrinter()
-        if len(ast) == 0 or parse.has_errors:
+    elif command in ("run", "profile"):
+        loader = modules.ModuleLoader(args, open_cache(args), args.jobs)
+        program = loader.load(filename)
+        if program is None or len(program.statements) == 0:
             exit(65)
 
-        _resolver.resolve(ast)
-
-        if _resolver.has_error:
-            exit(65)
+        loader.link(_interpreter)
+        _interpreter.output = output.Output(args.output_buffer * 1024)
 
         try:
-            for stmt in ast:
-                _interpreter.run(stmt)
-                # if isinstance(result, list):
-                #     _result = flatten(result)
-                #     for r in _result:
-                #         print(remove_trailing_zeros(r))
-                # else:
-                #     if result is not None:
-                #         print(remove_trailing_zeros(result))
+            _interpreter.execute_module(program)
+            # if isinstance(result, list):
+            #     _result = flatten(result)
+            #     for r in _result:
+            #         print(remove_trailing_zeros(r))
+            # else:
+            #     if result is not None:
+            #         print(remove_trailing_zeros(result))
         except Exception as e:
+            # What the program printed comes before the error
+            _interpreter.output.flush()
             print(e, file=sys.stderr)
             exit(70)
+        finally:
+            _interpreter.output.flush()
+            if args.stats:
+                for name, value in _interpreter.statistics().items():
+                    print(f"{name}: {value}", file=sys.stderr)
+            if command == "profile":
+                _interpreter.profiler.finish()
+                _interpreter.profiler.report(sys.stderr, args.top)
+                if args.flamegraph is not None:
+                    with open(args.flamegraph, "w") as stacks:
+                        _interpreter.profiler.write_collapsed(stacks)
+
+    elif command == "disassemble":
+        program = modules.ModuleLoader(args, open_cache(args), args.jobs).load(filename)
+        if program is None:
+            exit(65)
+        bytecode.disassemble(bytecode.Compiler(program.lines).compile(program.statements))
 
     else:
         print("Wrong command")
@@ -0,0 +1,58 @@
+"""The golden-output corpus: the programs in programs/ and what each must
+print.
+
+Every ``name.lox`` has a ``name.out`` holding its output and, if it ends
+in an error, a ``name.err`` holding what main.py reports on stderr.
+After checking that a change in output is intended, regenerate them with
+the tree walker and no optimization:
+
+    python tests/lox_programs.py
+"""
+import os
+import subprocess
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(os.path.dirname(TESTS), "main.py")
+PROGRAMS = os.path.join(TESTS, "programs")
+
+# Program file names; the files under programs/modules are only imported
+NAMES = sorted(name for name in os.listdir(PROGRAMS) if name.endswith(".lox"))
+
+
+def run(name, *options):
+    """Runs programs/``name``; returns (stdout, stderr, exit status)."""
+    result = subprocess.run(
+        [sys.executable, MAIN, "run", name, "--jobs", "1", *options],
+        cwd=PROGRAMS, capture_output=True, text=True, timeout=120)
+    return result.stdout, result.stderr, result.returncode
+
+
+def expected(name):
+    """The (stdout, stderr, exit status) recorded for ``name``."""
+    stem = os.path.join(PROGRAMS, name[:-len(".lox")])
+    with open(stem + ".out") as out:
+        stdout = out.read()
+    if not os.path.exists(stem + ".err"):
+        return stdout, "", 0
+    with open(stem + ".err") as err:
+        return stdout, err.read(), 70
+
+
+def record():
+    for name in NAMES:
+        stdout, stderr, status = run(name, "--engine", "tree", "--no-opt")
+        stem = os.path.join(PROGRAMS, name[:-len(".lox")])
+        with open(stem + ".out", "w") as out:
+            out.write(stdout)
+        if status == 0:
+            if os.path.exists(stem + ".err"):
+                os.remove(stem + ".err")
+        else:
+            with open(stem + ".err", "w") as err:
+                err.write(stderr)
+        print(f"{name}: exit {status}")
+
+
+if __name__ == "__main__":
+    record()
@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from libs import ast_cache
+from libs.ast_cache import AstCache, CacheDirectoryError
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def entries(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(AstCache.suffix))
+
+
+def test_editing_a_source_invalidates_only_its_own_entry(tmp_path):
+    cache = AstCache(str(tmp_path / "cache"))
+    first = write(tmp_path / "first.lox", "var a = 1;")
+    second = write(tmp_path / "second.lox", "var b = 2;")
+    cache.store(cache.key(first), "first entry")
+    cache.store(cache.key(second), "second entry")
+    old_key = cache.key(first)
+
+    write(tmp_path / "first.lox", "var a = 3;")
+    assert cache.load(cache.key(first)) is None
+    assert cache.load(cache.key(second)) == "second entry"
+
+    cache.store(cache.key(first), "edited entry")
+    assert cache.load(cache.key(first)) == "edited entry"
+    assert old_key not in entries(cache.directory)
+    assert len(entries(cache.directory)) == 2
+
+
+def test_a_new_interpreter_fingerprint_invalidates_every_entry(tmp_path, monkeypatch):
+    cache = AstCache(str(tmp_path / "cache"))
+    paths = [write(tmp_path / f"{name}.lox", f"var {name};") for name in "abc"]
+    for path in paths:
+        cache.store(cache.key(path), path)
+
+    monkeypatch.setattr(ast_cache, "_fingerprint", "another interpreter")
+    assert [cache.load(cache.key(path)) for path in paths] == [None, None, None]
+
+
+def test_eviction_keeps_the_directory_under_its_limit(tmp_path):
+    directory = str(tmp_path / "cache")
+    entry = "x" * 1000
+    cache = AstCache(directory, max_bytes=3500)
+    paths = [write(tmp_path / f"{index}.lox", f"var v{index};") for index in range(6)]
+    for time, path in enumerate(paths):
+        cache.store(cache.key(path), entry)
+        # Distinct ages, oldest first, whatever the file system's clock resolution
+        os.utime(os.path.join(directory, cache.key(path)), (time, time))
+        total = sum(os.path.getsize(os.path.join(directory, name)) for name in entries(directory))
+        assert total <= 3500
+
+    kept = [path for path in paths if cache.load(cache.key(path)) is not None]
+    assert kept == paths[-3:]
+
+
+def test_eviction_drops_the_least_recently_used_entry(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = AstCache(directory, max_bytes=2500)
+    paths = [write(tmp_path / f"{index}.lox", f"var v{index};") for index in range(3)]
+    for time, path in enumerate(paths[:2]):
+        cache.store(cache.key(path), "x" * 1000)
+        os.utime(os.path.join(directory, cache.key(path)), (time, time))
+
+    # Loading the older entry makes it the most recently used
+    assert cache.load(cache.key(paths[0])) is not None
+    cache.store(cache.key(paths[2]), "x" * 1000)
+    assert cache.load(cache.key(paths[1])) is None
+    assert cache.load(cache.key(paths[0])) is not None
+
+
+def test_opening_trims_the_directory_to_a_lowered_limit(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = AstCache(directory)
+    for index in range(4):
+        path = write(tmp_path / f"{index}.lox", f"var v{index};")
+        cache.store(cache.key(path), "x" * 1000)
+
+    AstCache(directory, max_bytes=2500)
+    assert len(entries(directory)) == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_the_directory_is_created_private(tmp_path):
+    cache = AstCache(str(tmp_path / "cache"))
+    assert os.stat(cache.directory).st_mode & 0o777 == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_a_directory_others_can_write_is_refused(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir()
+    directory.chmod(0o777)
+    with pytest.raises(CacheDirectoryError, match="writable by other users"):
+        AstCache(str(directory))
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_a_directory_of_another_user_is_refused(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o700)
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(directory).st_uid + 1)
+    with pytest.raises(CacheDirectoryError, match="another user"):
+        AstCache(str(directory))
+
+
+def test_run_only_uses_the_cache_when_asked(tmp_path):
+    program = write(tmp_path / "program.lox", "{ print 1 + 2; }")
+    directory = tmp_path / "cache"
+    environment = dict(os.environ, JPLOX_CACHE_DIR=str(directory))
+
+    def run(*options):
+        return subprocess.run([sys.executable, MAIN, "run", program, "--jobs", "1", *options],
+                              env=environment, capture_output=True, text=True, timeout=60).stdout
+
+    assert run() == "3.0\n"
+    assert not directory.exists()
+    assert run("--cache") == "3.0\n"
+    assert len(entries(directory)) == 1
+    assert run("--cache") == "3.0\n"
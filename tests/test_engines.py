@@ -0,0 +1,13 @@
+"""Every engine must print what the golden files record, runtime errors
+included."""
+import pytest
+
+from lox_programs import NAMES, expected, run
+
+ENGINES = ["tree", "stack", "closure", "vm", "python"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", NAMES)
+def test_engine_output_matches_golden(name, engine):
+    assert run(name, "--engine", engine) == expected(name)
@@ -0,0 +1,135 @@
+"""The inliner may only replace a call where Lox could not tell the
+difference: every program must print what it prints with --no-opt."""
+import subprocess
+import sys
+
+import pytest
+
+import main
+from libs import interpreter, parser, resolver, tokenizer
+from libs.inliner import INLINE_BUDGET, Inliner
+from libs.parser import Expr, Node
+
+# Prints its argument and returns it, to make argument evaluation visible
+PRINTER = "fun pr(x) { print x; return x; }\n"
+
+PROGRAMS = {
+    # Inlining would evaluate b's argument before a's
+    "argument order": (PRINTER + """
+fun sub(a, b) { return b - a; }
+{ print sub(pr(1), pr(2)); }
+""", False),
+    # Inlining would print the argument twice
+    "argument read twice": (PRINTER + """
+fun sq(x) { return x * x; }
+{ print sq(pr(3)); }
+""", False),
+    # Inlining would print the argument after the body's own effect
+    "argument read after an effect": (PRINTER + """
+fun late(a) { return pr("body") + a; }
+{ print late(pr("argument")); }
+""", False),
+    # Inlining would read n after the call in the body changed it
+    "captured variable changed by the body": ("""
+var counter;
+fun addAfter(a) { return counter() + a; }
+{
+  var n = 1;
+  fun increase() { n = n + 10; return 0; }
+  counter = increase;
+  print addAfter(n);
+  print n;
+}
+""", False),
+    # Inlining would read g after the argument assigned it
+    "global assigned by an argument": ("""
+var g = 1;
+fun withG(a) { return g + a; }
+{ print withG(g = 5); print g; }
+""", False),
+    # The name is read as a value, so the function may be called from anywhere
+    "escaping function": ("""
+fun sq(x) { return x * x; }
+var alias = sq;
+{ print sq(4); print alias(5); }
+""", False),
+    "literal arguments": ("""
+fun lerp(a, b, t) { return a + (b - a) * t; }
+{ print lerp(1, 3, 0.5); }
+""", True),
+    "arguments read once in order": (PRINTER + """
+fun sub(a, b) { return a - b; }
+{ print sub(pr(5), pr(2)); }
+""", True),
+    "local arguments": ("""
+fun sq(x) { return x * x; }
+{ var n = 7; print sq(n); }
+""", True),
+    # Inlining would evaluate b only when a is false
+    "argument behind a short circuit": (PRINTER + """
+fun either(a, b) { return a or b; }
+{ print either(pr("left"), pr("right")); }
+""", False),
+    "short circuit over literals": ("""
+fun either(a, b) { return a or b; }
+{ print either(false, "right"); print either(nil, nil); }
+""", True),
+}
+
+
+def compile_inlined(source):
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    parse = parser.Parser(tokens)
+    statements = parse.parse()
+    module_resolver = resolver.Resolver(interpreter.Interpreter())
+    module_resolver.resolve(statements)
+    return Inliner(module_resolver.purity, parse.lines).inline(statements)
+
+
+def called(node, names):
+    """Adds the name of every function called by name under ``node``."""
+    if isinstance(node, list):
+        for item in node:
+            called(item, names)
+        return names
+    if not isinstance(node, Node):
+        return names
+    if isinstance(node, Expr.Call) and isinstance(node.callee, Expr.Variable):
+        names.append(node.callee.name.lexeme)
+    for name in type(node).__slots__:
+        called(getattr(node, name, None), names)
+    return names
+
+
+def run(path, *options):
+    result = subprocess.run([sys.executable, main.__file__, "run", str(path), "--jobs", "1", *options],
+                            capture_output=True, text=True, timeout=60)
+    return result.stdout, result.stderr, result.returncode
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_inlining_keeps_output(name, tmp_path):
+    source, _ = PROGRAMS[name]
+    program = tmp_path / "program.lox"
+    program.write_text(source)
+    assert run(program) == run(program, "--no-opt")
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_calls_are_inlined_only_when_safe(name):
+    source, inlined = PROGRAMS[name]
+    statements = compile_inlined(source)
+    # The last statement is the block that makes the calls
+    remaining = set(called(statements[-1], [])) - {"pr", "counter", "alias"}
+    assert (not remaining) == inlined, remaining
+
+
+def test_bodies_past_the_budget_are_not_inlined():
+    def body(ones):
+        return " + ".join(["a"] + ["1"] * ones)
+
+    # A binary chain over n ones has 2n + 1 nodes; the grouping adds one
+    fits = f"fun f(a) {{ return ({body((INLINE_BUDGET - 2) // 2)}); }}\n{{ print f(1); }}"
+    too_big = f"fun f(a) {{ return {body(INLINE_BUDGET // 2)}; }}\n{{ print f(1); }}"
+    assert called(compile_inlined(fits)[-1], []) == []
+    assert called(compile_inlined(too_big)[-1], []) == ["f"]
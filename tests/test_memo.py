@@ -0,0 +1,124 @@
+import subprocess
+import sys
+
+import pytest
+
+import main
+from libs import interpreter, parser, resolver, tokenizer
+from libs.memo import MemoCache, memo_key
+from libs.parser import Stmt
+
+MAIN = main.__file__
+
+
+def purity(source):
+    """Function name -> whether the resolver found it pure, for every
+    function declared at the top level of ``source``."""
+    tokens, _ = tokenizer.RegexScanner(source).scan_tokens()
+    statements = parser.Parser(tokens).parse()
+    resolver.Resolver(interpreter.Interpreter()).resolve(statements)
+    return {statement.name.lexeme: statement.pure
+            for statement in statements if isinstance(statement, Stmt.Function)}
+
+
+def test_reading_a_constant_global_is_pure():
+    assert purity("var rate = 2; fun scale(x) { return x * rate; }") == {"scale": True}
+
+
+def test_reading_a_mutable_global_is_not_pure():
+    source = "var rate = 2; fun scale(x) { return x * rate; } rate = 3;"
+    assert purity(source) == {"scale": False}
+
+
+def test_printing_or_assigning_a_global_is_not_pure():
+    source = """
+var count = 0;
+fun shout(x) { print x; return x; }
+fun bump(x) { count = count + x; return count; }
+fun local(x) { var y = x; y = y + 1; return y; }
+"""
+    assert purity(source) == {"shout": False, "bump": False, "local": True}
+
+
+def test_calls_need_a_pure_callee():
+    source = """
+fun shout(x) { print x; return x; }
+fun loud(x) { return shout(x); }
+fun root(x) { return sqrt(x) + 1; }
+fun timed(x) { return clock() + x; }
+"""
+    assert purity(source) == {"shout": False, "loud": False, "root": True, "timed": False}
+
+
+def test_mutual_recursion_reaches_a_fixed_point():
+    source = """
+fun even(n) { if (n == 0) return true; return odd(n - 1); }
+fun odd(n) { if (n == 0) return false; return even(n - 1); }
+"""
+    assert purity(source) == {"even": True, "odd": True}
+
+
+def test_impurity_spreads_around_a_cycle():
+    source = """
+fun a(n) { if (n == 0) return 0; return b(n - 1); }
+fun b(n) { if (n == 0) return 0; return c(n - 1); }
+fun c(n) { print n; return a(n - 1); }
+fun d(n) { return n; }
+"""
+    assert purity(source) == {"a": False, "b": False, "c": False, "d": True}
+
+
+def test_memo_key_tells_zero_from_negative_zero():
+    assert memo_key("f", [0.0]) != memo_key("f", [-0.0])
+    assert memo_key("f", [0.0]) == memo_key("f", [0.0])
+
+
+def test_memo_key_tells_values_of_different_classes_apart():
+    assert memo_key("f", ["1"]) != memo_key("f", [1.0])
+    assert memo_key("f", [True]) != memo_key("f", [1.0])
+    assert memo_key("f", [1]) != memo_key("f", [1.0])
+    assert memo_key("f", [1.0, "a"]) == memo_key("f", [1.0, "a"])
+
+
+class CountingFunction:
+    def __init__(self):
+        self.calls = []
+
+    def call(self, interpreter, arguments, memoize=True):
+        self.calls.append(arguments[0])
+        return arguments[0] * 2
+
+
+def test_the_least_recently_used_result_is_evicted():
+    function = CountingFunction()
+    cache = MemoCache(size=2)
+    assert [cache.call(function, None, [value]) for value in (1, 2, 1, 3)] == [2, 4, 2, 6]
+    # 2 was used least recently when 3 came in
+    assert len(cache.entries) == 2 and cache.evictions == 1
+    cache.call(function, None, [1])
+    cache.call(function, None, [2])
+    assert function.calls == [1, 2, 3, 2]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_memo_size_bounds_the_cache_of_a_run(tmp_path):
+    program = tmp_path / "memo.lox"
+    program.write_text("""
+fun sq(x) { var y = x * x; return y; }
+{ print sq(1) + sq(2) + sq(3) + sq(1) + sq(3); print memoStats(); }
+""")
+    result = subprocess.run([sys.executable, MAIN, "run", str(program), "--memoize", "--memo-size", "2"],
+                            capture_output=True, text=True, timeout=60)
+    assert result.stdout == "24.0\nhits 1, misses 4, evictions 2, entries 2/2\n"
+
+
+@pytest.mark.parametrize("engine", ["closure", "vm", "python"])
+def test_memoize_is_rejected_where_calls_are_not_memoized(engine, capsys):
+    with pytest.raises(SystemExit):
+        main.parse_args(["run", "program.lox", "--memoize", "--engine", engine])
+    assert "--memoize only works with --engine tree or stack" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("engine", ["tree", "stack"])
+def test_memoize_is_accepted_where_calls_are_memoized(engine):
+    assert main.parse_args(["run", "program.lox", "--memoize", "--engine", engine]).memoize
@@ -0,0 +1,15 @@
+"""Inlining, constant folding and dead-branch elimination must not change
+what a program prints, runtime errors included."""
+import pytest
+
+from lox_programs import NAMES, expected, run
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_unoptimized_output_matches_golden(name):
+    assert run(name, "--no-opt") == expected(name)
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_optimized_output_matches_unoptimized(name):
+    assert run(name) == run(name, "--no-opt")
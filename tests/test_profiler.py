@@ -0,0 +1,118 @@
+import io
+
+import pytest
+
+import main
+from libs import modules
+from libs.profiler import Profiler, ProfilingInterpreter
+
+PROGRAM = """fun inner(x) {
+  var y = x;
+  return y;
+}
+fun outer(x) {
+  var a = inner(x);
+  return a + inner(x);
+}
+fun fact(n) {
+  if (n < 2) return 1;
+  return n * fact(n - 1);
+}
+{
+  print outer(1);
+  print fact(3);
+  print len("abc");
+}
+"""
+
+
+class StatementClock(Profiler):
+    """A profiler whose clock advances one second per statement run, so
+    every time it reports is a statement count."""
+
+    def __init__(self):
+        self.now = 0
+        super().__init__(clock=lambda: self.now)
+
+    def hit(self, line):
+        self.now += 1
+        super().hit(line)
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "prog.lox").write_text(PROGRAM)
+    args = main.parse_args(["profile", "prog.lox", "--jobs", "1"])
+    loader = modules.ModuleLoader(args, None, args.jobs)
+    program = loader.load("prog.lox")
+    interpreter = ProfilingInterpreter()
+    interpreter.profiler = StatementClock()
+    loader.link(interpreter)
+    interpreter.execute_module(program)
+    interpreter.profiler.finish()
+    assert capsys.readouterr().out == "2.0\n6.0\n3.0\n"
+    return interpreter.profiler
+
+
+def test_calls_are_counted_under_name_path_line_labels(profile):
+    calls = {label: stats.calls for label, stats in profile.functions.items()}
+    assert calls == {
+        "outer (prog.lox:5)": 1,
+        "inner (prog.lox:1)": 2,
+        "fact (prog.lox:9)": 3,
+        "len (native)": 1,
+    }
+
+
+def test_self_time_excludes_callees(profile):
+    outer = profile.functions["outer (prog.lox:5)"]
+    inner = profile.functions["inner (prog.lox:1)"]
+    # outer runs two statements itself and calls inner twice, which runs two each time
+    assert (outer.total, outer.self_time) == (6, 2)
+    assert (inner.total, inner.self_time) == (4, 4)
+
+
+def test_recursion_counts_total_time_once(profile):
+    fact = profile.functions["fact (prog.lox:9)"]
+    # Two statements per call: the if, then either return
+    assert (fact.total, fact.self_time) == (6, 6)
+
+
+def test_lines_count_the_statements_run(profile):
+    lines = {line: hits for (path, line), hits in profile.lines.items() if path == "prog.lox"}
+    assert lines == {1: 1, 2: 2, 3: 2, 5: 1, 6: 1, 7: 1, 9: 1, 10: 4, 11: 2, 14: 1, 15: 1, 16: 1}
+
+
+def test_collapsed_stacks_hold_self_time_in_microseconds(profile):
+    out = io.StringIO()
+    profile.write_collapsed(out)
+    assert out.getvalue().splitlines() == [
+        "<script> 6000000",
+        "<script>;fact (prog.lox:9) 2000000",
+        "<script>;fact (prog.lox:9);fact (prog.lox:9) 2000000",
+        "<script>;fact (prog.lox:9);fact (prog.lox:9);fact (prog.lox:9) 2000000",
+        "<script>;outer (prog.lox:5) 2000000",
+        "<script>;outer (prog.lox:5);inner (prog.lox:1) 4000000",
+    ]
+
+
+def test_report_lists_functions_by_self_time(profile):
+    out = io.StringIO()
+    profile.report(out, limit=2)
+    rows = out.getvalue().splitlines()
+    assert rows[0].split() == ["calls", "total", "s", "self", "s", "function"]
+    assert rows[1].split() == ["3", "6.0000", "6.0000", "fact", "(prog.lox:9)"]
+    assert rows[2].split() == ["2", "4.0000", "4.0000", "inner", "(prog.lox:1)"]
+    assert rows[4:] == ["      hits  line", "         4  prog.lox:10", "         2  prog.lox:2"]
+
+
+@pytest.mark.parametrize("engine", ["stack", "closure", "vm", "python"])
+def test_profile_rejects_other_engines(engine, capsys):
+    with pytest.raises(SystemExit):
+        main.parse_args(["profile", "program.lox", "--engine", engine])
+    assert "profile only runs on --engine tree" in capsys.readouterr().err
+
+
+def test_profile_accepts_the_tree_engine():
+    assert main.parse_args(["profile", "program.lox", "--engine", "tree"]).engine == "tree"
@@ -0,0 +1,60 @@
+"""Every scanner must produce the classic Scanner's tokens and errors."""
+import io
+
+import pytest
+
+from libs.tokenizer import RegexScanner, Scanner, StreamScanner
+
+SOURCES = {
+    "empty": "",
+    "statements": 'var x = 1;\nfun f(a, b) { return a + b; }\nprint f(x, 2) * -3;\n',
+    "operators": "! != = == < <= > >= / - + * ; , . ( ) { }",
+    "operators run together": "a!=b==c<=d>=e!f=g<h>i",
+    "comments": "// a comment\nvar a; // trailing\n//\n// last line without a newline",
+    "comment after a slash": "a / b // c\n/ /",
+    "numbers": "1 12.5 1. .5 0.25.5 007 1.2.3",
+    "strings": '"" "one" "two\nlines" "héllo ☃"',
+    "unterminated string": 'print "never closed\nvar x;',
+    "unexpected characters": "var @ = #1; $",
+    "keywords and identifiers": "and class else false for fun if import nil or print return super this "
+                                "true var while andy _under score99 printer",
+    "lines": "a\n\nb\r\n\tc\n\n\n",
+}
+
+
+def token_tuples(tokens):
+    return [(token.type, token.lexeme, token.literal, token.line) for token in tokens]
+
+
+def classic(source):
+    tokens, errors = Scanner(source).scan_tokens()
+    return token_tuples(tokens), errors
+
+
+@pytest.mark.parametrize("name", SOURCES)
+def test_regex_scanner_matches_classic(name):
+    tokens, errors = RegexScanner(SOURCES[name]).scan_tokens()
+    assert (token_tuples(tokens), errors) == classic(SOURCES[name])
+
+
+@pytest.mark.parametrize("name", SOURCES)
+def test_token_buffer_matches_classic(name):
+    buffer, errors = RegexScanner(SOURCES[name]).scan_buffer()
+    assert (token_tuples(buffer), errors) == classic(SOURCES[name])
+    assert token_tuples(buffer[index] for index in range(len(buffer))) == classic(SOURCES[name])[0]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1 << 16])
+@pytest.mark.parametrize("name", SOURCES)
+def test_stream_scanner_matches_classic(name, chunk_size):
+    source = SOURCES[name]
+    scanner = StreamScanner(io.BytesIO(source.encode("utf-8")), chunk_size)
+    tokens = list(scanner.iter_tokens())
+    assert (token_tuples(tokens), scanner.errors) == classic(source)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+def test_stream_scanner_reads_text_streams(chunk_size):
+    source = SOURCES["statements"]
+    scanner = StreamScanner(io.StringIO(source), chunk_size)
+    assert (token_tuples(scanner.iter_tokens()), scanner.errors) == classic(source)
@@ -0,0 +1,43 @@
+"""Tail calls run in constant Python stack on the tree walker, however
+deep the Lox recursion goes."""
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+DEPTH = 100000
+
+PROGRAMS = {
+    "self": (f"""
+fun count(n, total) {{
+  if (n == 0) return total;
+  return count(n - 1, total + 1);
+}}
+{{ print count({DEPTH}, 0); }}
+""", f"{DEPTH}.0\n"),
+    "mutual": (f"""
+fun isEven(n) {{ if (n == 0) return true; return isOdd(n - 1); }}
+fun isOdd(n) {{ if (n == 0) return false; return isEven(n - 1); }}
+{{ print isEven({DEPTH}); print isOdd({DEPTH}); }}
+""", "true\nfalse\n"),
+    "through a native": (f"""
+fun spin(n) {{
+  if (n == 0) return len("done");
+  return spin(n - 1);
+}}
+{{ print spin({DEPTH}); }}
+""", "4.0\n"),
+}
+
+
+@pytest.mark.parametrize("engine", ["tree", "stack"])
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_deep_tail_recursion_finishes(name, engine, tmp_path):
+    source, expected = PROGRAMS[name]
+    program = tmp_path / "program.lox"
+    program.write_text(source)
+    result = subprocess.run([sys.executable, main.__file__, "run", str(program), "--engine", engine],
+                            capture_output=True, text=True, timeout=120)
+    assert (result.stdout, result.stderr, result.returncode) == (expected, "", 0)